@@ -0,0 +1,203 @@
+import sys
+from array import array
+from datetime import date, timedelta
+from django.db import transaction
+from django.db.models import Sum
+from django.utils import timezone
+from .models import DailyStudyRollup, StudyActivity
+
+# Streaks and the activity heatmap read StudyActivity: a dense array with
+# the minutes studied on every day since the user's first session. Writes
+# recompute the touched days from the rollups and re-derive the streak
+# summary, so reading a streak is O(1) and a year of heatmap O(365).
+
+MAX_MINUTES = 0xFFFF
+# Heatmap intensity: minutes at or above each threshold get the next level.
+HEATMAP_LEVELS = (1, 30, 60, 120)
+
+
+def day_value(session_count, duration):
+    """Minutes stored for a day; active days are never 0."""
+    if not session_count:
+        return 0
+    return min(MAX_MINUTES, max(1, round(duration.total_seconds() / 60)))
+
+
+def unpack_days(activity):
+    days = array("H")
+    days.frombytes(bytes(activity.day_minutes))
+    if sys.byteorder == "big":
+        days.byteswap()
+    return days
+
+
+def pack_days(activity, days):
+    if sys.byteorder == "big":
+        days = array("H", days)
+        days.byteswap()
+    activity.day_minutes = days.tobytes()
+
+
+def set_days(activity, days, values):
+    """Writes ``{date: minutes}`` into ``days``, growing or trimming it."""
+    for date, minutes in sorted(values.items()):
+        if activity.first_day is None:
+            if not minutes:
+                continue
+            activity.first_day = date
+        offset = (date - activity.first_day).days
+        if offset < 0:
+            if not minutes:
+                continue
+            days[0:0] = array("H", [0]) * -offset
+            activity.first_day, offset = date, 0
+        if offset >= len(days):
+            if not minutes:
+                continue
+            days.extend([0] * (offset - len(days) + 1))
+        days[offset] = minutes
+
+    # Keep the first and last entries active.
+    start = next((i for i, minutes in enumerate(days) if minutes), len(days))
+    del days[:start]
+    while days and not days[-1]:
+        days.pop()
+    activity.first_day = activity.first_day + timedelta(days=start) if days else None
+
+
+def summarise(activity, days):
+    active = longest = run = 0
+    for minutes in days:
+        if minutes:
+            active += 1
+            run += 1
+            longest = max(longest, run)
+        else:
+            run = 0
+    activity.active_days = active
+    activity.longest_streak = longest
+    activity.streak_length = run
+    activity.streak_end = activity.first_day + timedelta(days=len(days) - 1) if days else None
+
+
+def fill(activity, values):
+    """Fills an empty activity from ``{date: minutes}``."""
+    days = array("H")
+    set_days(activity, days, values)
+    summarise(activity, days)
+    pack_days(activity, days)
+    return activity
+
+
+def refresh_days(user_id, dates, create=True):
+    """
+    Re-reads ``dates`` from the user's rollups into their activity. With
+    ``create=False`` a missing activity row is left missing.
+    """
+    dates = set(dates)
+    if not dates:
+        return
+    with transaction.atomic():
+        activities = StudyActivity.objects.select_for_update()
+        if create:
+            activity, _ = activities.get_or_create(user_id=user_id)
+        else:
+            activity = activities.filter(user_id=user_id).first()
+            if activity is None:
+                return
+        # Read under the lock: a concurrent writer's rollups for the same
+        # day are then committed, or its refresh runs after this one.
+        totals = (
+            DailyStudyRollup.objects.filter(user_id=user_id, date__in=dates)
+            .values("date").annotate(count=Sum("session_count"), duration=Sum("total_duration"))
+            .order_by()
+        )
+        values = dict.fromkeys(dates, 0)
+        values.update((row["date"], day_value(row["count"], row["duration"])) for row in totals)
+        days = unpack_days(activity)
+        set_days(activity, days, values)
+        summarise(activity, days)
+        pack_days(activity, days)
+        activity.save()
+
+
+def rebuild_activity(user=None):
+    """Recomputes StudyActivity from the rollups, for one user or everyone."""
+    rollups = DailyStudyRollup.objects.all()
+    activities = StudyActivity.objects.all()
+    if user is not None:
+        rollups = rollups.filter(user=user)
+        activities = activities.filter(user=user)
+    totals = (
+        rollups.values("user_id", "date")
+        .annotate(count=Sum("session_count"), duration=Sum("total_duration"))
+        .order_by("user_id", "date")
+    )
+    per_user = {}
+    for row in totals.iterator():
+        per_user.setdefault(row["user_id"], {})[row["date"]] = day_value(
+            row["count"], row["duration"])
+
+    built = [fill(StudyActivity(user_id=user_id), values) for user_id, values in per_user.items()]
+    with transaction.atomic():
+        activities.delete()
+        StudyActivity.objects.bulk_create(built, batch_size=500)
+    return len(built)
+
+
+def current_streak(activity, today=None):
+    """Days in the running streak; it survives until the end of tomorrow."""
+    today = today or timezone.localdate()
+    if activity.streak_end is None or (today - activity.streak_end).days > 1:
+        return 0
+    return activity.streak_length
+
+
+def day_minutes(activity, start, end):
+    """Minutes studied on each day from ``start`` to ``end`` inclusive."""
+    days = unpack_days(activity)
+    length = (end - start).days + 1
+    if activity.first_day is None:
+        return [0] * length
+    offset = (start - activity.first_day).days
+    return [
+        days[offset + i] if 0 <= offset + i < len(days) else 0
+        for i in range(length)
+    ]
+
+
+def heatmap_level(minutes):
+    return sum(minutes >= threshold for threshold in HEATMAP_LEVELS)
+
+
+def year_range(year=None, today=None):
+    """A calendar year, or the 365 days up to today."""
+    if year is not None:
+        return date(year, 1, 1), date(year, 12, 31)
+    today = today or timezone.localdate()
+    return today - timedelta(days=364), today
+
+
+def heatmap_weeks(start, minutes):
+    """
+    Columns of seven days (Monday first) for the dashboard heatmap; days
+    outside the range are None.
+    """
+    cells = [None] * start.weekday() + [
+        {"date": start + timedelta(days=i), "minutes": value, "level": heatmap_level(value)}
+        for i, value in enumerate(minutes)
+    ]
+    cells += [None] * (-len(cells) % 7)
+    return [cells[i:i + 7] for i in range(0, len(cells), 7)]
+
+
+def activity_summary(user, start, end, today=None):
+    activity = StudyActivity.objects.filter(user=user).first() or StudyActivity(user=user)
+    return {
+        "current_streak": current_streak(activity, today),
+        "longest_streak": activity.longest_streak,
+        "active_days": activity.active_days,
+        "start": start,
+        "end": end,
+        "minutes": day_minutes(activity, start, end),
+    }
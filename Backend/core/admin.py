@@ -1,9 +1,60 @@
 from django.contrib import admin
-from .models import Skill, StudySession, UserProfile, Address
+from django.template.loader import render_to_string
+from django.utils import timezone
+from .models import Skill, StudySession, UserProfile, Address, Task, RequestProfile
+from . import profiling
 
 # Register your models here.
 
+
+@admin.register(StudySession)
+class StudySessionAdmin(admin.ModelAdmin):
+    list_display = ["__str__", "duration"]
+    list_select_related = ["user", "skill"]
+
+
+@admin.register(Task)
+class TaskAdmin(admin.ModelAdmin):
+    list_display = ["__str__", "user", "attempts", "run_after", "finished_at"]
+    list_filter = ["status", "name"]
+    list_select_related = ["user"]
+    actions = ["retry"]
+
+    @admin.action(description="Queue selected tasks again")
+    def retry(self, request, queryset):
+        queryset.exclude(status=Task.RUNNING).update(
+            status=Task.QUEUED, attempts=0, run_after=timezone.now())
+
+
+@admin.register(RequestProfile)
+class RequestProfileAdmin(admin.ModelAdmin):
+    list_display = ["__str__", "user", "status_code", "duration_ms", "created_at"]
+    list_filter = ["method", "status_code"]
+    list_select_related = ["user"]
+    search_fields = ["path"]
+    readonly_fields = [
+        "user", "method", "path", "status_code", "duration_ms", "file_name", "created_at",
+        "report",
+    ]
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    @admin.display(description="Profile")
+    def report(self, profile):
+        try:
+            stats = profiling.load_stats(profile)
+        except OSError:
+            return "The profile file is missing."
+        return render_to_string("admin/core/requestprofile/report.html", {
+            "hot_functions": profiling.hot_functions(stats),
+            "call_tree": profiling.call_tree(stats),
+        })
+
+
 admin.site.register(Skill)
-admin.site.register(StudySession)
 admin.site.register(UserProfile)
 admin.site.register(Address)
@@ -0,0 +1,232 @@
+import json
+from asgiref.sync import sync_to_async
+from django.contrib.auth.models import User
+from django.http import Http404, HttpResponse, JsonResponse
+from django.shortcuts import aget_object_or_404
+from django.views import View
+from django.views.decorators.csrf import csrf_exempt
+from rest_framework import status
+from rest_framework.exceptions import (
+    APIException, NotAuthenticated, ParseError, Throttled, UnsupportedMediaType)
+from rest_framework.settings import api_settings as drf_settings
+from rest_framework.utils.encoders import JSONEncoder
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken
+from rest_framework_simplejwt.settings import api_settings as jwt_settings
+from .authentication import auser_stamp, token_cache_key, user_cache
+from .models import Skill, StudySession
+from .pagination import SessionPagination, SkillPagination
+from .throttling import AuthThrottle
+from .serializers import SkillSerializer, StudySessionSerializer, RegisterSerializer
+from . import batch, conditional
+
+# Async counterparts of the API views in views.py, for serving under ASGI
+# (e.g. uvicorn skilltrack.asgi:application). Database access goes through
+# Django's async ORM; DRF serializers are reused for validation and output.
+
+
+def api_response(data=None, status=status.HTTP_200_OK):
+    if data is None:
+        return HttpResponse(status=status)
+    return JsonResponse(data, status=status, safe=False, encoder=JSONEncoder)
+
+
+class AsyncAPIView(View):
+    authentication_required = True
+    throttle_classes = drf_settings.DEFAULT_THROTTLE_CLASSES
+
+    @classmethod
+    def as_view(cls, **initkwargs):
+        # Authentication is by bearer token only, like the DRF views.
+        return csrf_exempt(super().as_view(**initkwargs))
+
+    async def dispatch(self, request, *args, **kwargs):
+        try:
+            if self.authentication_required:
+                request.user = await self.authenticate(request)
+            self.check_throttles(request)
+            return await super().dispatch(request, *args, **kwargs)
+        except APIException as exc:
+            detail = exc.detail if isinstance(exc.detail, dict) else {"detail": exc.detail}
+            response = api_response(detail, status=exc.status_code)
+            if getattr(exc, "wait", None):
+                response["Retry-After"] = str(exc.wait)
+            return response
+        except Http404 as exc:
+            return api_response({"detail": str(exc)}, status=status.HTTP_404_NOT_FOUND)
+
+    async def authenticate(self, request):
+        authentication = JWTAuthentication()
+        header = authentication.get_header(request)
+        raw_token = authentication.get_raw_token(header) if header else None
+        if raw_token is None:
+            raise NotAuthenticated()
+        token = authentication.get_validated_token(raw_token)
+        key = token_cache_key(token)
+        if key is None:
+            raise InvalidToken("Token contained no recognizable user identification")
+        stamp = await auser_stamp(key[0])
+        user = user_cache.get(key, stamp)
+        if user is None:
+            user = await User.objects.filter(
+                **{jwt_settings.USER_ID_FIELD: token[jwt_settings.USER_ID_CLAIM]}).afirst()
+            if user is None or not user.is_active:
+                raise InvalidToken("User not found or inactive")
+            user_cache.set(key, user, stamp)
+        return user
+
+    def check_throttles(self, request):
+        waits = [
+            throttle.wait() for throttle in (cls() for cls in self.throttle_classes)
+            if not throttle.allow_request(request, self)
+        ]
+        if waits:
+            raise Throttled(max(waits))
+
+    def parse_body(self, request):
+        if request.content_type != "application/json":
+            raise UnsupportedMediaType(request.content_type)
+        try:
+            return json.loads(request.body or b"{}")
+        except ValueError as exc:
+            raise ParseError(f"JSON parse error - {exc}")
+
+
+class AsyncSkillListCreateView(AsyncAPIView):
+
+    async def get(self, request):
+        queryset = Skill.objects.filter(user=request.user)
+        etag, last_modified = conditional.validators(
+            request, *await conditional.acollection_state(queryset))
+        return await conditional.aconditional_get(
+            request, etag, last_modified, lambda: self.list_response(request, queryset))
+
+    async def list_response(self, request, queryset):
+        paginator = SkillPagination()
+        options = SkillSerializer.request_options(request)
+        if options:
+            queryset = SkillSerializer(**options).select_columns(queryset, *paginator.ordering)
+        if paginator.is_requested(request):
+            rows = [skill async for skill in paginator.get_page_queryset(queryset, request)]
+            page = paginator.get_page(rows)
+            return api_response(paginator.get_paginated_data(
+                SkillSerializer(page, many=True, **options).data))
+        skills = [skill async for skill in queryset]
+        return api_response(SkillSerializer(skills, many=True, **options).data)
+
+    async def post(self, request):
+        serializer = SkillSerializer(data=self.parse_body(request))
+        if not serializer.is_valid():
+            return api_response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        skill = await Skill.objects.acreate(user=request.user, **serializer.validated_data)
+        return api_response(SkillSerializer(skill).data, status=status.HTTP_201_CREATED)
+
+
+class AsyncSkillDetailView(AsyncAPIView):
+
+    async def get_skill(self, pk):
+        return await aget_object_or_404(Skill, pk=pk, user=self.request.user)
+
+    async def get(self, request, pk):
+        skill = await self.get_skill(pk)
+        etag, last_modified = conditional.validators(request, skill.updated_at)
+
+        async def build_response():
+            return api_response(SkillSerializer(skill).data)
+        return await conditional.aconditional_get(request, etag, last_modified, build_response)
+
+    async def put(self, request, pk):
+        skill = await self.get_skill(pk)
+        serializer = SkillSerializer(skill, data=self.parse_body(request))
+        if not serializer.is_valid():
+            return api_response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        for field, value in serializer.validated_data.items():
+            setattr(skill, field, value)
+        await skill.asave()
+        return api_response(SkillSerializer(skill).data)
+
+    async def delete(self, request, pk):
+        skill = await self.get_skill(pk)
+        await sync_to_async(batch.delete_skills)(request.user, [skill.pk])
+        return api_response(status=status.HTTP_204_NO_CONTENT)
+
+
+class AsyncSessionListCreateView(AsyncAPIView):
+
+    async def get(self, request):
+        queryset = StudySession.objects.filter(
+            user=request.user).select_related("skill")
+        etag, last_modified = conditional.validators(
+            request, *await conditional.acollection_state(
+                queryset, Skill.objects.filter(user=request.user)))
+        return await conditional.aconditional_get(
+            request, etag, last_modified, lambda: self.list_response(request, queryset))
+
+    async def list_response(self, request, queryset):
+        paginator = SessionPagination()
+        options = StudySessionSerializer.request_options(request)
+        if options:
+            queryset = StudySessionSerializer(**options).select_columns(queryset, *paginator.ordering)
+        if paginator.is_requested(request):
+            rows = [session async for session in paginator.get_page_queryset(queryset, request)]
+            page = paginator.get_page(rows)
+            return api_response(paginator.get_paginated_data(
+                StudySessionSerializer(page, many=True, **options).data))
+        sessions = [session async for session in queryset]
+        return api_response(StudySessionSerializer(sessions, many=True, **options).data)
+
+    async def post(self, request):
+        serializer = StudySessionSerializer(data=self.parse_body(request))
+        # The skill and user fields are looked up while validating.
+        if not await sync_to_async(serializer.is_valid)():
+            return api_response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        data = {**serializer.validated_data, "user": request.user}
+        session = await StudySession.objects.acreate(**data)
+        return api_response(StudySessionSerializer(session).data, status=status.HTTP_201_CREATED)
+
+
+class AsyncSessionDetailView(AsyncAPIView):
+
+    async def get_session(self, pk):
+        return await aget_object_or_404(
+            StudySession.objects.select_related("skill"), pk=pk, user=self.request.user)
+
+    async def get(self, request, pk):
+        session = await self.get_session(pk)
+        etag, last_modified = conditional.validators(
+            request, session.updated_at, session.skill.updated_at)
+
+        async def build_response():
+            return api_response(StudySessionSerializer(session).data)
+        return await conditional.aconditional_get(request, etag, last_modified, build_response)
+
+    async def put(self, request, pk):
+        session = await self.get_session(pk)
+        serializer = StudySessionSerializer(session, data=self.parse_body(request))
+        if not await sync_to_async(serializer.is_valid)():
+            return api_response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        for field, value in serializer.validated_data.items():
+            setattr(session, field, value)
+        await session.asave()
+        return api_response(StudySessionSerializer(session).data)
+
+    async def delete(self, request, pk):
+        session = await self.get_session(pk)
+        await session.adelete()
+        return api_response(status=status.HTTP_204_NO_CONTENT)
+
+
+class AsyncRegisterView(AsyncAPIView):
+    authentication_required = False
+    throttle_classes = [AuthThrottle]
+
+    async def post(self, request):
+        serializer = RegisterSerializer(data=self.parse_body(request))
+        if not await sync_to_async(serializer.is_valid)():
+            return api_response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        await User.objects.acreate_user(
+            username=serializer.validated_data["username"],
+            email=serializer.validated_data["email"],
+            password=serializer.validated_data["password"],
+        )
+        return api_response(status=status.HTTP_201_CREATED)
@@ -0,0 +1,139 @@
+import hmac
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import cache
+from rest_framework.authentication import BaseAuthentication
+from rest_framework.permissions import BasePermission
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.settings import api_settings as jwt_settings
+
+
+class UserCache:
+    """
+    Small thread-safe LRU of authenticated users with a per-entry expiry.
+    It lives in each process. Every entry also records the user's stamp from
+    the shared cache (see ``user_stamp``) and is only served while the stamp
+    is unchanged, so a change saved by another worker is picked up on its
+    next request instead of when the entry expires.
+    """
+
+    def __init__(self, max_size, timeout):
+        self.max_size = max_size
+        self.timeout = timeout
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key, stamp):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            user, entry_stamp, expires = entry
+            if entry_stamp != stamp or expires < time.monotonic():
+                del self.entries[key]
+                return None
+            self.entries.move_to_end(key)
+        # Each request gets its own instance to mutate.
+        return detached_copy(user)
+
+    def set(self, key, user, stamp):
+        user = detached_copy(user)
+        with self.lock:
+            self.entries[key] = (user, stamp, time.monotonic() + self.timeout)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+
+    def invalidate_user(self, user_id):
+        user_id = str(user_id)
+        with self.lock:
+            for key in [key for key in self.entries if key[0] == user_id]:
+                del self.entries[key]
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+
+def detached_copy(user):
+    """
+    A new instance with the same column values. It has its own ``_state``,
+    so relations loaded in one request (profile, study_activity) are not
+    shared with others.
+    """
+    fields = user._meta.concrete_fields
+    return type(user).from_db(
+        user._state.db, [field.attname for field in fields],
+        [getattr(user, field.attname) for field in fields])
+
+
+user_cache = UserCache(settings.JWT_USER_CACHE_SIZE, settings.JWT_USER_CACHE_TIMEOUT)
+
+STAMP_KEY = "jwt-user-stamp:{}"
+
+
+def user_stamp(user_id):
+    """
+    The user's current stamp in the default cache, ``None`` until the first
+    change. With the in-memory backend every process has its own, so a
+    deployment with several workers needs a shared ``CACHE_BACKEND`` for
+    changes to reach the others before ``JWT_USER_CACHE_TIMEOUT``.
+    """
+    return cache.get(STAMP_KEY.format(user_id))
+
+
+async def auser_stamp(user_id):
+    return await cache.aget(STAMP_KEY.format(user_id))
+
+
+def forget_user(user_id):
+    """Drops the user's cached entries here and, via the stamp, everywhere else."""
+    cache.set(STAMP_KEY.format(user_id), uuid.uuid4().hex, None)
+    user_cache.invalidate_user(user_id)
+
+
+def token_cache_key(validated_token):
+    """``(user id, token id)``, or ``None`` without a user id claim."""
+    user_id = validated_token.get(jwt_settings.USER_ID_CLAIM)
+    if user_id is None:
+        return None
+    return (str(user_id), validated_token.get(jwt_settings.JTI_CLAIM) or str(validated_token))
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    """JWTAuthentication that skips the user query for recently seen tokens."""
+
+    def get_user(self, validated_token):
+        key = token_cache_key(validated_token)
+        if key is None:
+            return super().get_user(validated_token)
+        stamp = user_stamp(key[0])
+        user = user_cache.get(key, stamp)
+        if user is None:
+            user = super().get_user(validated_token)
+            user_cache.set(key, user, stamp)
+        return user
+
+
+class MetricsTokenAuthentication(BaseAuthentication):
+    """The shared ``METRICS_TOKEN`` as a bearer token, for metrics scrapers."""
+
+    def authenticate(self, request):
+        token = settings.METRICS_TOKEN
+        header = request.headers.get("Authorization", "")
+        if token and hmac.compare_digest(header.encode(), f"Bearer {token}".encode()):
+            return AnonymousUser(), "metrics"
+        return None
+
+    def authenticate_header(self, request):
+        return 'Bearer realm="api"'
+
+
+class HasMetricsToken(BasePermission):
+
+    def has_permission(self, request, view):
+        return request.auth == "metrics"
@@ -0,0 +1,141 @@
+import logging
+import time
+import traceback
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from datetime import timedelta
+from django.conf import settings
+from django.db import close_old_connections
+from django.db.models import F
+from django.utils import timezone
+from .models import Task
+
+# A small database-backed task queue. Functions decorated with @task are
+# queued with .enqueue() and run by ``manage.py run_tasks``; task modules are
+# the ``tasks.py`` of each installed app.
+
+logger = logging.getLogger(__name__)
+
+registry = {}
+
+
+class TaskFunction:
+
+    def __init__(self, func, name, max_attempts, retry_delay):
+        self.func = func
+        self.name = name
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
+
+    def __call__(self, *args, **kwargs):
+        return self.func(*args, **kwargs)
+
+    def enqueue(self, *args, owner=None, delay=None, **kwargs):
+        """
+        Queues a call with JSON-serialisable arguments. The row is part of
+        the current transaction, so a rolled back request queues nothing.
+        """
+        return Task.objects.create(
+            name=self.name, args=list(args), kwargs=kwargs, user=owner,
+            max_attempts=self.max_attempts,
+            run_after=timezone.now() + (delay or timedelta()))
+
+
+def task(func=None, *, name=None, max_attempts=3, retry_delay=timedelta(seconds=30)):
+    def register(func):
+        wrapper = TaskFunction(
+            func, name or f"{func.__module__}.{func.__qualname__}", max_attempts, retry_delay)
+        registry[wrapper.name] = wrapper
+        return wrapper
+    return register(func) if func is not None else register
+
+
+def claim(limit):
+    """Marks up to ``limit`` due tasks as running and returns their ids."""
+    now = timezone.now()
+    candidates = Task.objects.filter(
+        status=Task.QUEUED, run_after__lte=now).order_by("run_after", "id").values_list(
+        "pk", flat=True)[:limit]
+    # The conditional update is the lock: when several workers race for the
+    # same row, only one of them changes it.
+    return [
+        pk for pk in candidates
+        if Task.objects.filter(pk=pk, status=Task.QUEUED).update(
+            status=Task.RUNNING, started_at=now, attempts=F("attempts") + 1)
+    ]
+
+
+def run_task(pk):
+    task = Task.objects.get(pk=pk)
+    function = registry.get(task.name)
+    try:
+        if function is None:
+            raise LookupError(f"No task is registered as {task.name!r}.")
+        function(*task.args, **task.kwargs)
+    except Exception:
+        logger.exception("Task %s failed (attempt %s of %s)", task, task.attempts, task.max_attempts)
+        update = {"last_error": traceback.format_exc(), "finished_at": timezone.now()}
+        if function is not None and task.attempts < task.max_attempts:
+            update.update(status=Task.QUEUED, run_after=timezone.now() + (
+                function.retry_delay * 2 ** (task.attempts - 1)))
+        else:
+            update["status"] = Task.FAILED
+        Task.objects.filter(pk=pk).update(**update)
+        return False
+    Task.objects.filter(pk=pk).update(
+        status=Task.SUCCEEDED, last_error="", finished_at=timezone.now())
+    return True
+
+
+def run_pending():
+    """Runs every due task in the current thread; returns how many ran."""
+    ran = 0
+    while pks := claim(1):
+        run_task(pks[0])
+        ran += 1
+    return ran
+
+
+def requeue_stale():
+    """Puts back tasks left running by a worker that died."""
+    cutoff = timezone.now() - timedelta(seconds=settings.TASKS_STALE_AFTER)
+    return Task.objects.filter(status=Task.RUNNING, started_at__lt=cutoff).update(
+        status=Task.QUEUED, run_after=timezone.now())
+
+
+def _run_in_thread(pk):
+    close_old_connections()
+    try:
+        return run_task(pk)
+    finally:
+        close_old_connections()
+
+
+class Worker:
+    """Runs queued tasks on a thread pool of ``concurrency`` threads."""
+
+    def __init__(self, concurrency=4, poll_interval=1.0):
+        self.concurrency = concurrency
+        self.poll_interval = poll_interval
+        self.stopping = False
+
+    def run(self, burst=False):
+        requeue_stale()
+        running = set()
+        with ThreadPoolExecutor(self.concurrency, thread_name_prefix="task-worker") as pool:
+            while not self.stopping:
+                free = self.concurrency - len(running)
+                pks = claim(free) if free else []
+                running.update(pool.submit(_run_in_thread, pk) for pk in pks)
+                if not running:
+                    if burst:
+                        break
+                    time.sleep(self.poll_interval)
+                    continue
+                # Claim again straight away while tasks keep coming in.
+                _, running = wait(
+                    running, timeout=0 if pks else self.poll_interval,
+                    return_when=FIRST_COMPLETED)
+            wait(running)
+
+    def stop(self, *args):
+        self.stopping = True
@@ -0,0 +1,142 @@
+from collections import defaultdict
+from datetime import timedelta
+from functools import partial
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, Sum
+from django.utils import timezone
+from rest_framework.exceptions import ValidationError
+from .models import DailyStudyRollup, Skill, StudySession
+from . import activity, caching, rollups, search, tasks
+
+# Set-based updates and deletes of many sessions or skills at once. The
+# per-row signals (rollups, activity, data version) do not run for queryset
+# updates and raw deletes, so each operation applies their effect once for
+# the whole set. The search index follows through its database triggers.
+# Deleted skills are only hidden here; tasks.delete_skill purges them.
+
+MAX_ROWS = getattr(settings, "BATCH_MAX_ROWS", 5000)
+# Changing these moves a session to another rollup row.
+ROLLUP_FIELDS = {"skill", "date", "duration"}
+
+
+def session_queryset(user, data):
+    sessions = StudySession.objects.filter(user=user)
+    if "ids" in data:
+        return sessions.filter(pk__in=data["ids"])
+    criteria = data["filter"]
+    if "skill" in criteria:
+        sessions = sessions.filter(skill_id=criteria["skill"])
+    if "from" in criteria:
+        sessions = sessions.filter(date__gte=criteria["from"])
+    if "to" in criteria:
+        sessions = sessions.filter(date__lte=criteria["to"])
+    return sessions
+
+
+def skill_queryset(user, data):
+    skills = Skill.objects.filter(user=user)
+    if "ids" in data:
+        return skills.filter(pk__in=data["ids"])
+    return skills.filter(category=data["filter"]["category"])
+
+
+def session_totals(sessions):
+    """``{(skill_id, date): [count, duration]}`` of ``sessions``."""
+    grouped = (
+        sessions.values("skill_id", "date")
+        .annotate(count=Count("id"), duration=Sum("duration"))
+        .order_by()
+    )
+    return {(row["skill_id"], row["date"]): [row["count"], row["duration"] or timedelta()]
+            for row in grouped}
+
+
+def merge_deltas(removed, added):
+    deltas = defaultdict(lambda: [0, timedelta()])
+    for key, (count, duration) in removed.items():
+        deltas[key][0] -= count
+        deltas[key][1] -= duration
+    for key, (count, duration) in added.items():
+        deltas[key][0] += count
+        deltas[key][1] += duration
+    return {key: delta for key, delta in deltas.items() if delta[0] or delta[1]}
+
+
+def raw_delete(queryset):
+    # A single DELETE statement: QuerySet.delete() would load every row to
+    # send its post_delete signal.
+    return queryset._raw_delete(queryset.db)
+
+
+def lock_ids(queryset):
+    ids = list(queryset.select_for_update().order_by("pk").values_list("pk", flat=True)[:MAX_ROWS + 1])
+    if len(ids) > MAX_ROWS:
+        raise ValidationError({"filter": [f"Matches more than {MAX_ROWS} rows; narrow it down."]})
+    return ids
+
+
+def results(data, ids, outcome):
+    """One ``{"id", "status"}`` per requested id, or per matched row for filters."""
+    found = set(ids)
+    requested = dict.fromkeys(data["ids"]) if "ids" in data else ids
+    return [{"id": pk, "status": outcome if pk in found else "not_found"} for pk in requested]
+
+
+def refresh_user_data(user_id, deltas):
+    rollups.apply_bulk_deltas(user_id, deltas)
+    activity.refresh_days(user_id, {date for _, date in deltas})
+    transaction.on_commit(partial(caching.bump_data_version, user_id))
+
+
+def batch_sessions(user, data):
+    with transaction.atomic():
+        ids = lock_ids(session_queryset(user, data))
+        sessions = StudySession.objects.filter(pk__in=ids)
+        before = session_totals(sessions)
+        if data["action"] == "delete":
+            raw_delete(sessions)
+            refresh_user_data(user.id, merge_deltas(before, {}))
+            return results(data, ids, "deleted")
+
+        changes = data["changes"]
+        # auto_now is not applied by update(); the cached cards key on it.
+        sessions.update(**changes, updated_at=timezone.now())
+        after = session_totals(sessions) if ROLLUP_FIELDS & changes.keys() else before
+        refresh_user_data(user.id, merge_deltas(before, after))
+        return results(data, ids, "updated")
+
+
+def batch_skills(user, data):
+    with transaction.atomic():
+        ids = lock_ids(skill_queryset(user, data))
+        skills = Skill.objects.filter(pk__in=ids)
+        if data["action"] == "update":
+            skills.update(**data["changes"], updated_at=timezone.now())
+            transaction.on_commit(partial(caching.bump_data_version, user.id))
+            return results(data, ids, "updated")
+
+        delete_skills(user, ids)
+        return results(data, ids, "deleted")
+
+
+def delete_skills(user, ids):
+    """
+    Marks the skills deleted, which hides them and their sessions from the
+    default managers, and queues their purge. Only the rollups and search
+    entries go now, so this does not grow with the number of sessions.
+    """
+    with transaction.atomic():
+        skills = Skill.objects.filter(user=user, pk__in=ids)
+        # Only the user's own, not yet deleted skills from here on.
+        ids = list(skills.values_list("pk", flat=True))
+        now = timezone.now()
+        skills.update(deleted_at=now, updated_at=now)
+        rollup_rows = DailyStudyRollup.objects.filter(user=user, skill_id__in=ids)
+        dates = set(rollup_rows.values_list("date", flat=True))
+        raw_delete(rollup_rows)
+        search.forget_skills(ids)
+        activity.refresh_days(user.id, dates)
+        transaction.on_commit(partial(caching.bump_data_version, user.id))
+        for pk in ids:
+            tasks.delete_skill.enqueue(pk, owner=user)
@@ -0,0 +1,88 @@
+import os
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.utils import timezone
+from .models import DataVersion
+
+DASHBOARD_CACHE_TIMEOUT = getattr(settings, "DASHBOARD_CACHE_TIMEOUT", 60 * 60 * 24)
+FRAGMENT_CACHE_TIMEOUT = getattr(settings, "FRAGMENT_CACHE_TIMEOUT", 60 * 60 * 24 * 7)
+
+HITS_KEY = "dashboard-cache:hits"
+MISSES_KEY = "dashboard-cache:misses"
+
+
+def get_data_version(user_id):
+    # The version lives in the database: with a per-process cache, another
+    # worker's write would not move it here and stale entries would be served.
+    version = DataVersion.objects.filter(user_id=user_id).values_list("version", flat=True).first()
+    return version or 0
+
+
+def bump_data_version(user_id):
+    """Invalidates every cached entry derived from the user's data."""
+    if user_id is None:
+        return
+    if DataVersion.objects.filter(user_id=user_id).update(version=F("version") + 1):
+        return
+    # The first write, or the user has just been deleted.
+    if not User.objects.filter(pk=user_id).exists():
+        return
+    try:
+        with transaction.atomic():
+            DataVersion.objects.create(user_id=user_id)
+    except IntegrityError:
+        # Another writer created the row first.
+        DataVersion.objects.filter(user_id=user_id).update(version=F("version") + 1)
+
+
+def _count(key):
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.add(key, 0, timeout=None)
+        cache.incr(key)
+
+
+def get_dashboard_context(user_id, compute):
+    # Streaks depend on the current day as well as on the data.
+    key = f"dashboard:{user_id}:v{get_data_version(user_id)}:{timezone.localdate()}"
+    context = cache.get(key)
+    if context is not None:
+        _count(HITS_KEY)
+        return context
+
+    _count(MISSES_KEY)
+    context = compute()
+    cache.set(key, context, timeout=DASHBOARD_CACHE_TIMEOUT)
+    return context
+
+
+def list_fragment_context(user_id):
+    """
+    Context for the ``{% cache %}`` blocks of the session and skill lists.
+    The whole list is keyed by the data version, so any write re-renders
+    it; each card is keyed by its row's ``updated_at``, so only the cards
+    that changed are rendered again.
+    """
+    return {"data_version": get_data_version(user_id), "fragment_timeout": FRAGMENT_CACHE_TIMEOUT}
+
+
+def dashboard_cache_stats():
+    hits = cache.get(HITS_KEY, 0)
+    misses = cache.get(MISSES_KEY, 0)
+    lookups = hits + misses
+    stats = {
+        "hits": hits,
+        "misses": misses,
+        "hit_rate": round(hits / lookups, 4) if lookups else 0.0,
+        "scope": "shared",
+    }
+    # The counters sit next to the cached pages, in the default cache. The
+    # in-memory backend keeps a copy per process, so they only cover this
+    # worker's requests.
+    if settings.CACHES["default"]["BACKEND"].endswith(".LocMemCache"):
+        stats.update(scope="worker", pid=os.getpid())
+    return stats
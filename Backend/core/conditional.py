@@ -0,0 +1,71 @@
+import hashlib
+from django.db.models import Count, Max
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date, quote_etag
+
+
+def collection_state(*querysets):
+    """
+    Cheap fingerprint of the rows behind a list response: the row count and
+    the newest ``updated_at`` of each queryset. Deletes change the count,
+    inserts and edits move the timestamp. It only goes into the ETag: a
+    delete does not move the newest timestamp, so it cannot back a
+    ``Last-Modified``.
+    """
+    return [
+        queryset.aggregate(count=Count("id"), latest=Max("updated_at"))
+        for queryset in querysets
+    ]
+
+
+async def acollection_state(*querysets):
+    return [
+        await queryset.aaggregate(count=Count("id"), latest=Max("updated_at"))
+        for queryset in querysets
+    ]
+
+
+def validators(request, *parts):
+    """Returns ``(etag, last_modified)`` for the response to ``request``."""
+    # The body also depends on the query string (e.g. pagination) and
+    # the negotiated renderer, so both are part of the tag.
+    renderer = getattr(request, "accepted_media_type", "")
+    digest = hashlib.md5(usedforsecurity=False)
+    digest.update(f"{request.user.pk}|{request.get_full_path()}|{renderer}".encode())
+    timestamps = []
+    for part in parts:
+        digest.update(f"|{part}".encode())
+        if hasattr(part, "timestamp"):
+            timestamps.append(part)
+    last_modified = int(max(timestamps).timestamp()) if timestamps else None
+    return digest.hexdigest(), last_modified
+
+
+def conditional_get(request, etag, last_modified, build_response):
+    """
+    Answers ``304 Not Modified`` when the client's validators still match,
+    otherwise calls ``build_response`` and tags the result.
+    """
+    response = get_conditional_response(
+        request, etag=quote_etag(etag), last_modified=last_modified)
+    if response is None:
+        response = build_response()
+    return tag_response(response, etag, last_modified)
+
+
+async def aconditional_get(request, etag, last_modified, build_response):
+    response = get_conditional_response(
+        request, etag=quote_etag(etag), last_modified=last_modified)
+    if response is None:
+        response = await build_response()
+    return tag_response(response, etag, last_modified)
+
+
+def tag_response(response, etag, last_modified):
+    if response.status_code in (200, 304):
+        response["ETag"] = quote_etag(etag)
+        if last_modified is not None:
+            response["Last-Modified"] = http_date(last_modified)
+        # Rows are per user: only private caches, and always revalidate.
+        patch_cache_control(response, private=True, no_cache=True)
+    return response
@@ -0,0 +1,108 @@
+import csv
+import json
+from django.core.serializers.json import DjangoJSONEncoder
+from django.utils.duration import duration_string
+from rest_framework.renderers import BaseRenderer
+from .models import Skill, StudySession
+
+CHUNK_SIZE = 2000
+
+
+class StreamingRenderer(BaseRenderer):
+    """
+    Only used for content negotiation: export views stream their own body.
+    Error responses (e.g. 401) still need a body, so they are sent as JSON.
+    """
+    charset = "utf-8"
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b""
+        return json.dumps(data, cls=DjangoJSONEncoder).encode()
+
+
+class CSVRenderer(StreamingRenderer):
+    media_type = "text/csv"
+    format = "csv"
+
+
+class NDJSONRenderer(StreamingRenderer):
+    media_type = "application/x-ndjson"
+    format = "ndjson"
+
+
+class Echo:
+    # csv.writer only needs write(); hand each encoded line straight back.
+    def write(self, value):
+        return value
+
+
+class Export:
+    model = None
+    columns = ()
+    ordering = ()
+    date_field = None
+
+    def __init__(self, user, date_from=None, date_to=None):
+        queryset = self.model.objects.filter(user=user)
+        if date_from:
+            queryset = queryset.filter(**{f"{self.date_field}__gte": date_from})
+        if date_to:
+            queryset = queryset.filter(**{f"{self.date_field}__lte": date_to})
+        self.queryset = queryset.order_by(*self.ordering)
+
+    def rows(self):
+        # values_list() skips model instantiation and iterator() keeps a
+        # server-side cursor open instead of loading the whole result.
+        names = [name for name, _ in self.columns]
+        lookups = [lookup for _, lookup in self.columns]
+        for values in self.queryset.values_list(*lookups).iterator(chunk_size=CHUNK_SIZE):
+            yield dict(zip(names, map(self.clean, values)))
+
+    @staticmethod
+    def clean(value):
+        if hasattr(value, "total_seconds"):
+            return duration_string(value)
+        if hasattr(value, "isoformat"):
+            return value.isoformat()
+        return value
+
+    def stream_csv(self):
+        writer = csv.writer(Echo())
+        yield writer.writerow([name for name, _ in self.columns])
+        for row in self.rows():
+            yield writer.writerow(row.values())
+
+    def stream_ndjson(self):
+        for row in self.rows():
+            yield json.dumps(row) + "\n"
+
+
+class SessionExport(Export):
+    model = StudySession
+    ordering = ("date", "id")
+    date_field = "date"
+    columns = (
+        ("id", "id"),
+        ("date", "date"),
+        ("duration", "duration"),
+        ("skill", "skill_id"),
+        ("skill_name", "skill__name"),
+        ("skill_category", "skill__category"),
+        ("notes", "notes"),
+        ("created_at", "created_at"),
+    )
+
+
+class SkillExport(Export):
+    model = Skill
+    ordering = ("created_at", "id")
+    date_field = "created_at__date"
+    columns = (
+        ("id", "id"),
+        ("name", "name"),
+        ("category", "category"),
+        ("description", "description"),
+        ("created_at", "created_at"),
+        ("updated_at", "updated_at"),
+    )
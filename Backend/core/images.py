@@ -0,0 +1,63 @@
+import posixpath
+from io import BytesIO
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from PIL import Image, ImageOps
+from .models import UserProfile
+
+DEFAULT_PICTURE = "profile_pics/default.jpg"
+
+# name: (width, height, square crop)
+PICTURE_VARIANTS = {
+    "avatar": (96, 96, True),
+    "card": (360, 360, True),
+    "full": (1280, 1280, False),
+}
+JPEG_QUALITY = 82
+
+
+def variant_name(original, variant):
+    directory, filename = posixpath.split(original)
+    stem = posixpath.splitext(filename)[0]
+    return posixpath.join(directory, "variants", f"{stem}_{variant}.jpg")
+
+
+def render_variant(image, width, height, crop):
+    if crop:
+        resized = ImageOps.fit(image, (width, height), Image.Resampling.LANCZOS)
+    else:
+        resized = image.copy()
+        resized.thumbnail((width, height), Image.Resampling.LANCZOS)
+    buffer = BytesIO()
+    resized.save(buffer, "JPEG", quality=JPEG_QUALITY, optimize=True, progressive=True)
+    return buffer.getvalue()
+
+
+def generate_variants(profile_id, original):
+    """
+    Writes the resized variants of ``original`` and records them on the
+    profile, unless the picture was replaced while we were working.
+    """
+    with default_storage.open(original) as source:
+        image = Image.open(source)
+        image = ImageOps.exif_transpose(image).convert("RGB")
+
+    variants = {}
+    for variant, (width, height, crop) in PICTURE_VARIANTS.items():
+        name = variant_name(original, variant)
+        if default_storage.exists(name):
+            default_storage.delete(name)
+        variants[variant] = default_storage.save(
+            name, ContentFile(render_variant(image, width, height, crop)))
+
+    updated = UserProfile.objects.filter(
+        pk=profile_id, profile_picture=original).update(profile_picture_variants=variants)
+    if not updated:
+        delete_files(variants.values())
+    return variants
+
+
+def delete_files(names):
+    for name in names:
+        if name and name != DEFAULT_PICTURE and default_storage.exists(name):
+            default_storage.delete(name)
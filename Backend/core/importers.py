@@ -0,0 +1,194 @@
+import codecs
+import csv
+import json
+from collections import defaultdict
+from datetime import timedelta
+from functools import partial
+from itertools import islice
+from django.db import transaction
+from django.utils.dateparse import parse_date, parse_duration
+from rest_framework.exceptions import ParseError, UnsupportedMediaType
+from .models import Skill, StudySession
+from . import activity, caching, rollups
+
+JSON_TYPES = ("application/json",)
+CSV_TYPES = ("text/csv",)
+NDJSON_TYPES = ("application/x-ndjson", "application/ndjson")
+SUPPORTED_TYPES = JSON_TYPES + CSV_TYPES + NDJSON_TYPES
+
+
+class ImportAborted(Exception):
+    pass
+
+
+def iter_rows(stream, content_type):
+    """Yields the raw session rows of an upload, one dict at a time."""
+    try:
+        yield from _iter_rows(stream, content_type)
+    except (UnicodeDecodeError, csv.Error) as exc:
+        raise ParseError(f"Could not read the upload - {exc}")
+
+
+def _iter_rows(stream, content_type):
+    media_type = content_type.split(";")[0].strip().lower()
+    if media_type in JSON_TYPES:
+        try:
+            rows = json.load(stream)
+        except ValueError as exc:
+            raise ParseError(f"JSON parse error - {exc}")
+        if not isinstance(rows, list):
+            raise ParseError("Expected a JSON array of sessions.")
+        yield from rows
+    elif media_type in CSV_TYPES:
+        yield from csv.DictReader(codecs.iterdecode(stream, "utf-8-sig"))
+    elif media_type in NDJSON_TYPES:
+        for line in codecs.iterdecode(stream, "utf-8"):
+            if not line.strip():
+                continue
+            try:
+                yield json.loads(line)
+            except ValueError:
+                # Keep going so every bad line is reported, not just the first.
+                yield None
+    else:
+        raise UnsupportedMediaType(media_type)
+
+
+class SessionImporter:
+    """
+    Validates and inserts study sessions for one user in batches.
+
+    Skills are resolved from a single query of the user's skills, rows are
+    checked with plain parsing functions instead of a serializer per row and
+    inserted with ``bulk_create``. The dashboard rollups are updated once per
+    import rather than once per session.
+    """
+    batch_size = 1000
+    max_reported_errors = 100
+
+    def __init__(self, user, allow_partial=False):
+        self.user = user
+        self.allow_partial = allow_partial
+        self.created = 0
+        self.error_count = 0
+        self.errors = []
+        # One entry per (skill, day), merged into the rollups after the
+        # last batch.
+        self.deltas = defaultdict(lambda: [0, timedelta()])
+        skills = Skill.objects.filter(user=user).values_list("id", "name")
+        self.skill_ids = set()
+        self.skills_by_name = defaultdict(list)
+        for skill_id, name in skills:
+            self.skill_ids.add(skill_id)
+            self.skills_by_name[name].append(skill_id)
+
+    def run(self, rows):
+        sessions = self.validate(rows)
+        try:
+            with transaction.atomic():
+                while batch := list(islice(sessions, self.batch_size)):
+                    self.insert(batch)
+                rollups.apply_bulk_deltas(self.user.id, self.deltas)
+                activity.refresh_days(self.user.id, {date for _, date in self.deltas})
+                if self.error_count and not self.allow_partial:
+                    raise ImportAborted
+                if self.created:
+                    transaction.on_commit(
+                        partial(caching.bump_data_version, self.user.id))
+        except ImportAborted:
+            self.created = 0
+        return self.result()
+
+    def validate(self, rows):
+        for number, row in enumerate(rows, start=1):
+            session, errors = self.build_session(row)
+            if errors:
+                self.add_error(number, errors)
+            else:
+                yield session
+
+    def add_error(self, number, errors):
+        self.error_count += 1
+        if len(self.errors) < self.max_reported_errors:
+            self.errors.append({"row": number, "errors": errors})
+
+    def build_session(self, row):
+        if not isinstance(row, dict):
+            return None, {"non_field_errors": ["Expected an object."]}
+
+        errors = {}
+        skill_id = self.resolve_skill(row, errors)
+
+        date = None
+        raw_date = row.get("date")
+        if not raw_date:
+            errors["date"] = ["This field is required."]
+        else:
+            try:
+                date = parse_date(str(raw_date))
+            except ValueError:
+                pass
+            if date is None:
+                errors["date"] = ["Date has wrong format. Use YYYY-MM-DD."]
+
+        duration = None
+        raw_duration = row.get("duration")
+        if raw_duration in (None, ""):
+            errors["duration"] = ["This field is required."]
+        else:
+            duration = parse_duration(str(raw_duration))
+            if duration is None or duration < timedelta(0):
+                errors["duration"] = ["Duration has wrong format. Use [DD] [HH:[MM:]]ss[.uuuuuu]."]
+
+        notes = row.get("notes") or None
+        if notes is not None and not isinstance(notes, str):
+            errors["notes"] = ["Not a valid string."]
+
+        if errors:
+            return None, errors
+        return StudySession(
+            user=self.user, skill_id=skill_id, date=date, duration=duration, notes=notes,
+        ), None
+
+    def resolve_skill(self, row, errors):
+        raw_skill = row.get("skill")
+        if raw_skill not in (None, ""):
+            skill_id = None
+            # JSON rows may hold anything; true or 1.5 is not a pk either.
+            if isinstance(raw_skill, (int, str)) and not isinstance(raw_skill, bool):
+                try:
+                    skill_id = int(raw_skill)
+                except ValueError:
+                    pass
+            if skill_id not in self.skill_ids:
+                errors["skill"] = [f'Invalid pk "{raw_skill}" - object does not exist.']
+            return skill_id
+
+        name = row.get("skill_name")
+        if not name:
+            errors["skill"] = ["This field is required."]
+            return None
+        if not isinstance(name, str):
+            errors["skill_name"] = ["Not a valid string."]
+            return None
+        matches = self.skills_by_name.get(name, [])
+        if len(matches) != 1:
+            problem = "does not exist" if not matches else "is ambiguous"
+            errors["skill_name"] = [f'Skill "{name}" {problem}.']
+            return None
+        return matches[0]
+
+    def insert(self, batch):
+        StudySession.objects.bulk_create(batch)
+        self.created += len(batch)
+        for session in batch:
+            delta = self.deltas[(session.skill_id, session.date)]
+            delta[0] += 1
+            delta[1] += session.duration
+
+    def result(self):
+        return {
+            "created": self.created,
+            "error_count": self.error_count,
+            "errors": self.errors,
+        }
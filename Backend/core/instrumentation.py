@@ -0,0 +1,221 @@
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.template.base import Template
+from rest_framework.serializers import BaseSerializer
+
+# Per-request timings of database queries, template rendering and DRF
+# serialization. They are sent back in a Server-Timing header and added to
+# per-route histograms that /metrics exposes in the Prometheus text format.
+# Histograms are kept in process memory, so each worker reports its own.
+
+SECTIONS = ("db", "template", "serializer")
+# Anything else is counted as "other", so clients cannot add label values.
+METHODS = {"GET", "HEAD", "POST", "PUT", "PATCH", "DELETE", "OPTIONS"}
+# Seconds; the Prometheus client defaults.
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+current = ContextVar("request_timings", default=None)
+
+
+class RequestTimings:
+    __slots__ = ("durations", "queries", "active")
+
+    def __init__(self):
+        self.durations = dict.fromkeys(SECTIONS, 0.0)
+        self.queries = 0
+        self.active = set()
+
+
+@contextmanager
+def section(name):
+    """Adds the time spent in the block to ``name``; nested blocks count once."""
+    timings = current.get()
+    if timings is None or name in timings.active:
+        yield
+        return
+    timings.active.add(name)
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings.durations[name] += time.perf_counter() - start
+        timings.active.discard(name)
+
+
+def record_query(execute, sql, params, many, context):
+    timings = current.get()
+    if timings is None:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        timings.durations["db"] += time.perf_counter() - start
+        timings.queries += 1
+
+
+def add_query_wrapper(sender, connection, **kwargs):
+    # Connections are reopened for every request unless CONN_MAX_AGE is set,
+    # but the wrapper object and its list stay.
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+
+def timed(name, function):
+    def wrapper(*args, **kwargs):
+        with section(name):
+            return function(*args, **kwargs)
+    wrapper.__wrapped__ = function
+    return wrapper
+
+
+def install():
+    """Hooks the timers into the database, templates and serializers once."""
+    # Connections opened in this thread before now get no connection_created.
+    for connection in connections.all(initialized_only=True):
+        add_query_wrapper(None, connection)
+    if hasattr(Template.render, "__wrapped__"):
+        return
+    connection_created.connect(add_query_wrapper, dispatch_uid="core.instrumentation")
+    Template.render = timed("template", Template.render)
+    # ListSerializer.data and Serializer.data both go through this property.
+    BaseSerializer.data = property(timed("serializer", BaseSerializer.data.fget))
+
+
+class Histogram:
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.counts[bisect_left(BUCKETS, value)] += 1
+        self.sum += value
+
+
+class Registry:
+    """Histograms by ``(metric, route, method)`` plus query counts per route."""
+
+    def __init__(self):
+        self.histograms = {}
+        self.queries = {}
+        self.lock = threading.Lock()
+
+    def observe(self, route, method, total, timings):
+        with self.lock:
+            for metric, value in (("request", total), *timings.durations.items()):
+                key = (metric, route, method)
+                if key not in self.histograms:
+                    self.histograms[key] = Histogram()
+                self.histograms[key].observe(value)
+            key = (route, method)
+            self.queries[key] = self.queries.get(key, 0) + timings.queries
+
+    def render(self):
+        with self.lock:
+            histograms = {key: (list(h.counts), h.sum) for key, h in self.histograms.items()}
+            queries = dict(self.queries)
+        lines = []
+        for metric in ("request", *SECTIONS):
+            name = f"skilltrack_{metric}_duration_seconds"
+            lines += [f"# HELP {name} {HELP[metric]}", f"# TYPE {name} histogram"]
+            for (kind, route, method), (counts, total) in sorted(histograms.items()):
+                if kind != metric:
+                    continue
+                labels = f'route="{escape(route)}",method="{method}"'
+                cumulative = 0
+                for bound, count in zip((*BUCKETS, "+Inf"), counts):
+                    cumulative += count
+                    lines.append(f'{name}_bucket{{{labels},le="{bound}"}} {cumulative}')
+                lines.append(f"{name}_sum{{{labels}}} {total}")
+                lines.append(f"{name}_count{{{labels}}} {cumulative}")
+        name = "skilltrack_db_queries_total"
+        lines += [f"# HELP {name} Database queries run by requests.", f"# TYPE {name} counter"]
+        for (route, method), count in sorted(queries.items()):
+            lines.append(f'{name}{{route="{escape(route)}",method="{method}"}} {count}')
+        return "\n".join(lines) + "\n"
+
+    def clear(self):
+        with self.lock:
+            self.histograms.clear()
+            self.queries.clear()
+
+
+HELP = {
+    "request": "Time spent handling requests.",
+    "db": "Time spent in database queries.",
+    "template": "Time spent rendering templates, including queries they run.",
+    "serializer": "Time spent in DRF serializers, including queries they run.",
+}
+
+
+def escape(value):
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+registry = Registry()
+
+
+class RequestTimingMiddleware:
+    """
+    Times each request and adds a ``Server-Timing`` header, e.g.
+    ``db;dur=12.1;desc="9 queries", template;dur=30.4, total;dur=48.9``.
+    Disabled with ``REQUEST_TIMING = False``. Works in both handler modes,
+    so it does not push an ASGI server's requests through a thread.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not getattr(settings, "REQUEST_TIMING", True):
+            raise MiddlewareNotUsed
+        install()
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        timings = RequestTimings()
+        token = current.set(timings)
+        start = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            current.reset(token)
+        return self.finish(request, response, timings, time.perf_counter() - start)
+
+    async def __acall__(self, request):
+        # Sync code run through sync_to_async gets a copy of the context,
+        # which still points at the same RequestTimings.
+        timings = RequestTimings()
+        token = current.set(timings)
+        start = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            current.reset(token)
+        return self.finish(request, response, timings, time.perf_counter() - start)
+
+    def finish(self, request, response, timings, total):
+        match = request.resolver_match
+        route = match.route if match else "unmatched"
+        method = request.method if request.method in METHODS else "other"
+        registry.observe(route, method, total, timings)
+        durations = timings.durations
+        response["Server-Timing"] = ", ".join([
+            f'db;dur={durations["db"] * 1000:.1f};desc="{timings.queries} queries"',
+            f'template;dur={durations["template"] * 1000:.1f}',
+            f'serializer;dur={durations["serializer"] * 1000:.1f}',
+            f"total;dur={total * 1000:.1f}",
+        ])
+        return response
@@ -0,0 +1,180 @@
+import asyncio
+import os
+import shutil
+import socket
+import statistics
+import subprocess
+import sys
+import time
+from datetime import date, timedelta
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework_simplejwt.tokens import RefreshToken
+from core.activity import rebuild_activity
+from core.models import Skill, StudySession
+from core.rollups import rebuild_rollups
+
+BENCHMARK_USERNAME = "benchmark-user"
+
+
+class Command(BaseCommand):
+    help = (
+        "Compares requests per second and latency of the sync API under "
+        "gunicorn (WSGI) with the async API under uvicorn (ASGI)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--concurrency", type=int, default=200)
+        parser.add_argument("--requests", type=int, default=5000)
+        parser.add_argument("--workers", type=int, default=1)
+        parser.add_argument(
+            "--threads", type=int, default=8, help="gunicorn threads per worker.")
+        parser.add_argument("--sessions", type=int, default=200,
+                            help="Sessions to give the benchmark user.")
+        parser.add_argument("--path", default="sessions?page_size=50",
+                            help="Path below /api/ and /api/async/ to request.")
+
+    def handle(self, *args, **options):
+        for server in ("gunicorn", "uvicorn"):
+            if shutil.which(server) is None:
+                raise CommandError(f"{server} is not installed.")
+
+        token = self.prepare_user(options["sessions"])
+        targets = [
+            ("WSGI gunicorn", f"/api/{options['path']}", [
+                "gunicorn", "skilltrack.wsgi:application",
+                "--workers", str(options["workers"]),
+                "--threads", str(options["threads"]), "--log-level", "warning",
+            ]),
+            ("ASGI uvicorn", f"/api/async/{options['path']}", [
+                "uvicorn", "skilltrack.asgi:application",
+                "--workers", str(options["workers"]), "--log-level", "warning",
+            ]),
+        ]
+        for label, path, command in targets:
+            port = free_port()
+            bind = ["--bind", f"127.0.0.1:{port}"] if command[0] == "gunicorn" else [
+                "--host", "127.0.0.1", "--port", str(port)]
+            with run_server(command + bind, port):
+                result = asyncio.run(load(
+                    port, path, token, options["requests"], options["concurrency"]))
+            self.report(label, result)
+
+    def prepare_user(self, sessions):
+        user, _ = User.objects.get_or_create(username=BENCHMARK_USERNAME)
+        missing = sessions - StudySession.objects.filter(user=user).count()
+        if missing > 0:
+            skill = Skill.objects.filter(user=user).first() or Skill.objects.create(
+                user=user, name="Benchmarking", description="", category="other")
+            StudySession.objects.bulk_create([
+                StudySession(user=user, skill=skill, date=date.today() - timedelta(days=i),
+                             duration=timedelta(minutes=30))
+                for i in range(missing)
+            ])
+        # bulk_create skips the signals that keep the rollups and the
+        # activity table up to date.
+        rebuild_rollups(user)
+        rebuild_activity(user)
+        return str(RefreshToken.for_user(user).access_token)
+
+    def report(self, label, result):
+        latencies = sorted(result["latencies"])
+        if not latencies:
+            self.stdout.write(self.style.ERROR(f"{label}: no successful requests"))
+            return
+        p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))]
+        self.stdout.write(self.style.SUCCESS(
+            f"{label}: {len(latencies) / result['elapsed']:.1f} req/s, "
+            f"p50 {statistics.median(latencies) * 1000:.1f} ms, "
+            f"p99 {p99 * 1000:.1f} ms, errors {result['errors']}"))
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+class run_server:
+    def __init__(self, command, port):
+        self.command = command
+        self.port = port
+
+    def __enter__(self):
+        env = {**os.environ, "ALLOWED_HOSTS": "127.0.0.1", "DEBUG": "False"}
+        self.process = subprocess.Popen(
+            self.command, cwd=settings.BASE_DIR, env=env,
+            stdout=subprocess.DEVNULL, stderr=sys.stderr)
+        deadline = time.monotonic() + 30
+        while time.monotonic() < deadline:
+            try:
+                socket.create_connection(("127.0.0.1", self.port), timeout=1).close()
+                return self
+            except OSError:
+                time.sleep(0.2)
+        self.process.terminate()
+        raise CommandError(f"{self.command[0]} did not start on port {self.port}.")
+
+    def __exit__(self, *exc_info):
+        self.process.terminate()
+        self.process.wait(timeout=30)
+
+
+async def load(port, path, token, total, concurrency):
+    request = (
+        f"GET {path} HTTP/1.1\r\nHost: 127.0.0.1\r\n"
+        f"Authorization: Bearer {token}\r\nAccept: application/json\r\n\r\n"
+    ).encode()
+    remaining = iter(range(total))
+    latencies, errors = [], 0
+
+    async def client():
+        nonlocal errors
+        reader = writer = None
+        for _ in remaining:
+            start = time.perf_counter()
+            try:
+                if writer is None:
+                    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+                writer.write(request)
+                status, keep_alive = await read_response(reader)
+                if status == 200:
+                    latencies.append(time.perf_counter() - start)
+                else:
+                    errors += 1
+                if not keep_alive:
+                    writer.close()
+                    writer = None
+            except (OSError, asyncio.IncompleteReadError, ValueError):
+                errors += 1
+                writer = None
+        if writer is not None:
+            writer.close()
+
+    started = time.perf_counter()
+    await asyncio.gather(*(client() for _ in range(concurrency)))
+    return {"latencies": latencies, "errors": errors,
+            "elapsed": time.perf_counter() - started}
+
+
+async def read_response(reader):
+    status_line = await reader.readline()
+    status = int(status_line.split()[1])
+    length, chunked, keep_alive = 0, False, True
+    while (line := await reader.readline()) not in (b"\r\n", b""):
+        name, _, value = line.decode("latin-1").partition(":")
+        name, value = name.strip().lower(), value.strip().lower()
+        if name == "content-length":
+            length = int(value)
+        elif name == "transfer-encoding":
+            chunked = value == "chunked"
+        elif name == "connection":
+            keep_alive = value != "close"
+    if chunked:
+        while size := int((await reader.readline()).strip(), 16):
+            await reader.readexactly(size + 2)
+        await reader.readline()
+    else:
+        await reader.readexactly(length)
+    return status, keep_alive
@@ -0,0 +1,257 @@
+import json
+import statistics
+import time
+from collections import namedtuple
+from django.contrib.auth.models import User
+from django.core.cache import cache, caches
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test import Client, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import URLPattern, reverse
+from django.utils import timezone
+from rest_framework_simplejwt.tokens import RefreshToken
+from core import throttling, urls
+from core.authentication import user_cache
+from core.models import Skill, StudySession, Task
+
+# The token endpoint needs a real password; it is set inside the rolled back
+# transaction of that request.
+TOKEN_PASSWORD = "Benchmark-pass-1"
+
+# One request to time. GET data is the query string; other methods send it
+# as JSON to the API and as a form to the HTML views.
+Probe = namedtuple("Probe", "name method kwargs data staff", defaults=({}, None, False))
+
+
+class RollbackProbe(Exception):
+    pass
+
+
+def probes(skill, session, task, user, refresh):
+    skill_pk, session_pk = {"pk": skill.pk}, {"pk": session.pk}
+    skill_data = {"name": "Benchmark", "description": "Benchmark skill", "category": "programming"}
+    import_row = {"skill": skill.pk, "date": "2024-01-01", "duration": "00:30:00",
+                  "notes": "Benchmark session"}
+    session_data = {**import_row, "user": user.pk}
+    form_session = {**import_row, "duration": "0:30:00"}
+    return [
+        Probe("skill-list-create", "GET"),
+        Probe("skill-list-create", "GET", data={"page_size": 50}),
+        Probe("skill-list-create", "POST", data=skill_data),
+        Probe("skill-export", "GET"),
+        Probe("skill-batch", "POST", data={
+            "action": "update", "ids": [skill.pk], "changes": {"description": "Benchmark"}}),
+        Probe("skill-detail", "GET", skill_pk),
+        Probe("skill-detail", "PUT", skill_pk, skill_data),
+        Probe("skill-detail", "DELETE", skill_pk),
+        Probe("session-list-create", "GET"),
+        Probe("session-list-create", "GET", data={"page_size": 50}),
+        Probe("session-list-create", "POST", data=session_data),
+        Probe("session-export", "GET"),
+        Probe("session-import", "POST", data=[import_row] * 100),
+        Probe("session-batch", "POST", data={
+            "action": "update", "filter": {"skill": skill.pk}, "changes": {"notes": "Benchmark"}}),
+        Probe("session-batch", "POST", data={"action": "delete", "filter": {"skill": skill.pk}}),
+        Probe("session-detail", "GET", session_pk),
+        Probe("session-detail", "PUT", session_pk, session_data),
+        Probe("session-detail", "DELETE", session_pk),
+        Probe("stats", "GET", data={"granularity": "week"}),
+        Probe("activity", "GET"),
+        Probe("search-api", "GET", data={"q": "review practice"}),
+        Probe("task-status", "GET", {"pk": task.pk}),
+        Probe("cache-stats", "GET", staff=True),
+        Probe("throttle-stats", "GET", staff=True),
+        Probe("metrics", "GET", staff=True),
+        Probe("api-register", "POST", data={
+            "username": "benchmark-new", "email": "new@example.com", "password": TOKEN_PASSWORD}),
+        Probe("token-obtain", "POST", data={
+            "username": user.username, "password": TOKEN_PASSWORD}),
+        Probe("token-refresh", "POST", data={"refresh": str(refresh)}),
+        Probe("async-skill-list-create", "GET"),
+        Probe("async-skill-list-create", "POST", data=skill_data),
+        Probe("async-skill-detail", "GET", skill_pk),
+        Probe("async-session-list-create", "GET"),
+        Probe("async-session-list-create", "POST", data=session_data),
+        Probe("async-session-detail", "GET", session_pk),
+        Probe("async-api-register", "POST", data={
+            "username": "benchmark-new", "email": "new@example.com", "password": TOKEN_PASSWORD}),
+        Probe("home", "GET"),
+        Probe("register", "GET"),
+        Probe("login", "GET"),
+        Probe("logout", "POST"),
+        Probe("profile", "GET", {"user_id": user.pk}),
+        Probe("add-session", "GET"),
+        Probe("add-session", "POST", data=form_session),
+        Probe("add-skill", "GET"),
+        Probe("add-skill", "POST", data=skill_data),
+        Probe("dashboard", "GET"),
+        Probe("edit-session", "GET", session_pk),
+        Probe("edit-session", "POST", session_pk, form_session),
+        Probe("skills", "GET"),
+        Probe("search", "GET", data={"q": "review practice"}),
+        Probe("edit-skill", "GET", skill_pk),
+        Probe("edit-skill", "POST", skill_pk, skill_data),
+        Probe("delete-session", "POST", session_pk),
+        Probe("delete-skill", "POST", skill_pk),
+        Probe("edit-profile", "GET"),
+        Probe("edit-profile", "POST", data={"bio": "Benchmarking"}),
+    ]
+
+
+class Command(BaseCommand):
+    help = (
+        "Times every route in core/urls.py (API and HTML) for one user and "
+        "prints p50/p95/p99 latency and query counts as JSON. Writes are "
+        "rolled back, so repeated runs see the same data and can be compared "
+        "with --compare."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--user", help="Username to benchmark (default: loadgen-0).",
+                            default="loadgen-0")
+        parser.add_argument("--repeat", type=int, default=30)
+        parser.add_argument("--warmup", type=int, default=2)
+        parser.add_argument("--only", help="Comma separated URL names to run.")
+        parser.add_argument("--cold", action="store_true",
+                            help="Clear the caches before every request.")
+        parser.add_argument("--output", help="Write the JSON report to this file.")
+        parser.add_argument("--compare", help="Earlier JSON report to compare against.")
+
+    def handle(self, *args, **options):
+        user = User.objects.filter(username=options["user"]).first()
+        if user is None:
+            raise CommandError(
+                f"User {options['user']} does not exist; create one with generate_dataset.")
+        skill = Skill.objects.filter(user=user).first()
+        session = StudySession.objects.filter(user=user).first()
+        if skill is None or session is None:
+            raise CommandError(f"User {user.username} has no skills or sessions.")
+        task, _ = Task.objects.get_or_create(
+            name="benchmark", user=user, defaults={"status": Task.SUCCEEDED})
+        staff, _ = User.objects.get_or_create(
+            username="benchmark-staff", defaults={"is_staff": True})
+
+        selected = probes(skill, session, task, user, RefreshToken.for_user(user))
+        if options["only"]:
+            names = set(options["only"].split(","))
+            selected = [probe for probe in selected if probe.name in names]
+        self.check_coverage(selected, options["only"])
+
+        clients = {False: (self.client_for(user), user), True: (self.client_for(staff), staff)}
+        results = []
+        with override_settings(ALLOWED_HOSTS=["testserver"]):
+            for probe in selected:
+                results.append(self.run_probe(probe, clients, options))
+                self.stderr.write(
+                    f"{probe.method:<6} {results[-1]['path']:<40} "
+                    f"p50 {results[-1]['p50_ms']:8.2f} ms  queries {results[-1]['queries']}")
+
+        report = {
+            "meta": {
+                "user": user.username,
+                "sessions": StudySession.objects.filter(user=user).count(),
+                "skills": Skill.objects.filter(user=user).count(),
+                "database": connection.vendor,
+                "repeat": options["repeat"],
+                "cold": options["cold"],
+                "created_at": timezone.now().isoformat(),
+            },
+            "results": results,
+        }
+        output = json.dumps(report, indent=2)
+        if options["output"]:
+            with open(options["output"], "w") as file:
+                file.write(output + "\n")
+        else:
+            self.stdout.write(output)
+        if options["compare"]:
+            self.compare(options["compare"], results)
+
+    def check_coverage(self, selected, only):
+        named = {pattern.name for pattern in urls.urlpatterns
+                 if isinstance(pattern, URLPattern) and pattern.name}
+        missing = named - {probe.name for probe in selected}
+        if missing and not only:
+            raise CommandError(f"No probe for route(s): {', '.join(sorted(missing))}.")
+
+    def client_for(self, user):
+        token = RefreshToken.for_user(user).access_token
+        client = Client(raise_request_exception=False, headers={"Authorization": f"Bearer {token}"})
+        client.force_login(user)
+        return client
+
+    def run_probe(self, probe, clients, options):
+        path = reverse(probe.name, kwargs=probe.kwargs)
+        client, client_user = clients[probe.staff]
+        timings, queries, status = [], [], None
+        for attempt in range(options["warmup"] + options["repeat"]):
+            throttling.buckets.clear()
+            if options["cold"]:
+                cache.clear()
+                caches["fragments"].clear()
+                user_cache.clear()
+            with CaptureQueriesContext(connection) as captured:
+                elapsed, status = self.request(client, probe, path, client_user)
+            if attempt >= options["warmup"]:
+                timings.append(elapsed * 1000)
+                queries.append(len(captured))
+        percentiles = statistics.quantiles(timings, n=100, method="inclusive") \
+            if len(timings) > 1 else timings * 99
+        return {
+            "name": probe.name,
+            "method": probe.method,
+            "path": path,
+            "status": status,
+            "p50_ms": round(percentiles[49], 3),
+            "p95_ms": round(percentiles[94], 3),
+            "p99_ms": round(percentiles[98], 3),
+            "mean_ms": round(statistics.fmean(timings), 3),
+            "queries": max(queries),
+        }
+
+    def request(self, client, probe, path, user):
+        if probe.method == "GET":
+            start = time.perf_counter()
+            response = client.get(path, probe.data)
+            return time.perf_counter() - start, response.status_code
+
+        if path.startswith("/api/"):
+            kwargs = {"data": json.dumps(probe.data or {}), "content_type": "application/json"}
+        else:
+            kwargs = {"data": probe.data or {}}
+        method = getattr(client, probe.method.lower())
+        try:
+            with transaction.atomic():
+                if probe.name == "token-obtain":
+                    # A copy, so the client's user keeps the stored hash.
+                    owner = User.objects.get(pk=user.pk)
+                    owner.set_password(TOKEN_PASSWORD)
+                    owner.save(update_fields=["password"])
+                start = time.perf_counter()
+                response = method(path, **kwargs)
+                elapsed = time.perf_counter() - start
+                raise RollbackProbe
+        except RollbackProbe:
+            pass
+        if probe.name == "logout":
+            client.force_login(user)
+        return elapsed, response.status_code
+
+    def compare(self, baseline_path, results):
+        with open(baseline_path) as file:
+            baseline = {(r["method"], r["path"]): r for r in json.load(file)["results"]}
+        self.stderr.write(f"\n{'':6} {'route':<40} {'p50':>10} {'p95':>10} {'queries':>9}")
+        for result in results:
+            before = baseline.get((result["method"], result["path"]))
+            if before is None:
+                continue
+            self.stderr.write(
+                f"{result['method']:<6} {result['path']:<40} "
+                f"{change(before['p50_ms'], result['p50_ms']):>10} "
+                f"{change(before['p95_ms'], result['p95_ms']):>10} "
+                f"{result['queries'] - before['queries']:>+9}")
+
+
+def change(before, after):
+    return f"{(after - before) / before:+.0%}" if before else "n/a"
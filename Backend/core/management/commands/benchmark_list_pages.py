@@ -0,0 +1,86 @@
+import statistics
+import time
+from datetime import date, timedelta
+from django.contrib.auth.models import User
+from django.core.cache import caches
+from django.core.management.base import BaseCommand
+from django.test import RequestFactory
+from core.activity import rebuild_activity
+from core.models import Skill, StudySession
+from core.rollups import rebuild_rollups
+from core.views import AllSkillsView, HomeView
+
+BENCHMARK_USERNAME = "benchmark-user"
+
+
+class Command(BaseCommand):
+    help = (
+        "Times the session and skill list pages of a user with many rows: "
+        "rendered from scratch, served from the fragment cache, and after "
+        "editing one row."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--sessions", type=int, default=5000)
+        parser.add_argument("--skills", type=int, default=200)
+        parser.add_argument("--repeat", type=int, default=5)
+
+    def handle(self, *args, **options):
+        user = self.prepare_user(options["sessions"], options["skills"])
+        fragments = caches["fragments"]
+        pages = [
+            ("sessions", HomeView.as_view(), StudySession.objects.filter(user=user)),
+            ("skills", AllSkillsView.as_view(), Skill.objects.filter(user=user)),
+        ]
+        self.stdout.write(
+            f"{options['sessions']} sessions, {options['skills']} skills, "
+            f"median of {options['repeat']} runs")
+        for label, view, rows in pages:
+            def get():
+                request = RequestFactory().get("/")
+                request.user = user
+                return view(request).content
+
+            def edit_one():
+                row = rows.order_by("?").first()
+                row.save()
+
+            uncached = timed(get, options["repeat"], before=fragments.clear)
+            get()
+            cached = timed(get, options["repeat"])
+            edited = timed(get, options["repeat"], before=edit_one)
+            self.stdout.write(
+                f"{label:<9} uncached {uncached:8.1f} ms  cached {cached:6.1f} ms  "
+                f"after one edit {edited:7.1f} ms")
+
+    def prepare_user(self, sessions, skills):
+        user, _ = User.objects.get_or_create(username=BENCHMARK_USERNAME)
+        missing = skills - Skill.objects.filter(user=user).count()
+        Skill.objects.bulk_create([
+            Skill(user=user, name=f"Skill {i}", description="Benchmarking " * 5, category="other")
+            for i in range(max(missing, 0))
+        ])
+        skill_ids = list(Skill.objects.filter(user=user).values_list("id", flat=True))
+        missing = sessions - StudySession.objects.filter(user=user).count()
+        StudySession.objects.bulk_create([
+            StudySession(user=user, skill_id=skill_ids[i % len(skill_ids)],
+                         date=date.today() - timedelta(days=i % 365),
+                         duration=timedelta(minutes=30), notes="Read chapter %d\nExercises" % i)
+            for i in range(max(missing, 0))
+        ], batch_size=1000)
+        # bulk_create skips the signals that keep the rollups and the
+        # activity table up to date.
+        rebuild_rollups(user)
+        rebuild_activity(user)
+        return user
+
+
+def timed(func, repeat, before=None):
+    durations = []
+    for _ in range(repeat):
+        if before is not None:
+            before()
+        start = time.perf_counter()
+        func()
+        durations.append(time.perf_counter() - start)
+    return statistics.median(durations) * 1000
@@ -0,0 +1,155 @@
+import random
+import statistics
+import time
+from datetime import date, timedelta
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.db.models import Count, Sum
+from core.activity import rebuild_activity
+from core.models import DailyStudyRollup, Skill, StudySession
+from core.rollups import rebuild_rollups
+
+BENCHMARK_USERNAME = "benchmark-user"
+
+
+class RollbackBenchmark(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = (
+        "Prints query plans and timings of the dashboard and list queries, "
+        "with and without the per-user composite indexes."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--user", type=int, help="Benchmark an existing user id.")
+        parser.add_argument(
+            "--seed", type=int, default=0,
+            help="Create a benchmark user with this many sessions first.")
+        parser.add_argument(
+            "--other-users", type=int, default=0,
+            help="Sessions to add for other users, so the table is not all ours.")
+        parser.add_argument("--repeat", type=int, default=5)
+        parser.add_argument(
+            "--no-compare", action="store_true",
+            help="Skip the run with the composite indexes dropped.")
+
+    def handle(self, *args, **options):
+        if options["seed"]:
+            user = self.seed(options["seed"], options["other_users"])
+        elif options["user"] is not None:
+            user = User.objects.filter(pk=options["user"]).first()
+            if user is None:
+                raise CommandError(f"User {options['user']} does not exist.")
+        else:
+            raise CommandError("Pass --user <id> or --seed <sessions>.")
+
+        sessions = StudySession.objects.filter(user=user).count()
+        self.stdout.write(f"Benchmarking user {user.pk} with {sessions} sessions "
+                          f"({StudySession.objects.count()} in the table).\n")
+
+        self.run_queries(user, options["repeat"], "with composite indexes")
+        if not options["no_compare"]:
+            try:
+                with transaction.atomic():
+                    self.drop_composite_indexes()
+                    self.run_queries(user, options["repeat"], "without composite indexes")
+                    raise RollbackBenchmark
+            except RollbackBenchmark:
+                pass
+
+    def queries(self, user):
+        # Querysets shaped like the ones in core/views.py; count() and
+        # aggregate() calls are written as grouped values() so they can be
+        # explained too.
+        sessions = StudySession.objects.filter(user=user)
+        rollups = DailyStudyRollup.objects.filter(user=user)
+        skills = Skill.objects.filter(user=user)
+        ordered = sessions.order_by("date", "id")
+        deep_date = ordered.values_list("date", flat=True)[
+            max(sessions.count() - 100, 0):].first() or date.today()
+        return [
+            ("dashboard: rollup totals", rollups.values("user").annotate(
+                Sum("session_count"), Sum("total_duration"))),
+            ("dashboard: daily series", rollups.values("date").annotate(
+                total=Sum("total_duration")).order_by("date")),
+            ("dashboard: top categories", rollups.values("skill__category").annotate(
+                total=Sum("session_count")).order_by("-total")[:3]),
+            ("dashboard: last session", sessions.order_by("-date")[:1]),
+            ("home: session count", sessions.values("user").annotate(total=Count("id"))),
+            ("api: first page (date, id)", ordered.select_related("skill")[:50]),
+            ("api: deep page (date, id)", ordered.filter(date__gt=deep_date)[:50]),
+            ("sessions by skill", sessions.values("skill").annotate(total=Count("id"))),
+            ("sessions by category", sessions.values("skill__category").annotate(
+                total=Count("id"))),
+            ("skills by category", skills.values("category").annotate(total=Count("id"))),
+            ("api: skills page (created_at, id)", skills.order_by("created_at", "id")[:50]),
+        ]
+
+    def run_queries(self, user, repeat, label):
+        self.stdout.write(self.style.MIGRATE_HEADING(f"== {label} =="))
+        for name, queryset in self.queries(user):
+            timings = []
+            for _ in range(repeat):
+                start = time.perf_counter()
+                list(queryset.all())
+                timings.append((time.perf_counter() - start) * 1000)
+            self.stdout.write(self.style.SUCCESS(
+                f"{name}: median {statistics.median(timings):.2f} ms, "
+                f"min {min(timings):.2f} ms"))
+            self.stdout.write(self.explain(queryset, label))
+            self.stdout.write("")
+
+    def explain(self, queryset, label):
+        # sqlite3 caches prepared statements and keeps returning the old
+        # EXPLAIN output after the indexes are dropped, so tag the SQL with
+        # the phase to get a fresh plan.
+        sql, params = queryset.query.sql_with_params()
+        prefix = connection.ops.explain_query_prefix()
+        with connection.cursor() as cursor:
+            cursor.execute(f"{prefix} {sql} /* {label} */", params)
+            return "\n".join(" ".join(map(str, row)) for row in cursor.fetchall())
+
+    def drop_composite_indexes(self):
+        with connection.cursor() as cursor:
+            for model in (StudySession, Skill):
+                for index in model._meta.indexes:
+                    cursor.execute(f"DROP INDEX {connection.ops.quote_name(index.name)}")
+            if connection.vendor == "postgresql":
+                cursor.execute("ANALYZE")
+
+    def seed(self, count, other_users):
+        user, _ = User.objects.get_or_create(username=BENCHMARK_USERNAME)
+        self.stdout.write(f"Seeding {count} sessions for {user.username}...")
+        self.create_sessions(user, count)
+        if other_users:
+            for i in range(10):
+                other, _ = User.objects.get_or_create(username=f"{BENCHMARK_USERNAME}-{i}")
+                self.create_sessions(other, other_users // 10)
+        return user
+
+    def create_sessions(self, user, count, batch_size=5000):
+        # Seeding again adds sessions to the same four skills.
+        skills = [
+            Skill.objects.get_or_create(
+                user=user, name=f"Skill {i}",
+                defaults={"description": "", "category": category})[0]
+            for i, category in enumerate(["programming", "math", "languages", "music"])
+        ]
+        start = date.today() - timedelta(days=365 * 5)
+        with transaction.atomic():
+            for offset in range(0, count, batch_size):
+                StudySession.objects.bulk_create([
+                    StudySession(
+                        user=user, skill=random.choice(skills),
+                        date=start + timedelta(days=random.randrange(365 * 5)),
+                        duration=timedelta(minutes=random.choice([15, 30, 45, 60, 90])),
+                    )
+                    for _ in range(min(batch_size, count - offset))
+                ])
+        # bulk_create skips the signals that keep the rollups and the
+        # activity table up to date.
+        rebuild_rollups(user)
+        rebuild_activity(user)
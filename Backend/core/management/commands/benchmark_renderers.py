@@ -0,0 +1,59 @@
+import json
+import time
+from datetime import date, timedelta
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
+from core.messagepack import MessagePackRenderer, unpackb
+from core.models import Skill, StudySession
+from core.serializers import StudySessionSerializer
+
+
+class Command(BaseCommand):
+    help = (
+        "Compares serialization, encode and decode time and payload size of a "
+        "session list rendered as JSON and as MessagePack. Uses unsaved "
+        "sessions, so no database rows are needed."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--sessions", type=int, default=10000)
+        parser.add_argument("--repeat", type=int, default=5)
+        parser.add_argument("--notes-length", type=int, default=40)
+
+    def handle(self, *args, **options):
+        user = User(pk=1, username="benchmark-user")
+        skill = Skill(pk=1, user=user, name="Benchmarking", description="", category="other")
+        now = timezone.now()
+        sessions = [
+            StudySession(
+                pk=i + 1, user=user, skill=skill, date=date(2024, 1, 1) + timedelta(days=i % 365),
+                duration=timedelta(minutes=15 + i % 120), notes="n" * options["notes_length"],
+                created_at=now, updated_at=now)
+            for i in range(options["sessions"])
+        ]
+        formats = [
+            ("JSON", JSONRenderer(), False, json.loads),
+            ("MessagePack", MessagePackRenderer(), True, unpackb),
+        ]
+        self.stdout.write(f"{len(sessions)} sessions, best of {options['repeat']} runs")
+        for label, renderer, native, decode in formats:
+            serialize = timed(lambda: StudySessionSerializer(
+                sessions, many=True, native=native).data, options["repeat"])
+            data = StudySessionSerializer(sessions, many=True, native=native).data
+            encode = timed(lambda: renderer.render(data), options["repeat"])
+            payload = renderer.render(data)
+            decode_time = timed(lambda: decode(payload), options["repeat"])
+            self.stdout.write(
+                f"{label:<12} {len(payload) / 1024:9.1f} KiB  serialize {serialize:7.1f} ms  "
+                f"encode {encode:6.1f} ms  decode {decode_time:6.1f} ms")
+
+
+def timed(func, repeat):
+    durations = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        durations.append(time.perf_counter() - start)
+    return min(durations) * 1000
@@ -0,0 +1,104 @@
+import random
+from datetime import date, timedelta
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from core.activity import rebuild_activity
+from core.forms import SkillForm
+from core.models import Skill, StudySession, UserProfile
+from core.rollups import rebuild_rollups
+
+WORDS = (
+    "review practice chapter exercises notes lecture project deadline focus flashcards "
+    "vocabulary grammar algorithm recursion database index query refactor tests debugging "
+    "reading summary essay outline draft sketch color layout theory proof derivative "
+    "integral history timeline experiment measurement analysis chart pitch rhythm scales"
+).split()
+# Minutes, weighted towards the usual half hour to an hour.
+DURATIONS = [15, 20, 25, 30, 30, 45, 45, 60, 60, 90, 120, 180]
+
+
+class Command(BaseCommand):
+    help = (
+        "Creates synthetic users with skills in every category and sessions "
+        "spread over several years, with bulk_create, for load tests and "
+        "benchmark_endpoints."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--users", type=int, default=10)
+        parser.add_argument("--sessions", type=int, default=2000, help="Sessions per user.")
+        parser.add_argument("--skills", type=int, default=len(SkillForm.CATEGORY_CHOICES),
+                            help="Skills per user, cycling through the categories.")
+        parser.add_argument("--years", type=int, default=3)
+        parser.add_argument("--prefix", default="loadgen", help="Username prefix.")
+        parser.add_argument("--password", default="loadgen-password")
+        parser.add_argument("--seed", type=int, default=0, help="Random seed, for repeatable data.")
+        parser.add_argument("--batch-size", type=int, default=5000)
+        parser.add_argument(
+            "--clear", action="store_true", help="Delete earlier users with the same prefix first.")
+
+    def handle(self, *args, **options):
+        rng = random.Random(options["seed"])
+        prefix = options["prefix"]
+        existing = User.objects.filter(username__startswith=f"{prefix}-")
+        if existing.exists():
+            if not options["clear"]:
+                raise CommandError(
+                    f"Users named {prefix}-* already exist; pass --clear to replace them.")
+            self.stdout.write(f"Deleting {existing.count()} earlier {prefix}-* users...")
+            existing.delete()
+
+        password = make_password(options["password"])
+        User.objects.bulk_create([
+            User(username=f"{prefix}-{i}", email=f"{prefix}-{i}@example.com", password=password)
+            for i in range(options["users"])
+        ])
+        users = list(User.objects.filter(username__startswith=f"{prefix}-").order_by("id"))
+        UserProfile.objects.bulk_create([
+            UserProfile(user=user, bio=sentence(rng, 8, 20)) for user in users])
+
+        end = date.today()
+        days = 365 * options["years"]
+        for number, user in enumerate(users, 1):
+            with transaction.atomic():
+                skills = self.create_skills(user, options["skills"], rng)
+                self.create_sessions(
+                    user, skills, options["sessions"], end, days, rng, options["batch_size"])
+            rebuild_rollups(user=user)
+            rebuild_activity(user=user)
+            self.stdout.write(f"  {user.username}: {len(skills)} skills, "
+                              f"{options['sessions']} sessions ({number}/{len(users)})")
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Created {len(users)} users ({prefix}-0 .. {prefix}-{len(users) - 1}, "
+            f"password {options['password']!r})."))
+
+    def create_skills(self, user, count, rng):
+        categories = SkillForm.CATEGORY_CHOICES
+        Skill.objects.bulk_create([
+            Skill(user=user, name=f"{categories[i % len(categories)][1]} {i // len(categories) + 1}",
+                  description=sentence(rng, 5, 25), category=categories[i % len(categories)][0])
+            for i in range(count)
+        ])
+        return list(Skill.objects.filter(user=user).values_list("id", flat=True))
+
+    def create_sessions(self, user, skill_ids, count, end, days, rng, batch_size):
+        # Some skills get most of the time, like real users' favourites.
+        weights = [rng.paretovariate(1.2) for _ in skill_ids]
+        for offset in range(0, count, batch_size):
+            StudySession.objects.bulk_create([
+                StudySession(
+                    user=user,
+                    skill_id=rng.choices(skill_ids, weights)[0],
+                    date=end - timedelta(days=int(rng.triangular(0, days, 0))),
+                    duration=timedelta(minutes=rng.choice(DURATIONS)),
+                    notes=sentence(rng, 4, 40) if rng.random() < 0.7 else "",
+                )
+                for _ in range(min(batch_size, count - offset))
+            ])
+
+
+def sentence(rng, shortest, longest):
+    return " ".join(rng.choices(WORDS, k=rng.randint(shortest, longest))).capitalize() + "."
@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand
+from PIL import UnidentifiedImageError
+from core import images
+from core.models import UserProfile
+
+
+class Command(BaseCommand):
+    help = "Generates the resized profile picture variants for existing uploads."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--all", action="store_true",
+            help="Regenerate variants for profiles that already have them.")
+
+    def handle(self, *args, **options):
+        profiles = UserProfile.objects.exclude(profile_picture="").exclude(
+            profile_picture=images.DEFAULT_PICTURE)
+        if not options["all"]:
+            profiles = profiles.filter(profile_picture_variants={})
+
+        processed = 0
+        for profile in profiles.only("pk", "profile_picture").iterator():
+            try:
+                images.generate_variants(profile.pk, profile.profile_picture.name)
+            except (OSError, UnidentifiedImageError) as exc:
+                self.stderr.write(f"Skipping {profile.profile_picture.name}: {exc}")
+                continue
+            processed += 1
+        self.stdout.write(self.style.SUCCESS(f"Processed {processed} profile pictures."))
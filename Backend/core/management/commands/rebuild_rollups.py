@@ -0,0 +1,25 @@
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from core.activity import rebuild_activity
+from core.rollups import rebuild_rollups
+
+
+class Command(BaseCommand):
+    help = "Rebuilds the daily study rollups and activity streaks from the stored study sessions."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--user", type=int, help="Only rebuild the rollups of this user id.")
+        parser.add_argument("--batch-size", type=int, default=1000)
+
+    def handle(self, *args, **options):
+        user = None
+        if options["user"] is not None:
+            user = User.objects.filter(pk=options["user"]).first()
+            if user is None:
+                raise CommandError(f"User {options['user']} does not exist.")
+
+        created = rebuild_rollups(user=user, batch_size=options["batch_size"])
+        activities = rebuild_activity(user=user)
+        self.stdout.write(self.style.SUCCESS(
+            f"Rebuilt {created} rollup rows and {activities} study activities."))
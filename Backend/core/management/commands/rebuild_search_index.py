@@ -0,0 +1,10 @@
+from django.core.management.base import BaseCommand
+from core.search import rebuild_index
+
+
+class Command(BaseCommand):
+    help = "Recreates the full-text search index of session notes and skills, and its triggers."
+
+    def handle(self, *args, **options):
+        rebuild_index()
+        self.stdout.write(self.style.SUCCESS("Rebuilt the search index."))
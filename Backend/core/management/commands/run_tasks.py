@@ -0,0 +1,26 @@
+import signal
+from django.core.management.base import BaseCommand
+from django.utils.module_loading import autodiscover_modules
+from core.background import Worker, registry
+
+
+class Command(BaseCommand):
+    help = "Runs queued background tasks until stopped."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--concurrency", type=int, default=4, help="Tasks to run at the same time.")
+        parser.add_argument(
+            "--poll-interval", type=float, default=1.0,
+            help="Seconds to wait between checks of an empty queue.")
+        parser.add_argument(
+            "--burst", action="store_true", help="Exit once the queue is empty.")
+
+    def handle(self, *args, **options):
+        autodiscover_modules("tasks")
+        worker = Worker(options["concurrency"], options["poll_interval"])
+        signal.signal(signal.SIGTERM, worker.stop)
+        signal.signal(signal.SIGINT, worker.stop)
+        self.stdout.write(
+            f"Running {len(registry)} task types with concurrency {options['concurrency']}.")
+        worker.run(burst=options["burst"])
@@ -0,0 +1,52 @@
+# Generated by Django 5.2.3 on 2026-10-18 18:43
+
+import datetime
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, Sum
+
+
+def build_rollups(apps, schema_editor):
+    StudySession = apps.get_model('core', 'StudySession')
+    DailyStudyRollup = apps.get_model('core', 'DailyStudyRollup')
+    grouped = (
+        StudySession.objects.values('user_id', 'skill_id', 'date')
+        .annotate(session_count=Count('id'), total_duration=Sum('duration'))
+        .order_by()
+    )
+    DailyStudyRollup.objects.bulk_create([
+        DailyStudyRollup(
+            user_id=row['user_id'],
+            skill_id=row['skill_id'],
+            date=row['date'],
+            session_count=row['session_count'],
+            total_duration=row['total_duration'] or datetime.timedelta(),
+        ) for row in grouped
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0003_userprofile_profile_picture'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyStudyRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('session_count', models.PositiveIntegerField(default=0)),
+                ('total_duration', models.DurationField(default=datetime.timedelta)),
+                ('skill', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_rollups', to='core.skill')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_rollups', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('user', 'date', 'skill'), name='unique_daily_rollup')],
+            },
+        ),
+        migrations.RunPython(build_rollups, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 5.2.3 on 2026-10-18 19:02
+
+import django.utils.timezone
+from django.db import migrations, models
+from django.db.models import F
+
+
+def copy_created_at(apps, schema_editor):
+    StudySession = apps.get_model('core', 'StudySession')
+    StudySession.objects.update(updated_at=F('created_at'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0005_user_composite_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='studysession',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, default=django.utils.timezone.now),
+            preserve_default=False,
+        ),
+        migrations.RunPython(copy_created_at, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='studysession',
+            index=models.Index(fields=['user', 'updated_at'], name='session_user_updated_idx'),
+        ),
+    ]
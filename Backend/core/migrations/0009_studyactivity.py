@@ -0,0 +1,47 @@
+# Generated by Django 5.2.3 on 2026-10-18 19:12
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Sum
+from core.activity import day_value, fill
+
+
+def build_activity(apps, schema_editor):
+    DailyStudyRollup = apps.get_model('core', 'DailyStudyRollup')
+    StudyActivity = apps.get_model('core', 'StudyActivity')
+    totals = (
+        DailyStudyRollup.objects.values('user_id', 'date')
+        .annotate(count=Sum('session_count'), duration=Sum('total_duration'))
+        .order_by('user_id', 'date')
+    )
+    per_user = {}
+    for row in totals.iterator():
+        per_user.setdefault(row['user_id'], {})[row['date']] = day_value(row['count'], row['duration'])
+    StudyActivity.objects.bulk_create([
+        fill(StudyActivity(user_id=user_id), values) for user_id, values in per_user.items()
+    ], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('core', '0008_task'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StudyActivity',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='study_activity', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('first_day', models.DateField(blank=True, null=True)),
+                ('day_minutes', models.BinaryField(default=bytes)),
+                ('active_days', models.PositiveIntegerField(default=0)),
+                ('longest_streak', models.PositiveIntegerField(default=0)),
+                ('streak_end', models.DateField(blank=True, null=True)),
+                ('streak_length', models.PositiveIntegerField(default=0)),
+            ],
+        ),
+        migrations.RunPython(build_activity, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,21 @@
+from django.db import migrations
+from core.search import create_index, drop_index
+
+
+def create(apps, schema_editor):
+    create_index(schema_editor)
+
+
+def drop(apps, schema_editor):
+    drop_index(schema_editor)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0009_studyactivity'),
+    ]
+
+    operations = [
+        migrations.RunPython(create, drop),
+    ]
@@ -1,5 +1,7 @@
-from django.db import models
+from datetime import timedelta
+from django.db import models, transaction
 from django.contrib.auth.models import User
+from django.utils import timezone
 
 # Create your models here.
 
@@ -14,6 +16,11 @@ class Address(models.Model):
         return f"{self.street}, {self.post_code} {self.city}, {self.country}"
 
 
+class LiveSkillManager(models.Manager):
+    def get_queryset(self):
+        return super().get_queryset().filter(deleted_at__isnull=True)
+
+
 class Skill(models.Model):
     user = models.ForeignKey(
         User, on_delete=models.CASCADE, related_name="skills", null=True)
@@ -22,6 +29,20 @@ class Skill(models.Model):
     category = models.CharField(max_length=50, null=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
+    # Set when the skill is deleted; the row and its sessions are purged
+    # later by tasks.delete_skill. Until then the default managers hide them.
+    deleted_at = models.DateTimeField(null=True, blank=True)
+
+    objects = LiveSkillManager()
+    all_objects = models.Manager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["user", "category"], name="skill_user_category_idx"),
+            models.Index(fields=["user", "created_at", "id"], name="skill_user_created_idx"),
+            models.Index(fields=["deleted_at"], name="skill_deleted_idx",
+                         condition=models.Q(deleted_at__isnull=False)),
+        ]
 
     def __str__(self):
         return f"{self.name}"
@@ -41,11 +62,22 @@ class UserProfile(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     profile_picture = models.ImageField(upload_to=user_directory_path, default='profile_pics/default.jpg', blank=True)
+    # Resized copies of profile_picture, e.g. {"avatar": "profile_pics/..."}.
+    profile_picture_variants = models.JSONField(default=dict, blank=True)
 
     def __str__(self):
         return f"Profile of {self.user.username}"
 
 
+class LiveSessionManager(models.Manager):
+    def get_queryset(self):
+        # Few skills are waiting to be purged at any time, so the database
+        # reads their ids once (from skill_deleted_idx) instead of joining
+        # every session to its skill.
+        deleted = Skill.all_objects.filter(deleted_at__isnull=False).values("pk")
+        return super().get_queryset().exclude(skill_id__in=deleted)
+
+
 class StudySession(models.Model):
     user = models.ForeignKey(
         User, on_delete=models.CASCADE, related_name="sessions")
@@ -55,6 +87,151 @@ class StudySession(models.Model):
     duration = models.DurationField()
     notes = models.TextField(blank=True, null=True)
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    objects = LiveSessionManager()
+    all_objects = models.Manager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["user", "date", "id"], name="session_user_date_idx"),
+            models.Index(fields=["user", "skill"], name="session_user_skill_idx"),
+            models.Index(fields=["user", "updated_at"], name="session_user_updated_idx"),
+        ]
+
+    def rollup_state(self):
+        # Returns None when a field needed by the rollups was deferred,
+        # so the signal handler knows to reload the stored row.
+        if self.get_deferred_fields() & {"user_id", "skill_id", "date", "duration"}:
+            return None
+        # Forms may assign raw strings, e.g. the duration choice "0:30:00".
+        date = self._meta.get_field("date").to_python(self.date)
+        duration = self._meta.get_field("duration").to_python(self.duration)
+        return (self.user_id, self.skill_id, date, duration)
+
+    def save(self, *args, **kwargs):
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+
+    def delete(self, *args, **kwargs):
+        with transaction.atomic():
+            # The rollups are decremented for the row as stored, which
+            # another request may have changed since this copy was loaded.
+            self._rollup_state = self.stored_rollup_state()
+            return super().delete(*args, **kwargs)
+
+    def stored_rollup_state(self):
+        # Locked, so concurrent writes to the same session take turns.
+        return StudySession.all_objects.select_for_update().filter(pk=self.pk).values_list(
+            "user_id", "skill_id", "date", "duration").first()
 
     def __str__(self):
         return f"Session of {self.user.username} for {self.skill.name} on {self.date}"
+
+
+class DailyStudyRollup(models.Model):
+    user = models.ForeignKey(
+        User, on_delete=models.CASCADE, related_name="daily_rollups")
+    skill = models.ForeignKey(
+        Skill, on_delete=models.CASCADE, related_name="daily_rollups")
+    date = models.DateField()
+    session_count = models.PositiveIntegerField(default=0)
+    total_duration = models.DurationField(default=timedelta)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["user", "date", "skill"], name="unique_daily_rollup"),
+        ]
+
+    def __str__(self):
+        return f"Rollup of {self.user_id} for skill {self.skill_id} on {self.date}"
+
+
+class Task(models.Model):
+    """A unit of deferred work, run by ``manage.py run_tasks``."""
+    QUEUED = "queued"
+    RUNNING = "running"
+    SUCCEEDED = "succeeded"
+    FAILED = "failed"
+    STATUS_CHOICES = [
+        (QUEUED, "Queued"),
+        (RUNNING, "Running"),
+        (SUCCEEDED, "Succeeded"),
+        (FAILED, "Failed"),
+    ]
+
+    name = models.CharField(max_length=200)
+    args = models.JSONField(default=list, blank=True)
+    kwargs = models.JSONField(default=dict, blank=True)
+    user = models.ForeignKey(
+        User, on_delete=models.CASCADE, null=True, blank=True, related_name="tasks")
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=QUEUED)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    max_attempts = models.PositiveSmallIntegerField(default=3)
+    run_after = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["status", "run_after"], name="task_status_run_after_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.name} #{self.pk} ({self.status})"
+
+
+class StudyActivity(models.Model):
+    """
+    Minutes studied per day for one user, packed as little-endian uint16
+    values from ``first_day`` on, plus a streak summary. Kept in step with
+    the daily rollups by core/activity.py.
+    """
+    user = models.OneToOneField(
+        User, on_delete=models.CASCADE, primary_key=True, related_name="study_activity")
+    first_day = models.DateField(null=True, blank=True)
+    day_minutes = models.BinaryField(default=bytes)
+    active_days = models.PositiveIntegerField(default=0)
+    longest_streak = models.PositiveIntegerField(default=0)
+    # The most recent run of consecutive active days ends on streak_end.
+    streak_end = models.DateField(null=True, blank=True)
+    streak_length = models.PositiveIntegerField(default=0)
+
+    def __str__(self):
+        return f"Study activity of {self.user_id}"
+
+
+class DataVersion(models.Model):
+    """
+    Counter bumped after every write to a user's sessions or skills. Cached
+    entries and ETags embed it; it is kept here rather than in the cache so
+    that every worker process sees the same value.
+    """
+    user = models.OneToOneField(
+        User, on_delete=models.CASCADE, primary_key=True, related_name="data_version")
+    version = models.PositiveBigIntegerField(default=1)
+
+    def __str__(self):
+        return f"Data version {self.version} of {self.user_id}"
+
+
+class RequestProfile(models.Model):
+    """A cProfile capture of one request, taken on demand by a staff user."""
+    user = models.ForeignKey(
+        User, on_delete=models.SET_NULL, null=True, blank=True, related_name="request_profiles")
+    method = models.CharField(max_length=10)
+    path = models.CharField(max_length=2000)
+    status_code = models.PositiveSmallIntegerField()
+    duration_ms = models.FloatField()
+    # Under PROFILE_ROOT, in the pstats format (snakeviz, gprof2dot, ...).
+    file_name = models.CharField(max_length=100)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ["-created_at"]
+
+    def __str__(self):
+        return f"{self.method} {self.path} ({self.duration_ms:.0f} ms)"
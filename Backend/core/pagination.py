@@ -0,0 +1,131 @@
+import base64
+import binascii
+import json
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+class KeysetPagination(BasePagination):
+    """
+    Cursor pagination over a composite, unique ordering such as
+    ``(date, id)``. Every page is a single range scan on that ordering, so
+    it costs the same however deep the client scrolls.
+
+    Clients opt in by sending ``page_size`` or ``cursor``; without them the
+    view keeps returning the full list.
+    """
+    ordering = ("id",)
+    cursor_query_param = "cursor"
+    page_size_query_param = "page_size"
+    page_size = getattr(settings, "API_PAGE_SIZE", 50)
+    max_page_size = getattr(settings, "API_MAX_PAGE_SIZE", 500)
+    invalid_cursor_message = "Invalid cursor"
+
+    def is_requested(self, request):
+        params = request.GET
+        return self.cursor_query_param in params or self.page_size_query_param in params
+
+    def paginate_queryset(self, queryset, request, view=None):
+        return self.get_page(list(self.get_page_queryset(queryset, request)))
+
+    def get_page_queryset(self, queryset, request):
+        """Narrows ``queryset`` to the requested page, plus one lookahead row."""
+        self.request = request
+        self.base_url = request.build_absolute_uri()
+        self.page_size = self.get_page_size(request)
+        self.model = queryset.model
+
+        self.cursor = self.decode_cursor(request)
+        self.reverse = False
+        if self.cursor is not None:
+            position, self.reverse = self.cursor
+            queryset = queryset.filter(self.after(position, self.reverse))
+
+        order_by = [f"-{field}" if self.reverse else field for field in self.ordering]
+        return queryset.order_by(*order_by)[:self.page_size + 1]
+
+    def get_page(self, rows):
+        """Turns the rows fetched by ``get_page_queryset`` into the page."""
+        has_more = len(rows) > self.page_size
+        rows = rows[:self.page_size]
+        if self.reverse:
+            rows.reverse()
+
+        self.next_position = None
+        self.previous_position = None
+        if rows:
+            if has_more or self.reverse:
+                self.next_position = self.position_of(rows[-1])
+            if self.cursor is not None and (has_more or not self.reverse):
+                self.previous_position = self.position_of(rows[0])
+        return rows
+
+    def get_page_size(self, request):
+        try:
+            size = int(request.GET[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        return min(max(size, 1), self.max_page_size)
+
+    def after(self, position, reverse):
+        # Expands (a, b) > (x, y) into (a > x) OR (a = x AND b > y).
+        lookup = "lt" if reverse else "gt"
+        condition = Q()
+        equal = {}
+        for field, value in zip(self.ordering, position):
+            condition |= Q(**equal, **{f"{field}__{lookup}": value})
+            equal[field] = value
+        return condition
+
+    def position_of(self, instance):
+        return [getattr(instance, field) for field in self.ordering]
+
+    def encode_cursor(self, position, reverse):
+        # isoformat() keeps microseconds, which DjangoJSONEncoder would drop.
+        values = [v.isoformat() if hasattr(v, "isoformat") else v for v in position]
+        raw = json.dumps({"p": values, "r": int(reverse)}, separators=(",", ":"))
+        return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+    def decode_cursor(self, request):
+        encoded = request.GET.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            raw = base64.urlsafe_b64decode(encoded + "=" * (-len(encoded) % 4))
+            payload = json.loads(raw)
+            position = [
+                self.model._meta.get_field(field).to_python(value)
+                for field, value in zip(self.ordering, payload["p"], strict=True)
+            ]
+            return position, bool(payload["r"])
+        except (binascii.Error, ValueError, TypeError, KeyError, ValidationError) as exc:
+            raise NotFound(self.invalid_cursor_message) from exc
+
+    def get_link(self, position, reverse):
+        if position is None:
+            return None
+        return replace_query_param(
+            self.base_url, self.cursor_query_param, self.encode_cursor(position, reverse))
+
+    def get_paginated_data(self, data):
+        return {
+            "next": self.get_link(self.next_position, False),
+            "previous": self.get_link(self.previous_position, True),
+            "results": data,
+        }
+
+    def get_paginated_response(self, data):
+        return Response(self.get_paginated_data(data))
+
+
+class SessionPagination(KeysetPagination):
+    ordering = ("date", "id")
+
+
+class SkillPagination(KeysetPagination):
+    ordering = ("created_at", "id")
@@ -0,0 +1,150 @@
+import cProfile
+import os
+import pstats
+import sys
+import time
+import uuid
+from pathlib import Path
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.exceptions import AuthenticationFailed
+from .authentication import CachedJWTAuthentication
+from .models import RequestProfile
+
+# Staff users can profile a single request with "X-Profile: 1" or
+# "?profile=1". The capture is written to PROFILE_ROOT and listed in the
+# admin, which shows its call tree and hottest functions.
+
+HEADER = "X-Profile"
+PARAM = "profile"
+HOT_FUNCTIONS = 30
+# Calls taking less than this share of the request are left out of the tree.
+MIN_TREE_SHARE = 0.01
+MAX_TREE_DEPTH = 40
+
+
+class RequestProfilerMiddleware:
+    """
+    Runs flagged requests of staff users under cProfile. Enabled with
+    ``REQUEST_PROFILING = True``; otherwise it is not loaded at all.
+    """
+
+    def __init__(self, get_response):
+        if not getattr(settings, "REQUEST_PROFILING", False):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not profile_requested(request):
+            return self.get_response(request)
+        user = staff_user(request)
+        if user is None:
+            return self.get_response(request)
+
+        profiler = cProfile.Profile()
+        start = time.perf_counter()
+        response = profiler.runcall(self.get_response, request)
+        duration = time.perf_counter() - start
+        profile = save_profile(profiler, request, response, user, duration)
+        response["X-Profile-Id"] = str(profile.pk)
+        response["X-Profile-Url"] = reverse("admin:core_requestprofile_change", args=[profile.pk])
+        return response
+
+
+def profile_requested(request):
+    if request.headers.get(HEADER) == "1":
+        return True
+    # Only parse the query string when the flag could be there.
+    return f"{PARAM}=" in request.META.get("QUERY_STRING", "") and request.GET.get(PARAM) == "1"
+
+
+def staff_user(request):
+    """The session user, or else the bearer token's user, if they are staff."""
+    user = request.user
+    if not user.is_authenticated:
+        try:
+            user, _ = CachedJWTAuthentication().authenticate(request) or (user, None)
+        except AuthenticationFailed:
+            return None
+    return user if user.is_active and user.is_staff else None
+
+
+def profile_path(file_name):
+    return Path(settings.PROFILE_ROOT) / file_name
+
+
+def save_profile(profiler, request, response, user, duration):
+    file_name = f"{timezone.now():%Y%m%d-%H%M%S}-{uuid.uuid4().hex[:8]}.prof"
+    path = profile_path(file_name)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    profiler.dump_stats(path)
+    return RequestProfile.objects.create(
+        user=user,
+        method=request.method,
+        path=request.get_full_path()[:2000],
+        status_code=response.status_code,
+        duration_ms=round(duration * 1000, 1),
+        file_name=file_name,
+    )
+
+
+def load_stats(profile):
+    return pstats.Stats(str(profile_path(profile.file_name)))
+
+
+def function_label(func):
+    filename, line, name = func
+    if filename == "~":
+        # Built-ins, e.g. "<method 'execute' of 'sqlite3.Cursor' objects>".
+        return name
+    for prefix in sorted(filter(None, sys.path), key=len, reverse=True):
+        if filename.startswith(prefix + os.sep):
+            filename = filename[len(prefix) + 1:]
+            break
+    return f"{name} ({filename}:{line})"
+
+
+def hot_functions(stats, limit=HOT_FUNCTIONS):
+    """The functions with the most time spent in their own code."""
+    rows = sorted(stats.stats.items(), key=lambda item: item[1][2], reverse=True)[:limit]
+    return [
+        {"function": function_label(func), "calls": calls, "own_ms": own * 1000,
+         "total_ms": total * 1000}
+        for func, (_, calls, own, total, _) in rows
+    ]
+
+
+def call_tree(stats):
+    """
+    Nested ``{"function", "calls", "total_ms", "children"}`` dicts from the
+    entry points down, heaviest first. Each node counts only the calls made
+    from its parent; recursion is cut at the first repeat.
+    """
+    callees = {}
+    for func, (*_, callers) in stats.stats.items():
+        for caller, edge in callers.items():
+            callees.setdefault(caller, []).append((func, edge))
+    cutoff = stats.total_tt * MIN_TREE_SHARE
+
+    def node(func, calls, total, ancestors):
+        children = []
+        if len(ancestors) < MAX_TREE_DEPTH:
+            edges = sorted(callees.get(func, ()), key=lambda edge: edge[1][3], reverse=True)
+            children = [
+                node(child, edge_calls, edge_total, ancestors | {child})
+                for child, (edge_calls, _, _, edge_total) in edges
+                if edge_total >= cutoff and child not in ancestors
+            ]
+        return {"function": function_label(func), "calls": calls, "total_ms": total * 1000,
+                "children": children}
+
+    # Entry points were called from outside the profile (Profile.runcall),
+    # which is not recorded as a caller, so their callers account for fewer
+    # calls than they had. They can also be called again further down.
+    roots = [(func, row) for func, row in stats.stats.items()
+             if sum(edge[0] for edge in row[4].values()) < row[1]]
+    roots.sort(key=lambda root: root[1][3], reverse=True)
+    return [node(func, calls, total, {func})
+            for func, (_, calls, _, total, _) in roots if total >= cutoff]
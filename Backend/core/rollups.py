@@ -0,0 +1,101 @@
+from datetime import timedelta
+from itertools import islice
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Sum
+from .models import DailyStudyRollup, StudySession
+
+
+def apply_session_delta(user_id, skill_id, date, count, duration):
+    """Adds ``count`` sessions totalling ``duration`` to one rollup row."""
+    rollups = DailyStudyRollup.objects.filter(
+        user_id=user_id, skill_id=skill_id, date=date)
+    updated = rollups.update(
+        session_count=F("session_count") + count,
+        total_duration=F("total_duration") + duration,
+    )
+    if not updated and count > 0:
+        try:
+            with transaction.atomic():
+                DailyStudyRollup.objects.create(
+                    user_id=user_id, skill_id=skill_id, date=date,
+                    session_count=count, total_duration=duration)
+        except IntegrityError:
+            # Another writer created the row first, add on top of theirs.
+            apply_session_delta(user_id, skill_id, date, count, duration)
+    elif count < 0:
+        rollups.filter(session_count__lte=0).delete()
+
+
+def add_session(state):
+    user_id, skill_id, date, duration = state
+    apply_session_delta(user_id, skill_id, date, 1, duration)
+
+
+def remove_session(state):
+    user_id, skill_id, date, duration = state
+    apply_session_delta(user_id, skill_id, date, -1, -duration)
+
+
+def apply_bulk_deltas(user_id, deltas):
+    """
+    Merges ``{(skill_id, date): [count, duration]}`` into the user's rollups
+    with one read, one bulk update and one bulk insert. Counts may be
+    negative; rows left without sessions are deleted.
+    """
+    if not deltas:
+        return
+    skill_ids = {skill_id for skill_id, _ in deltas}
+    dates = [date for _, date in deltas]
+    existing = {
+        (rollup.skill_id, rollup.date): rollup
+        for rollup in DailyStudyRollup.objects.select_for_update().filter(
+            user_id=user_id, skill_id__in=skill_ids,
+            date__gte=min(dates), date__lte=max(dates))
+    }
+
+    changed, emptied, new = [], [], []
+    for (skill_id, date), (count, duration) in deltas.items():
+        rollup = existing.get((skill_id, date))
+        if rollup is None:
+            if count > 0:
+                new.append(DailyStudyRollup(
+                    user_id=user_id, skill_id=skill_id, date=date,
+                    session_count=count, total_duration=duration))
+        else:
+            rollup.session_count += count
+            rollup.total_duration += duration
+            (changed if rollup.session_count > 0 else emptied).append(rollup)
+    DailyStudyRollup.objects.bulk_update(
+        changed, ["session_count", "total_duration"], batch_size=500)
+    DailyStudyRollup.objects.bulk_create(new, batch_size=500)
+    DailyStudyRollup.objects.filter(pk__in=[rollup.pk for rollup in emptied]).delete()
+
+
+def rebuild_rollups(user=None, batch_size=1000):
+    """Recomputes the rollups from ``StudySession``, for one user or everyone."""
+    sessions = StudySession.objects.all()
+    rollups = DailyStudyRollup.objects.all()
+    if user is not None:
+        sessions = sessions.filter(user=user)
+        rollups = rollups.filter(user=user)
+
+    grouped = (
+        sessions.values("user_id", "skill_id", "date")
+        .annotate(session_count=Count("id"), total_duration=Sum("duration"))
+        .order_by()
+    )
+    rows = (DailyStudyRollup(
+        user_id=row["user_id"],
+        skill_id=row["skill_id"],
+        date=row["date"],
+        session_count=row["session_count"],
+        total_duration=row["total_duration"] or timedelta(),
+    ) for row in grouped.iterator(chunk_size=batch_size))
+
+    created = 0
+    with transaction.atomic():
+        rollups.delete()
+        while batch := list(islice(rows, batch_size)):
+            DailyStudyRollup.objects.bulk_create(batch)
+            created += len(batch)
+    return created
@@ -0,0 +1,276 @@
+from django.db import connection
+from .models import Skill, StudySession
+
+# Session notes and skill names/descriptions live in one index table that
+# database triggers keep in sync, so every write path (ORM saves, bulk_create,
+# imports, queryset updates, cascaded deletes) updates it. PostgreSQL stores a
+# weighted tsvector behind a GIN index; SQLite uses an FTS5 virtual table.
+# Skills hidden by batch.delete_skills are taken out with forget_skills()
+# before their rows are purged.
+INDEX_TABLE = "core_search_index"
+KINDS = ("session", "skill")
+
+POSTGRES_SCHEMA = [
+    f"""
+    CREATE TABLE {INDEX_TABLE} (
+        kind varchar(10) NOT NULL,
+        object_id bigint NOT NULL,
+        user_id integer,
+        document tsvector NOT NULL,
+        PRIMARY KEY (kind, object_id)
+    )
+    """,
+    f"CREATE INDEX {INDEX_TABLE}_document ON {INDEX_TABLE} USING gin (document)",
+    f"CREATE INDEX {INDEX_TABLE}_user ON {INDEX_TABLE} (user_id)",
+    f"""
+    CREATE FUNCTION {INDEX_TABLE}_session() RETURNS trigger AS $$
+    BEGIN
+        IF TG_OP = 'DELETE' THEN
+            DELETE FROM {INDEX_TABLE} WHERE kind = 'session' AND object_id = OLD.id;
+            RETURN OLD;
+        END IF;
+        INSERT INTO {INDEX_TABLE} (kind, object_id, user_id, document)
+        VALUES ('session', NEW.id, NEW.user_id,
+                setweight(to_tsvector('english', coalesce(NEW.notes, '')), 'B'))
+        ON CONFLICT (kind, object_id) DO UPDATE
+        SET user_id = EXCLUDED.user_id, document = EXCLUDED.document;
+        RETURN NEW;
+    END
+    $$ LANGUAGE plpgsql
+    """,
+    f"""
+    CREATE FUNCTION {INDEX_TABLE}_skill() RETURNS trigger AS $$
+    BEGIN
+        IF TG_OP = 'DELETE' THEN
+            DELETE FROM {INDEX_TABLE} WHERE kind = 'skill' AND object_id = OLD.id;
+            RETURN OLD;
+        END IF;
+        INSERT INTO {INDEX_TABLE} (kind, object_id, user_id, document)
+        VALUES ('skill', NEW.id, NEW.user_id,
+                setweight(to_tsvector('english', coalesce(NEW.name, '')), 'A')
+                || setweight(to_tsvector('english', coalesce(NEW.description, '')), 'B'))
+        ON CONFLICT (kind, object_id) DO UPDATE
+        SET user_id = EXCLUDED.user_id, document = EXCLUDED.document;
+        RETURN NEW;
+    END
+    $$ LANGUAGE plpgsql
+    """,
+    f"""
+    CREATE TRIGGER {INDEX_TABLE}_session
+    AFTER INSERT OR DELETE OR UPDATE OF notes, user_id ON core_studysession
+    FOR EACH ROW EXECUTE FUNCTION {INDEX_TABLE}_session()
+    """,
+    f"""
+    CREATE TRIGGER {INDEX_TABLE}_skill
+    AFTER INSERT OR DELETE OR UPDATE OF name, description, user_id ON core_skill
+    FOR EACH ROW EXECUTE FUNCTION {INDEX_TABLE}_skill()
+    """,
+]
+
+POSTGRES_FILL = [
+    f"""
+    INSERT INTO {INDEX_TABLE} (kind, object_id, user_id, document)
+    SELECT 'session', id, user_id, setweight(to_tsvector('english', coalesce(notes, '')), 'B')
+    FROM core_studysession
+    """,
+    f"""
+    INSERT INTO {INDEX_TABLE} (kind, object_id, user_id, document)
+    SELECT 'skill', id, user_id,
+           setweight(to_tsvector('english', coalesce(name, '')), 'A')
+           || setweight(to_tsvector('english', coalesce(description, '')), 'B')
+    FROM core_skill
+    """,
+]
+
+POSTGRES_DROP = [
+    f"DROP TABLE IF EXISTS {INDEX_TABLE}",
+    f"DROP TRIGGER IF EXISTS {INDEX_TABLE}_session ON core_studysession",
+    f"DROP TRIGGER IF EXISTS {INDEX_TABLE}_skill ON core_skill",
+    f"DROP FUNCTION IF EXISTS {INDEX_TABLE}_session()",
+    f"DROP FUNCTION IF EXISTS {INDEX_TABLE}_skill()",
+]
+
+POSTGRES_FORGET = f"""
+    DELETE FROM {INDEX_TABLE}
+    WHERE (kind = 'session' AND object_id IN (
+               SELECT id FROM core_studysession WHERE skill_id IN ({{ids}})))
+       OR (kind = 'skill' AND object_id IN ({{ids}}))
+"""
+
+POSTGRES_SEARCH = f"""
+    SELECT kind, object_id, ts_rank_cd(document, query) AS rank, count(*) OVER ()
+    FROM {INDEX_TABLE}, websearch_to_tsquery('english', %(text)s) query
+    WHERE user_id = %(user)s AND document @@ query {{kind}}
+    ORDER BY rank DESC, kind, object_id
+    LIMIT %(limit)s OFFSET %(offset)s
+"""
+
+# The rowid is derived from the object id (even for sessions, odd for
+# skills), so the triggers update and delete entries by rowid instead of
+# scanning the unindexed columns.
+SQLITE_SESSION_ROW = (
+    "NEW.id * 2, '', coalesce(NEW.notes, ''), 'session', NEW.id, NEW.user_id")
+SQLITE_SKILL_ROW = (
+    "NEW.id * 2 + 1, NEW.name, coalesce(NEW.description, ''), 'skill', NEW.id, NEW.user_id")
+SQLITE_COLUMNS = "rowid, title, body, kind, object_id, user_id"
+
+SQLITE_SCHEMA = [
+    f"""
+    CREATE VIRTUAL TABLE {INDEX_TABLE} USING fts5(
+        title, body, kind UNINDEXED, object_id UNINDEXED, user_id UNINDEXED,
+        tokenize = 'porter unicode61'
+    )
+    """,
+    f"""
+    CREATE TRIGGER {INDEX_TABLE}_session_insert AFTER INSERT ON core_studysession BEGIN
+        INSERT INTO {INDEX_TABLE} ({SQLITE_COLUMNS}) VALUES ({SQLITE_SESSION_ROW});
+    END
+    """,
+    f"""
+    CREATE TRIGGER {INDEX_TABLE}_session_update
+    AFTER UPDATE OF notes, user_id ON core_studysession BEGIN
+        DELETE FROM {INDEX_TABLE} WHERE rowid = OLD.id * 2;
+        INSERT INTO {INDEX_TABLE} ({SQLITE_COLUMNS}) VALUES ({SQLITE_SESSION_ROW});
+    END
+    """,
+    f"""
+    CREATE TRIGGER {INDEX_TABLE}_session_delete AFTER DELETE ON core_studysession BEGIN
+        DELETE FROM {INDEX_TABLE} WHERE rowid = OLD.id * 2;
+    END
+    """,
+    f"""
+    CREATE TRIGGER {INDEX_TABLE}_skill_insert AFTER INSERT ON core_skill BEGIN
+        INSERT INTO {INDEX_TABLE} ({SQLITE_COLUMNS}) VALUES ({SQLITE_SKILL_ROW});
+    END
+    """,
+    f"""
+    CREATE TRIGGER {INDEX_TABLE}_skill_update
+    AFTER UPDATE OF name, description, user_id ON core_skill BEGIN
+        DELETE FROM {INDEX_TABLE} WHERE rowid = OLD.id * 2 + 1;
+        INSERT INTO {INDEX_TABLE} ({SQLITE_COLUMNS}) VALUES ({SQLITE_SKILL_ROW});
+    END
+    """,
+    f"""
+    CREATE TRIGGER {INDEX_TABLE}_skill_delete AFTER DELETE ON core_skill BEGIN
+        DELETE FROM {INDEX_TABLE} WHERE rowid = OLD.id * 2 + 1;
+    END
+    """,
+]
+
+SQLITE_FILL = [
+    f"""
+    INSERT INTO {INDEX_TABLE} ({SQLITE_COLUMNS})
+    SELECT id * 2, '', coalesce(notes, ''), 'session', id, user_id FROM core_studysession
+    """,
+    f"""
+    INSERT INTO {INDEX_TABLE} ({SQLITE_COLUMNS})
+    SELECT id * 2 + 1, name, coalesce(description, ''), 'skill', id, user_id FROM core_skill
+    """,
+]
+
+SQLITE_DROP = [
+    *(f"DROP TRIGGER IF EXISTS {INDEX_TABLE}_{kind}_{event}"
+      for kind in KINDS for event in ("insert", "update", "delete")),
+    f"DROP TABLE IF EXISTS {INDEX_TABLE}",
+]
+
+SQLITE_FORGET = f"""
+    DELETE FROM {INDEX_TABLE} WHERE rowid IN (
+        SELECT id * 2 FROM core_studysession WHERE skill_id IN ({{ids}})
+        UNION ALL SELECT id * 2 + 1 FROM core_skill WHERE id IN ({{ids}})
+    )
+"""
+
+# bm25() is lower for better matches; names weigh more than descriptions.
+# FTS5 functions cannot be used next to a window function, hence the subquery.
+SQLITE_SEARCH = f"""
+    SELECT kind, object_id, rank, count(*) OVER () FROM (
+        SELECT kind, object_id, -bm25({INDEX_TABLE}, 4.0, 1.0) AS rank
+        FROM {INDEX_TABLE}
+        WHERE {INDEX_TABLE} MATCH %(text)s AND user_id = %(user)s {{kind}}
+    )
+    ORDER BY rank DESC, kind, object_id
+    LIMIT %(limit)s OFFSET %(offset)s
+"""
+
+BACKENDS = {
+    "postgresql": (POSTGRES_SCHEMA, POSTGRES_FILL, POSTGRES_DROP, POSTGRES_SEARCH, POSTGRES_FORGET),
+    "sqlite": (SQLITE_SCHEMA, SQLITE_FILL, SQLITE_DROP, SQLITE_SEARCH, SQLITE_FORGET),
+}
+
+
+def create_index(schema_editor):
+    schema, fill, *_ = BACKENDS[schema_editor.connection.vendor]
+    for statement in schema + fill:
+        schema_editor.execute(statement)
+
+
+def drop_index(schema_editor):
+    for statement in BACKENDS[schema_editor.connection.vendor][2]:
+        schema_editor.execute(statement)
+
+
+def rebuild_index():
+    """
+    Recreates the index table and its triggers and refills them. SQLite drops
+    the triggers when a migration rebuilds core_studysession or core_skill.
+    """
+    with connection.schema_editor() as schema_editor:
+        drop_index(schema_editor)
+        create_index(schema_editor)
+    forget_skills(list(
+        Skill.all_objects.filter(deleted_at__isnull=False).values_list("pk", flat=True)))
+
+
+def forget_skills(ids):
+    """Removes the entries of the skills ``ids`` and of their sessions."""
+    if not ids:
+        return
+    sql = BACKENDS[connection.vendor][4].format(ids=", ".join(["%s"] * len(ids)))
+    with connection.cursor() as cursor:
+        cursor.execute(sql, [*ids, *ids])
+
+
+def match_query(text):
+    # Every word must match; quoting keeps FTS5 operators and punctuation
+    # in user input from being parsed as query syntax.
+    return " ".join('"{}"'.format(word.replace('"', '""')) for word in text.split())
+
+
+def search(user, text, kind=None, limit=20, offset=0):
+    """
+    Sessions and skills of ``user`` matching ``text``, best match first.
+    Returns ``(count, hits)`` with ``hits`` a list of ``(kind, object, rank)``.
+    """
+    query = match_query(text) if connection.vendor == "sqlite" else text
+    if not query.strip():
+        return 0, []
+    rows = fetch_rows(query, user, kind, limit, offset)
+    if rows:
+        return rows[0][3], load_hits(rows)
+    if offset:
+        # Past the last page, where the window count is not available.
+        rows = fetch_rows(query, user, kind, 1, 0)
+    return (rows[0][3] if rows else 0), []
+
+
+def fetch_rows(query, user, kind, limit, offset):
+    sql = BACKENDS[connection.vendor][3].format(kind="AND kind = %(kind)s" if kind else "")
+    params = {"text": query, "user": user.pk, "kind": kind, "limit": limit, "offset": offset}
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        return cursor.fetchall()
+
+
+def load_hits(rows):
+    ids = {kind: [object_id for row_kind, object_id, _, _ in rows if row_kind == kind]
+           for kind in KINDS}
+    objects = {
+        "session": StudySession.objects.select_related("skill").in_bulk(ids["session"]),
+        "skill": Skill.objects.in_bulk(ids["skill"]),
+    }
+    return [
+        (kind, objects[kind][object_id], rank)
+        for kind, object_id, rank, _ in rows
+        if object_id in objects[kind]
+    ]
@@ -1,29 +1,235 @@
+from django.conf import settings
 from rest_framework import serializers
-from .models import StudySession, Skill, UserProfile
+from .models import StudySession, Skill, UserProfile, Task
 from django.contrib.auth.models import User
 
 
-class StudySessionSerializer(serializers.ModelSerializer):
-    skill_name = serializers.CharField(source='skill.name', read_only=True)
+class SparseFieldsMixin:
+    """
+    Lets a response carry only some fields (``fields=["id", "date"]``) and
+    render relations named in ``expandable_fields`` as nested objects
+    (``expand=["skill"]``) instead of ids.
+    """
+    expandable_fields = {}
 
-    class Meta:
-        model = StudySession
-        fields = "__all__"
+    def __init__(self, *args, fields=None, expand=None, native=False, **kwargs):
+        super().__init__(*args, **kwargs)
+        for name in expand or ():
+            if name not in self.expandable_fields:
+                raise serializers.ValidationError({"expand": [f"Cannot expand '{name}'."]})
+            self.fields[name] = self.expandable_fields[name](read_only=True, native=native)
+        if fields is not None:
+            unknown = set(fields) - set(self.fields)
+            if unknown:
+                raise serializers.ValidationError(
+                    {"fields": [f"Unknown field(s): {', '.join(sorted(unknown))}."]})
+            for name in set(self.fields) - set(fields):
+                self.fields.pop(name)
+        # With native=True, dates, datetimes and durations are left as Python
+        # objects for renderers that encode them natively (MessagePack).
+        # Dates only need format=None; durations are swapped in afterwards.
+        self.native_fields = []
+        for name, field in self.fields.items() if native else ():
+            if isinstance(field, (serializers.DateField, serializers.DateTimeField)):
+                field.format = None
+            elif isinstance(field, serializers.DurationField) and not field.write_only:
+                self.native_fields.append(name)
+
+    @staticmethod
+    def request_options(request, sparse=True):
+        """
+        Reads ``?fields=id,date`` and ``?expand=skill`` from the query string
+        (unless ``sparse`` is false), and whether the negotiated renderer
+        takes native values.
+        """
+        options = {}
+        for param in ("fields", "expand") if sparse else ():
+            if request.GET.get(param):
+                options[param] = [name.strip() for name in request.GET[param].split(",") if name.strip()]
+        if getattr(getattr(request, "accepted_renderer", None), "native_values", False):
+            options["native"] = True
+        return options
+
+    def to_representation(self, instance):
+        data = super().to_representation(instance)
+        for name in self.native_fields:
+            data[name] = self.fields[name].get_attribute(instance)
+        return data
+
+    def select_columns(self, queryset, *always):
+        """Loads only the columns, and joins only the relations, that are rendered."""
+        columns, relations = source_paths(self)
+        queryset = queryset.select_related(None)
+        if relations:
+            # A bare select_related() would follow every relation.
+            queryset = queryset.select_related(*relations)
+        return queryset.only(*columns, *always)
 
 
-class SkillSerializer(serializers.ModelSerializer):
+def source_paths(serializer, prefix=""):
+    """``(columns, relations)`` read by ``serializer``, in ORM lookup form."""
+    columns, relations = set(), set()
+    for field in serializer.fields.values():
+        if field.source == "*":
+            continue
+        path = prefix + field.source.replace(".", "__")
+        if isinstance(field, serializers.BaseSerializer):
+            nested_columns, nested_relations = source_paths(field, path + "__")
+            columns |= nested_columns
+            relations |= {path} | nested_relations
+        else:
+            columns.add(path)
+            if "__" in path[len(prefix):]:
+                relations.add(path.rsplit("__", 1)[0])
+    return columns, relations
+
+
+class SkillSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = Skill
-        fields = "__all__"
+        # Skills are deleted through batch.delete_skills, which also clears
+        # their rollups and search entries and queues the purge.
+        exclude = ['deleted_at']
         read_only_fields = ['user']
 
 
+class StudySessionSerializer(SparseFieldsMixin, serializers.ModelSerializer):
+    skill_name = serializers.CharField(source='skill.name', read_only=True)
+    expandable_fields = {"skill": SkillSerializer}
+
+    class Meta:
+        model = StudySession
+        fields = "__all__"
+
+
 class UserProfileSerializer(serializers.ModelSerializer):
     class Meta:
         model = UserProfile
         fields = "__all__"
 
 
+class StatsQuerySerializer(serializers.Serializer):
+    to = serializers.DateField(required=False)
+    granularity = serializers.ChoiceField(choices=["day", "week", "month"], default="day")
+    skill = serializers.IntegerField(required=False)
+    category = serializers.CharField(required=False)
+
+    def get_fields(self):
+        fields = super().get_fields()
+        # "from" is a keyword, so it cannot be declared above.
+        fields["from"] = serializers.DateField(required=False)
+        return fields
+
+    def validate(self, data):
+        if data.get("from") and data.get("to") and data["from"] > data["to"]:
+            raise serializers.ValidationError({"to": ["Must not be before from."]})
+        return data
+
+
+class StatsTotalsSerializer(SparseFieldsMixin, serializers.Serializer):
+    sessions = serializers.IntegerField()
+    duration = serializers.DurationField()
+
+
+class StatsBucketSerializer(SparseFieldsMixin, serializers.Serializer):
+    start = serializers.DateField()
+    sessions = serializers.IntegerField()
+    duration = serializers.DurationField()
+
+
+class SearchQuerySerializer(serializers.Serializer):
+    q = serializers.CharField(max_length=200)
+    type = serializers.ChoiceField(choices=["session", "skill"], required=False, allow_blank=True)
+    page = serializers.IntegerField(min_value=1, default=1)
+    page_size = serializers.IntegerField(min_value=1, max_value=100, default=20)
+
+
+class SessionChangesSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = StudySession
+        fields = ["skill", "date", "duration", "notes"]
+        extra_kwargs = {name: {"required": False} for name in fields}
+
+    def get_fields(self):
+        fields = super().get_fields()
+        fields["skill"].queryset = Skill.objects.filter(user=self.context["user"])
+        return fields
+
+
+class SkillChangesSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Skill
+        fields = ["name", "description", "category"]
+        extra_kwargs = {name: {"required": False} for name in fields}
+
+
+class SessionFilterSerializer(serializers.Serializer):
+    skill = serializers.IntegerField(required=False)
+    to = serializers.DateField(required=False)
+
+    def get_fields(self):
+        fields = super().get_fields()
+        fields["from"] = serializers.DateField(required=False)
+        return fields
+
+    def validate(self, data):
+        if not data:
+            raise serializers.ValidationError("Give at least one of skill, from and to.")
+        if data.get("from") and data.get("to") and data["from"] > data["to"]:
+            raise serializers.ValidationError({"to": ["Must not be before from."]})
+        return data
+
+
+class SkillFilterSerializer(serializers.Serializer):
+    category = serializers.CharField()
+
+
+class BatchSerializer(serializers.Serializer):
+    """
+    ``{"action": "update" | "delete", "ids": [...] | "filter": {...},
+    "changes": {...}}``, where ``changes`` is only given for updates.
+    """
+    filter_class = None
+    changes_class = None
+
+    action = serializers.ChoiceField(choices=["update", "delete"])
+    ids = serializers.ListField(
+        child=serializers.IntegerField(), required=False, min_length=1,
+        max_length=getattr(settings, "BATCH_MAX_ROWS", 5000))
+
+    def get_fields(self):
+        fields = super().get_fields()
+        fields["filter"] = self.filter_class(required=False)
+        fields["changes"] = self.changes_class(required=False)
+        return fields
+
+    def validate(self, data):
+        if ("ids" in data) == ("filter" in data):
+            raise serializers.ValidationError("Give either ids or filter.")
+        if data["action"] == "update" and not data.get("changes"):
+            raise serializers.ValidationError({"changes": ["Give at least one field to update."]})
+        if data["action"] == "delete" and "changes" in data:
+            raise serializers.ValidationError({"changes": ["Not used when deleting."]})
+        return data
+
+
+class SessionBatchSerializer(BatchSerializer):
+    filter_class = SessionFilterSerializer
+    changes_class = SessionChangesSerializer
+
+
+class SkillBatchSerializer(BatchSerializer):
+    filter_class = SkillFilterSerializer
+    changes_class = SkillChangesSerializer
+
+
+class TaskSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Task
+        fields = ["id", "name", "status", "attempts", "max_attempts",
+                  "created_at", "started_at", "finished_at"]
+
+
 class UserSerializer(serializers.ModelSerializer):
     class Meta:
         model = User
@@ -0,0 +1,82 @@
+from functools import partial
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+from .models import RequestProfile, Skill, StudySession
+from .authentication import forget_user
+from . import activity, caching, profiling, rollups
+
+
+@receiver(pre_save, sender=StudySession)
+def load_session_rollup_state(sender, instance, raw=False, **kwargs):
+    # Always the stored row rather than the values this instance was loaded
+    # with: another request may have saved it in between. StudySession.save()
+    # is atomic, so the row stays locked until the rollups are updated.
+    if instance._state.adding or raw:
+        instance._rollup_state = None
+    else:
+        instance._rollup_state = instance.stored_rollup_state()
+
+
+@receiver(post_save, sender=StudySession)
+def update_rollups_on_save(sender, instance, created, raw=False, update_fields=None, **kwargs):
+    if raw:
+        return
+    old_state = None if created else instance._rollup_state
+    # Fields that were deferred or left out of update_fields keep their
+    # stored values, which may differ from the instance's.
+    new_state = instance.rollup_state() if update_fields is None else None
+    if new_state is None:
+        new_state = instance.stored_rollup_state()
+    instance._rollup_state = None
+    if old_state == new_state:
+        return
+    if old_state:
+        rollups.remove_session(old_state)
+    rollups.add_session(new_state)
+    refresh_activity(*filter(None, (old_state, new_state)))
+
+
+@receiver(post_delete, sender=StudySession)
+def update_rollups_on_delete(sender, instance, **kwargs):
+    # Set by StudySession.delete(); cascades and queryset deletes load the
+    # rows inside their own transaction.
+    state = getattr(instance, "_rollup_state", None) or (
+        instance.user_id, instance.skill_id, instance.date, instance.duration)
+    instance._rollup_state = None
+    rollups.remove_session(state)
+    # When the user is being deleted, the cascade has already removed their
+    # activity row; creating it again would fail the foreign key on commit.
+    refresh_activity(state, create=False)
+
+
+def refresh_activity(*states, create=True):
+    dates_by_user = {}
+    for user_id, _, date, _ in states:
+        dates_by_user.setdefault(user_id, set()).add(date)
+    for user_id, dates in dates_by_user.items():
+        activity.refresh_days(user_id, dates, create=create)
+
+
+@receiver(post_save, sender=StudySession)
+@receiver(post_delete, sender=StudySession)
+@receiver(post_save, sender=Skill)
+@receiver(post_delete, sender=Skill)
+def bump_user_data_version(sender, instance, **kwargs):
+    # Bump after commit so a concurrent reader cannot cache the old rows
+    # under the new version.
+    transaction.on_commit(partial(caching.bump_data_version, instance.user_id))
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def forget_cached_user(sender, instance, **kwargs):
+    # Deactivation, password changes and deletes all go through here; the
+    # next API request, in any worker, loads the user again.
+    transaction.on_commit(partial(forget_user, instance.pk))
+
+
+@receiver(post_delete, sender=RequestProfile)
+def delete_profile_file(sender, instance, **kwargs):
+    transaction.on_commit(partial(profiling.profile_path(instance.file_name).unlink, missing_ok=True))
@@ -0,0 +1,165 @@
+import gzip
+import hashlib
+import mimetypes
+import posixpath
+from pathlib import Path
+from urllib.parse import unquote, urlsplit
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage, staticfiles_storage
+from django.http import FileResponse
+from django.utils.cache import get_conditional_response
+from django.utils.functional import cached_property
+
+try:
+    import brotli
+except ImportError:  # Only the .gz siblings are written without it.
+    brotli = None
+
+COMPRESSIBLE_EXTENSIONS = {
+    ".css", ".js", ".mjs", ".json", ".map", ".svg", ".txt", ".xml", ".html",
+    ".webmanifest", ".ico", ".ttf", ".otf", ".eot",
+}
+# (extension, Content-Encoding, compress), best first.
+ENCODINGS = [
+    (".br", "br", lambda data: brotli.compress(data, quality=11) if brotli else None),
+    (".gz", "gzip", lambda data: gzip.compress(data, compresslevel=9, mtime=0)),
+]
+# Compressed copies that save less than this are not worth the extra file.
+MIN_SAVING = 0.05
+
+IMMUTABLE = "public, max-age=31536000, immutable"
+REVALIDATE = "public, max-age=0, must-revalidate"
+
+
+class CompressedManifestStaticFilesStorage(ManifestStaticFilesStorage):
+    """
+    ``collectstatic`` writes content-hashed copies of every file (e.g.
+    ``styles.6f1c2e.css``) plus ``.br`` and ``.gz`` siblings of the
+    compressible ones, which ``StaticFilesMiddleware`` serves.
+    """
+
+    def post_process(self, paths, dry_run=False, **options):
+        names = set()
+        for name, hashed_name, processed in super().post_process(paths, dry_run, **options):
+            if not isinstance(processed, Exception):
+                names.update((name, hashed_name))
+            yield name, hashed_name, processed
+        if not dry_run:
+            # Most hashed copies have the same content as the original, and
+            # Brotli at its best quality is slow, so compress each content once.
+            compressed = {}
+            for name in sorted(filter(None, names)):
+                self.compress(name, compressed)
+
+    def compress(self, name, compressed):
+        if posixpath.splitext(name)[1].lower() not in COMPRESSIBLE_EXTENSIONS:
+            return
+        path = Path(self.path(name))
+        data = path.read_bytes()
+        key = hashlib.sha256(data).digest()
+        if key not in compressed:
+            compressed[key] = [
+                (extension, compress(data)) for extension, _, compress in ENCODINGS]
+        for extension, content in compressed[key]:
+            if content is not None and len(content) <= len(data) * (1 - MIN_SAVING):
+                path.with_name(path.name + extension).write_bytes(content)
+
+    def stored_name(self, name):
+        # Without a manifest (collectstatic has not run, e.g. in tests or
+        # local runs) files are referenced by their plain names.
+        if not self.hashed_files:
+            return name
+        return super().stored_name(name)
+
+
+class StaticFilesMiddleware:
+    """
+    Serves files from ``STATIC_ROOT``, picking the ``.br`` or ``.gz`` sibling
+    the client accepts. Hashed names never change content, so they are
+    cached for a year without revalidation; other names are revalidated.
+    Requests for files that were not collected fall through to the views.
+    Works in both handler modes; under ASGI only static requests use a thread.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.prefix = urlsplit(settings.STATIC_URL).path
+        self.root = Path(settings.STATIC_ROOT).resolve()
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        if self.is_static(request):
+            response = self.serve(request, request.path_info[len(self.prefix):])
+            if response is not None:
+                return response
+        return self.get_response(request)
+
+    async def __acall__(self, request):
+        if self.is_static(request):
+            # serve() stats and opens files.
+            response = await sync_to_async(self.serve)(request, request.path_info[len(self.prefix):])
+            if response is not None:
+                return response
+        return await self.get_response(request)
+
+    def is_static(self, request):
+        return request.method in ("GET", "HEAD") and request.path_info.startswith(self.prefix)
+
+    @cached_property
+    def hashed_names(self):
+        return set(getattr(staticfiles_storage, "hashed_files", {}).values())
+
+    def serve(self, request, name):
+        name = posixpath.normpath(unquote(name)).lstrip("/")
+        path = (self.root / name).resolve()
+        if not path.is_relative_to(self.root) or not path.is_file():
+            return None
+
+        variants = [
+            (encoding, path.with_name(path.name + extension))
+            for extension, encoding, _ in ENCODINGS
+        ]
+        variants = [(encoding, variant) for encoding, variant in variants if variant.is_file()]
+        accepted = accepted_encodings(request.headers.get("Accept-Encoding", ""))
+        encoding, file_path = next(
+            ((encoding, variant) for encoding, variant in variants if encoding in accepted),
+            (None, path))
+
+        stat = file_path.stat()
+        etag = f'"{stat.st_mtime_ns:x}-{stat.st_size:x}"'
+        response = get_conditional_response(
+            request, etag=etag, last_modified=int(stat.st_mtime))
+        if response is None:
+            content_type, file_encoding = mimetypes.guess_type(name)
+            if file_encoding or content_type is None:
+                # e.g. a .gz sibling asked for by name.
+                content_type = "application/octet-stream"
+            response = FileResponse(file_path.open("rb"), content_type=content_type)
+            if encoding:
+                response["Content-Encoding"] = encoding
+        response["ETag"] = etag
+        response["Cache-Control"] = IMMUTABLE if name in self.hashed_names else REVALIDATE
+        if variants:
+            response["Vary"] = "Accept-Encoding"
+        return response
+
+
+def accepted_encodings(header):
+    accepted = set()
+    for part in header.split(","):
+        coding, _, params = part.partition(";")
+        quality = params.strip().removeprefix("q=")
+        try:
+            if params and float(quality) == 0:
+                continue
+        except ValueError:
+            pass
+        accepted.add(coding.strip().lower())
+    return accepted
@@ -0,0 +1,38 @@
+from datetime import timedelta
+from django.db.models import F, Sum
+from django.db.models.functions import TruncMonth, TruncWeek
+from .models import DailyStudyRollup
+
+# Buckets are computed from the daily rollups, so a query scans at most one
+# row per day and skill, whatever the number of sessions.
+GRANULARITIES = {
+    "day": F("date"),
+    "week": TruncWeek("date"),
+    "month": TruncMonth("date"),
+}
+
+
+def study_stats(user, granularity="day", date_from=None, date_to=None, skill=None, category=None):
+    """
+    Session count and study time of ``user`` per day, week (starting on
+    Monday) or month, oldest first. Empty buckets are left out.
+    """
+    rollups = DailyStudyRollup.objects.filter(user=user)
+    if date_from:
+        rollups = rollups.filter(date__gte=date_from)
+    if date_to:
+        rollups = rollups.filter(date__lte=date_to)
+    if skill is not None:
+        rollups = rollups.filter(skill_id=skill)
+    if category is not None:
+        rollups = rollups.filter(skill__category=category)
+
+    buckets = list(
+        rollups.annotate(start=GRANULARITIES[granularity]).values("start")
+        .annotate(sessions=Sum("session_count"), duration=Sum("total_duration"))
+        .order_by("start"))
+    totals = {
+        "sessions": sum(bucket["sessions"] for bucket in buckets),
+        "duration": sum((bucket["duration"] for bucket in buckets), start=timedelta()),
+    }
+    return {"totals": totals, "buckets": buckets}
@@ -0,0 +1,44 @@
+import logging
+from django.conf import settings
+from django.db import transaction
+from PIL import UnidentifiedImageError
+from .background import task
+from .models import Skill, StudySession
+from . import images
+
+logger = logging.getLogger(__name__)
+
+PURGE_BATCH_SIZE = getattr(settings, "SKILL_PURGE_BATCH_SIZE", 1000)
+
+
+@task
+def process_profile_picture(profile_id, original):
+    try:
+        images.generate_variants(profile_id, original)
+    except UnidentifiedImageError:
+        # Not worth retrying; the original keeps being served.
+        logger.warning("Profile picture %s is not a readable image", original)
+
+
+@task
+def delete_skill(skill_id):
+    """
+    Purges a skill hidden by batch.delete_skills. Its sessions go in short
+    transactions of PURGE_BATCH_SIZE rows, so no lock is held for long; the
+    rollups and search entries were already removed when it was hidden.
+    """
+    skill = Skill.all_objects.filter(pk=skill_id, deleted_at__isnull=False).first()
+    if skill is None:
+        return
+
+    sessions = StudySession.all_objects.filter(skill_id=skill_id)
+    while True:
+        with transaction.atomic():
+            ids = list(sessions.order_by("pk").values_list("pk", flat=True)[:PURGE_BATCH_SIZE])
+            if not ids:
+                break
+            # One DELETE statement, without loading rows for the signals.
+            batch = StudySession.all_objects.filter(pk__in=ids)
+            batch._raw_delete(batch.db)
+    with transaction.atomic():
+        skill.delete()
@@ -0,0 +1,19 @@
+from django import template
+from django.core.files.storage import default_storage
+
+register = template.Library()
+
+
+@register.filter
+def picture_url(profile, variant):
+    """
+    URL of a resized copy of the profile picture, e.g.
+    ``{{ profile|picture_url:"avatar" }}``. Falls back to the uploaded
+    original while the variants are still being generated.
+    """
+    variants = getattr(profile, "profile_picture_variants", None) or {}
+    if variants.get(variant):
+        return default_storage.url(variants[variant])
+    if getattr(profile, "profile_picture", None):
+        return profile.profile_picture.url
+    return ""
@@ -0,0 +1,42 @@
+from contextlib import contextmanager
+from django.db import connections
+from django.test.utils import CaptureQueriesContext
+
+
+class QueryBudgetMixin:
+    """
+    Assertions for ``TestCase`` subclasses that keep the number of SQL
+    queries per request under control.
+    """
+
+    @contextmanager
+    def assertMaxQueries(self, budget, using="default"):
+        with CaptureQueriesContext(connections[using]) as context:
+            yield context
+        executed = len(context.captured_queries)
+        if executed > budget:
+            queries = "\n".join(
+                f"{i}. {query['sql']}"
+                for i, query in enumerate(context.captured_queries, start=1))
+            self.fail(
+                f"{executed} queries executed, budget is {budget}:\n{queries}")
+
+    def count_queries(self, func, using="default"):
+        with CaptureQueriesContext(connections[using]) as context:
+            func()
+        return len(context.captured_queries)
+
+    def assertQueriesDoNotScale(self, request, add_rows, sizes=(1, 10), using="default"):
+        """
+        Calls ``add_rows(n)`` for every size and checks that ``request()``
+        runs the same number of queries each time, i.e. there is no N+1.
+        """
+        counts = []
+        for size in sizes:
+            add_rows(size)
+            counts.append(self.count_queries(request, using=using))
+        if len(set(counts)) != 1:
+            self.fail(
+                f"Query count grows with the number of rows: "
+                f"{dict(zip(sizes, counts))}")
+        return counts[0]
@@ -1,3 +1,1389 @@
-from django.test import TestCase
+import gzip
+import json
+import os
+import shutil
+import tempfile
+from datetime import date, timedelta
+from io import BytesIO, StringIO
+from unittest import mock
+import msgpack
+from PIL import Image
+from asgiref.sync import iscoroutinefunction
+from django.contrib.auth.models import User
+from django.core.cache import cache, caches
+from django.core.cache.utils import make_template_fragment_key
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.handlers.asgi import ASGIHandler
+from django.conf import settings
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.core.management import CommandError, call_command
+from django.http import HttpResponse
+from django.db.models import Sum
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.db import connection
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.http import http_date
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import RefreshToken
+from .authentication import STAMP_KEY, UserCache, user_cache
+from .background import run_pending, task
+from .forms import SkillForm
+from .models import (
+    DailyStudyRollup, RequestProfile, Skill, StudyActivity, StudySession, Task, UserProfile)
+from .rollups import rebuild_rollups
+from .testing import QueryBudgetMixin
+from . import (
+    activity, batch, images, instrumentation, messagepack, profiling, search, tasks, throttling)
 
 # Create your tests here.
+
+
+class SkillTrackTestCase(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        caches["fragments"].clear()
+        user_cache.clear()
+        throttling.buckets.clear()
+        self.user = User.objects.create_user("alice")
+        self.skill = Skill.objects.create(
+            user=self.user, name="Python", description="", category="programming")
+        self.api = APIClient()
+        self.api.force_authenticate(self.user)
+        self.client.force_login(self.user)
+
+    def add_sessions(self, count, skill=None, start=date(2024, 1, 1)):
+        with self.captureOnCommitCallbacks(execute=True):
+            return [
+                StudySession.objects.create(
+                    user=self.user, skill=skill or self.skill,
+                    date=start + timedelta(days=i % 30),
+                    duration=timedelta(minutes=30), notes="notes")
+                for i in range(count)
+            ]
+
+    def add_skills(self, count):
+        with self.captureOnCommitCallbacks(execute=True):
+            return [
+                Skill.objects.create(
+                    user=self.user, name=f"Skill {i}", description="", category="math")
+                for i in range(count)
+            ]
+
+
+class QueryBudgetTests(QueryBudgetMixin, SkillTrackTestCase):
+
+    def test_session_list_api(self):
+        self.assertQueriesDoNotScale(
+            lambda: self.api.get(reverse("session-list-create")), self.add_sessions)
+
+    def test_session_list_api_paginated(self):
+        self.assertQueriesDoNotScale(
+            lambda: self.api.get(reverse("session-list-create"), {"page_size": 100}),
+            self.add_sessions)
+
+    def test_skill_list_api(self):
+        self.assertQueriesDoNotScale(
+            lambda: self.api.get(reverse("skill-list-create")), self.add_skills)
+
+    def test_session_detail_api(self):
+        session = self.add_sessions(1)[0]
+        with self.assertMaxQueries(1):
+            self.api.get(reverse("session-detail", args=[session.pk]))
+
+    def test_home_page(self):
+        self.assertQueriesDoNotScale(
+            lambda: self.client.get(reverse("home")), self.add_sessions)
+
+    def test_skills_page(self):
+        self.assertQueriesDoNotScale(
+            lambda: self.client.get(reverse("skills")), self.add_skills)
+
+    def test_dashboard(self):
+        def add_rows(count):
+            self.add_sessions(count)
+            cache.clear()
+
+        self.assertQueriesDoNotScale(
+            lambda: self.client.get(reverse("dashboard")), add_rows)
+
+    def test_dashboard_cache_hit_skips_database(self):
+        self.add_sessions(3)
+        self.client.get(reverse("dashboard"))
+        # Only the auth session, user, navbar profile and data version
+        # lookups remain.
+        with self.assertMaxQueries(4):
+            self.client.get(reverse("dashboard"))
+
+    def test_cache_stats_are_labelled_per_worker(self):
+        self.client.get(reverse("dashboard"))
+        self.client.get(reverse("dashboard"))
+        self.api.force_authenticate(User.objects.create_user("admin", is_staff=True))
+        stats = self.api.get(reverse("cache-stats")).json()
+        self.assertEqual((stats["hits"], stats["misses"], stats["hit_rate"]), (1, 1, 0.5))
+        self.assertEqual((stats["scope"], stats["pid"]), ("worker", os.getpid()))
+
+
+class RollupTests(SkillTrackTestCase):
+
+    def rollup_totals(self):
+        return list(DailyStudyRollup.objects.order_by("date", "skill_id").values_list(
+            "skill_id", "date", "session_count", "total_duration"))
+
+    def test_rollups_follow_session_writes(self):
+        first, second = self.add_sessions(2, start=date(2024, 1, 1))
+        other = Skill.objects.create(user=self.user, name="French", description="")
+
+        second.skill = other
+        second.duration = timedelta(hours=1)
+        second.save()
+        first.delete()
+
+        self.assertEqual(self.rollup_totals(), [
+            (other.pk, date(2024, 1, 2), 1, timedelta(hours=1)),
+        ])
+
+    def test_stale_copies_use_the_stored_row(self):
+        session = self.add_sessions(1)[0]
+        # Two requests load the same session, then save one after the other.
+        first, second = StudySession.objects.get(pk=session.pk), StudySession.objects.get(pk=session.pk)
+        first.date = date(2024, 2, 1)
+        first.save()
+        second.date = date(2024, 3, 1)
+        second.save()
+        self.assertEqual(self.rollup_totals(), [
+            (self.skill.pk, date(2024, 3, 1), 1, timedelta(minutes=30))])
+
+        first.delete()
+        self.assertEqual(self.rollup_totals(), [])
+        incremental = self.rollup_totals()
+        rebuild_rollups()
+        self.assertEqual(self.rollup_totals(), incremental)
+
+    def test_rebuild_matches_incremental(self):
+        self.add_sessions(40)
+        incremental = self.rollup_totals()
+        rebuild_rollups()
+        self.assertEqual(self.rollup_totals(), incremental)
+
+    def test_dashboard_reflects_new_session(self):
+        self.add_sessions(2)
+        response = self.client.get(reverse("dashboard"))
+        self.assertEqual(response.context["total_sessions"], 2)
+
+        self.add_sessions(1)
+        response = self.client.get(reverse("dashboard"))
+        self.assertEqual(response.context["total_sessions"], 3)
+        self.assertEqual(response.context["average_session_duration"], 30)
+
+
+class PaginationTests(SkillTrackTestCase):
+
+    def collect(self, url, params):
+        ids = []
+        response = self.api.get(url, params).json()
+        while True:
+            ids += [row["id"] for row in response["results"]]
+            if not response["next"]:
+                return ids, response
+            response = self.api.get(response["next"]).json()
+
+    def test_sessions_are_walked_in_date_id_order(self):
+        sessions = self.add_sessions(25)
+        expected = [s.pk for s in sorted(sessions, key=lambda s: (s.date, s.pk))]
+        ids, _ = self.collect(reverse("session-list-create"), {"page_size": 7})
+        self.assertEqual(ids, expected)
+
+    def test_previous_link_returns_prior_page(self):
+        self.add_sessions(10)
+        first = self.api.get(reverse("session-list-create"), {"page_size": 4}).json()
+        second = self.api.get(first["next"]).json()
+        back = self.api.get(second["previous"]).json()
+        self.assertEqual(back["results"], first["results"])
+        self.assertIsNone(back["previous"])
+
+    def test_unpaginated_list_is_unchanged(self):
+        self.add_sessions(3)
+        response = self.api.get(reverse("session-list-create"))
+        self.assertEqual(len(response.json()), 3)
+
+    def test_invalid_cursor(self):
+        response = self.api.get(reverse("session-list-create"), {"cursor": "garbage"})
+        self.assertEqual(response.status_code, 404)
+
+
+class SessionImportTests(SkillTrackTestCase):
+
+    def post(self, body, content_type, **params):
+        url = reverse("session-import")
+        if params:
+            url += "?" + "&".join(f"{k}={v}" for k, v in params.items())
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.api.generic("POST", url, body, content_type=content_type)
+
+    def test_json_array(self):
+        body = json.dumps([
+            {"skill": self.skill.pk, "date": "2024-05-01", "duration": "00:30:00"},
+            {"skill_name": "Python", "date": "2024-05-01", "duration": "01:00:00", "notes": "x"},
+        ])
+        response = self.post(body, "application/json")
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json()["created"], 2)
+        rollup = DailyStudyRollup.objects.get(user=self.user)
+        self.assertEqual(rollup.session_count, 2)
+        self.assertEqual(rollup.total_duration, timedelta(minutes=90))
+
+    def test_csv(self):
+        body = "skill,date,duration,notes\n" + "".join(
+            f"{self.skill.pk},2024-05-{day:02d},00:45:00,note\n" for day in range(1, 11))
+        response = self.post(body, "text/csv")
+        self.assertEqual(response.json()["created"], 10)
+        self.assertEqual(StudySession.objects.filter(user=self.user).count(), 10)
+
+    def test_ndjson_reports_row_errors_and_rolls_back(self):
+        other_user = User.objects.create_user("bob")
+        foreign = Skill.objects.create(user=other_user, name="Go", description="")
+        body = "\n".join([
+            json.dumps({"skill": self.skill.pk, "date": "2024-05-01", "duration": "10:00"}),
+            json.dumps({"skill": foreign.pk, "date": "2024-05-01", "duration": "10:00"}),
+            "not json",
+            json.dumps({"skill": self.skill.pk, "date": "05/01/2024", "duration": "10:00"}),
+        ])
+        response = self.post(body, "application/x-ndjson")
+        self.assertEqual(response.status_code, 400)
+        data = response.json()
+        self.assertEqual(data["created"], 0)
+        self.assertEqual([e["row"] for e in data["errors"]], [2, 3, 4])
+        self.assertFalse(StudySession.objects.exists())
+
+    def test_partial_import_keeps_valid_rows(self):
+        body = json.dumps([
+            {"skill": self.skill.pk, "date": "2024-05-01", "duration": "10:00"},
+            {"skill": self.skill.pk, "date": "2024-05-02"},
+        ])
+        response = self.post(body, "application/json", partial="true")
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json()["created"], 1)
+        self.assertEqual(response.json()["errors"][0]["row"], 2)
+
+    def test_non_scalar_values_are_row_errors(self):
+        body = json.dumps([
+            {"skill_name": ["Python"], "date": "2024-05-01", "duration": "10:00"},
+            {"skill": {"pk": self.skill.pk}, "date": "2024-05-01", "duration": "10:00"},
+            {"skill": True, "date": "2024-05-01", "duration": "10:00"},
+            {"skill": self.skill.pk, "date": "2024-05-01", "duration": "10:00", "notes": [1]},
+        ])
+        response = self.post(body, "application/json")
+        self.assertEqual(response.status_code, 400)
+        errors = response.json()["errors"]
+        self.assertEqual([e["row"] for e in errors], [1, 2, 3, 4])
+        self.assertIn("skill_name", errors[0]["errors"])
+        self.assertIn("notes", errors[3]["errors"])
+
+    def test_unsupported_media_type(self):
+        response = self.post("<xml/>", "application/xml")
+        self.assertEqual(response.status_code, 415)
+
+
+class ExportTests(QueryBudgetMixin, SkillTrackTestCase):
+
+    def content(self, response):
+        return b"".join(response.streaming_content).decode()
+
+    def test_sessions_csv(self):
+        self.add_sessions(3)
+        response = self.api.get(reverse("session-export"), {"format": "csv"})
+        self.assertEqual(response["Content-Type"], "text/csv")
+        lines = self.content(response).splitlines()
+        self.assertEqual(lines[0], "id,date,duration,skill,skill_name,skill_category,notes,created_at")
+        self.assertEqual(len(lines), 4)
+        self.assertIn(",00:30:00,", lines[1])
+        self.assertIn(",Python,programming,", lines[1])
+
+    def test_sessions_ndjson_with_date_range(self):
+        self.add_sessions(10)
+        response = self.api.get(
+            reverse("session-export"),
+            {"format": "ndjson", "from": "2024-01-03", "to": "2024-01-05"})
+        rows = [json.loads(line) for line in self.content(response).splitlines()]
+        self.assertEqual([row["date"] for row in rows], ["2024-01-03", "2024-01-04", "2024-01-05"])
+
+    def test_accept_header_and_skills(self):
+        response = self.api.get(reverse("skill-export"), HTTP_ACCEPT="application/x-ndjson")
+        row = json.loads(self.content(response))
+        self.assertEqual(row["name"], "Python")
+
+    def test_single_query_regardless_of_rows(self):
+        self.assertQueriesDoNotScale(
+            lambda: self.content(self.api.get(reverse("session-export"))), self.add_sessions)
+
+    def test_invalid_date(self):
+        response = self.api.get(reverse("session-export"), {"from": "yesterday"})
+        self.assertEqual(response.status_code, 400)
+
+
+class ConditionalGetTests(SkillTrackTestCase):
+
+    def revalidate(self, url, response):
+        return self.api.get(url, HTTP_IF_NONE_MATCH=response["ETag"])
+
+    def test_session_list_not_modified(self):
+        self.add_sessions(2)
+        url = reverse("session-list-create")
+        first = self.api.get(url)
+        second = self.revalidate(url, first)
+        self.assertEqual(second.status_code, 304)
+        self.assertEqual(second["ETag"], first["ETag"])
+
+    def test_session_list_changes_on_write(self):
+        first_session = self.add_sessions(2)[0]
+        url = reverse("session-list-create")
+        first = self.api.get(url)
+
+        first_session.delete()
+        self.assertEqual(self.revalidate(url, first).status_code, 200)
+
+        second = self.api.get(url)
+        self.skill.name = "Rust"
+        self.skill.save()
+        self.assertEqual(self.revalidate(url, second).status_code, 200)
+
+    def test_etag_depends_on_query(self):
+        self.add_sessions(2)
+        url = reverse("session-list-create")
+        first = self.api.get(url)
+        paged = self.api.get(url, {"page_size": 1}, HTTP_IF_NONE_MATCH=first["ETag"])
+        self.assertEqual(paged.status_code, 200)
+
+    def test_detail_not_modified_skips_serialization(self):
+        session = self.add_sessions(1)[0]
+        url = reverse("session-detail", args=[session.pk])
+        first = self.api.get(url)
+        self.assertEqual(self.revalidate(url, first).status_code, 304)
+
+        session.notes = "changed"
+        session.save()
+        self.assertEqual(self.revalidate(url, first).status_code, 200)
+
+    def test_list_if_modified_since_after_delete(self):
+        session = self.add_sessions(2)[0]
+        url = reverse("session-list-create")
+        first = self.api.get(url)
+        # Lists only carry the ETag, which counts the rows.
+        self.assertNotIn("Last-Modified", first)
+        self.api.delete(reverse("session-detail", args=[session.pk]))
+        since = http_date(timezone.now().timestamp() + 60)
+        second = self.api.get(url, HTTP_IF_MODIFIED_SINCE=since)
+        self.assertEqual(second.status_code, 200)
+        self.assertEqual(len(second.json()), 1)
+
+    def test_detail_if_modified_since(self):
+        url = reverse("skill-detail", args=[self.skill.pk])
+        first = self.api.get(url)
+        second = self.api.get(url, HTTP_IF_MODIFIED_SINCE=first["Last-Modified"])
+        self.assertEqual(second.status_code, 304)
+
+
+class AsyncAPITests(SkillTrackTestCase):
+
+    def setUp(self):
+        super().setUp()
+        token = RefreshToken.for_user(self.user).access_token
+        self.auth = {"headers": {"Authorization": f"Bearer {token}"}}
+
+    async def test_session_crud(self):
+        url = reverse("async-session-list-create")
+        body = {"user": self.user.pk, "skill": self.skill.pk,
+                "date": "2024-06-01", "duration": "00:45:00"}
+        created = await self.async_client.post(
+            url, body, content_type="application/json", **self.auth)
+        self.assertEqual(created.status_code, 201)
+        session_id = created.json()["id"]
+        self.assertEqual(created.json()["skill_name"], "Python")
+
+        detail_url = reverse("async-session-detail", args=[session_id])
+        body["notes"] = "updated"
+        updated = await self.async_client.put(
+            detail_url, body, content_type="application/json", **self.auth)
+        self.assertEqual(updated.json()["notes"], "updated")
+
+        listed = await self.async_client.get(url, {"page_size": 10}, **self.auth)
+        self.assertEqual([row["id"] for row in listed.json()["results"]], [session_id])
+
+        deleted = await self.async_client.delete(detail_url, **self.auth)
+        self.assertEqual(deleted.status_code, 204)
+        self.assertFalse(await StudySession.objects.aexists())
+
+    async def test_skill_not_found_and_unauthenticated(self):
+        missing = await self.async_client.get(
+            reverse("async-skill-detail", args=[999]), **self.auth)
+        self.assertEqual(missing.status_code, 404)
+        anonymous = await self.async_client.get(reverse("async-skill-list-create"))
+        self.assertEqual(anonymous.status_code, 401)
+
+    async def test_register(self):
+        response = await self.async_client.post(
+            reverse("async-api-register"),
+            {"username": "bob", "email": "bob@example.com", "password": "pw-12345"},
+            content_type="application/json")
+        self.assertEqual(response.status_code, 201)
+        self.assertTrue(await User.objects.filter(username="bob").aexists())
+
+
+class ProfilePictureTests(SkillTrackTestCase):
+
+    def setUp(self):
+        super().setUp()
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        settings_override = override_settings(MEDIA_ROOT=media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def upload(self, size=(2000, 1500)):
+        buffer = BytesIO()
+        Image.new("RGB", size, "teal").save(buffer, "PNG")
+        picture = SimpleUploadedFile("photo.png", buffer.getvalue(), content_type="image/png")
+        self.client.post(reverse("edit-profile"), {"bio": "", "profile_picture": picture})
+        self.assertEqual(run_pending(), 1)
+        return UserProfile.objects.get(user=self.user)
+
+    def test_upload_generates_variants(self):
+        profile = self.upload()
+        self.assertEqual(set(profile.profile_picture_variants), set(images.PICTURE_VARIANTS))
+        with default_storage.open(profile.profile_picture_variants["avatar"]) as avatar:
+            self.assertEqual(Image.open(avatar).size, (96, 96))
+        with default_storage.open(profile.profile_picture_variants["full"]) as full:
+            self.assertEqual(Image.open(full).size, (1280, 960))
+
+        response = self.client.get(reverse("profile", args=[self.user.pk]))
+        self.assertContains(response, default_storage.url(profile.profile_picture_variants["card"]))
+
+    def test_replace_and_remove_clean_up_files(self):
+        first = self.upload()
+        old_files = [first.profile_picture.name, *first.profile_picture_variants.values()]
+        second = self.upload(size=(400, 400))
+        self.assertFalse(any(default_storage.exists(name) for name in old_files))
+        self.assertTrue(default_storage.exists(second.profile_picture_variants["card"]))
+
+        new_files = [second.profile_picture.name, *second.profile_picture_variants.values()]
+        self.client.post(reverse("edit-profile"), {"bio": "", "remove_picture": "1"})
+        profile = UserProfile.objects.get(user=self.user)
+        self.assertEqual(profile.profile_picture_variants, {})
+        self.assertFalse(any(default_storage.exists(name) for name in new_files))
+
+
+@task(max_attempts=2, retry_delay=timedelta(0))
+def flaky_task(fail_times):
+    failures = cache.get_or_set("flaky-task-failures", 0)
+    if failures < fail_times:
+        cache.incr("flaky-task-failures")
+        raise RuntimeError("flaky")
+
+
+class BackgroundTaskTests(SkillTrackTestCase):
+
+    def test_retries_then_succeeds(self):
+        queued = flaky_task.enqueue(1, owner=self.user)
+        with self.assertLogs("core.background", "ERROR"):
+            self.assertEqual(run_pending(), 2)
+        queued.refresh_from_db()
+        self.assertEqual((queued.status, queued.attempts, queued.last_error), (Task.SUCCEEDED, 2, ""))
+
+    def test_fails_after_max_attempts(self):
+        queued = flaky_task.enqueue(5)
+        with self.assertLogs("core.background", "ERROR") as logs:
+            self.assertEqual(run_pending(), 2)
+        self.assertEqual(len(logs.records), 2)
+        queued.refresh_from_db()
+        self.assertEqual(queued.status, Task.FAILED)
+        self.assertIn("RuntimeError: flaky", queued.last_error)
+
+    def test_delayed_task_waits(self):
+        flaky_task.enqueue(0, delay=timedelta(minutes=5))
+        self.assertEqual(run_pending(), 0)
+
+    def test_delete_skill_is_handed_off(self):
+        self.add_sessions(3)
+        self.client.post(reverse("delete-skill", args=[self.skill.pk]))
+        self.assertFalse(Skill.objects.exists())
+        self.assertFalse(StudySession.objects.exists())
+        self.assertEqual(StudySession.all_objects.count(), 3)
+        queued = Task.objects.get()
+
+        status_url = reverse("task-status", args=[queued.pk])
+        self.assertEqual(self.api.get(status_url).json()["status"], Task.QUEUED)
+        with self.captureOnCommitCallbacks(execute=True):
+            run_pending()
+        self.assertEqual(self.api.get(status_url).json()["status"], Task.SUCCEEDED)
+        self.assertFalse(Skill.all_objects.exists())
+        self.assertFalse(StudySession.all_objects.exists())
+        self.assertFalse(DailyStudyRollup.objects.exists())
+
+    def test_status_is_private(self):
+        other = User.objects.create_user("bob")
+        queued = flaky_task.enqueue(0, owner=other)
+        response = self.api.get(reverse("task-status", args=[queued.pk]))
+        self.assertEqual(response.status_code, 404)
+
+
+class CachedJWTAuthenticationTests(QueryBudgetMixin, SkillTrackTestCase):
+
+    def setUp(self):
+        super().setUp()
+        token = RefreshToken.for_user(self.user).access_token
+        self.api = APIClient()
+        self.api.credentials(HTTP_AUTHORIZATION=f"Bearer {token}")
+        self.url = reverse("skill-detail", args=[self.skill.pk])
+
+    def test_user_query_is_skipped_once_cached(self):
+        first = self.count_queries(lambda: self.api.get(self.url))
+        second = self.count_queries(lambda: self.api.get(self.url))
+        self.assertEqual(second, first - 1)
+
+    def test_deactivation_invalidates(self):
+        self.assertEqual(self.api.get(self.url).status_code, 200)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.is_active = False
+            self.user.save()
+        self.assertEqual(self.api.get(self.url).status_code, 401)
+
+    def test_password_change_reloads_user(self):
+        self.api.get(self.url)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.set_password("new-password")
+            self.user.save()
+        response = self.api.get(self.url)
+        self.assertEqual(response.wsgi_request.user.password, self.user.password)
+
+    def test_requests_do_not_share_loaded_relations(self):
+        UserProfile.objects.create(user=self.user, bio="Before")
+        user_cache.set(("1", "jti"), self.user, None)
+        first = user_cache.get(("1", "jti"), None)
+        self.assertEqual(first.profile.bio, "Before")
+        UserProfile.objects.filter(user=self.user).update(bio="After")
+        second = user_cache.get(("1", "jti"), None)
+        self.assertIsNot(second._state, first._state)
+        self.assertEqual(second.profile.bio, "After")
+        self.assertEqual((second.pk, second.password), (self.user.pk, self.user.password))
+        self.assertFalse(second._state.adding)
+
+    def test_entries_are_bounded_and_expire(self):
+        cache = UserCache(max_size=2, timeout=60)
+        for user_id in ("1", "2", "3"):
+            cache.set((user_id, "jti"), self.user, None)
+        self.assertIsNone(cache.get(("1", "jti"), None))
+        self.assertIsNotNone(cache.get(("3", "jti"), None))
+        self.assertIsNone(cache.get(("3", "jti"), "new-stamp"))
+        cache.timeout = -1
+        cache.set(("4", "jti"), self.user, None)
+        self.assertIsNone(cache.get(("4", "jti"), None))
+
+    def test_change_saved_by_another_worker_invalidates(self):
+        self.assertEqual(self.api.get(self.url).status_code, 200)
+        # Another worker deactivates the user: its own cache is dropped and
+        # the shared stamp moves, but nothing here is told directly.
+        User.objects.filter(pk=self.user.pk).update(is_active=False)
+        cache.set(STAMP_KEY.format(self.user.pk), "other-worker")
+        self.assertEqual(self.api.get(self.url).status_code, 401)
+
+
+@override_settings(REST_FRAMEWORK={
+    **settings.REST_FRAMEWORK,
+    "DEFAULT_THROTTLE_RATES": {"write": "2/min", "auth": "1/hour"},
+})
+class ThrottleTests(SkillTrackTestCase):
+
+    def create_skill(self):
+        return self.api.post(reverse("skill-list-create"), {
+            "name": "Go", "description": "Go", "category": "programming"})
+
+    def test_writes_are_throttled_per_user(self):
+        self.assertEqual(self.create_skill().status_code, 201)
+        self.assertEqual(self.create_skill().status_code, 201)
+        throttled = self.create_skill()
+        self.assertEqual(throttled.status_code, 429)
+        self.assertEqual(throttled["Retry-After"], "30")
+        # Reads are not limited, and other users have their own bucket.
+        self.assertEqual(self.api.get(reverse("skill-list-create")).status_code, 200)
+        self.api.force_authenticate(User.objects.create_user("bob"))
+        self.assertEqual(self.create_skill().status_code, 201)
+
+    def test_auth_endpoints_are_throttled_per_ip(self):
+        register = {"username": "bob", "email": "bob@example.com", "password": "pw-12345"}
+        self.assertEqual(self.client.post(reverse("api-register"), register).status_code, 201)
+        # Registering and logging in share the bucket of the client's IP.
+        throttled = self.client.post(reverse("token-obtain"), {
+            "username": "bob", "password": "pw-12345"})
+        self.assertEqual(throttled.status_code, 429)
+        self.assertEqual(throttled["Retry-After"], "3600")
+        other_ip = self.client.post(
+            reverse("api-register"), register, REMOTE_ADDR="10.0.0.2")
+        self.assertEqual(other_ip.status_code, 400)
+
+    async def test_async_views_share_the_buckets(self):
+        token = RefreshToken.for_user(self.user).access_token
+        auth = {"headers": {"Authorization": f"Bearer {token}"}}
+        body = {"name": "Go", "description": "Go", "category": "programming"}
+        for expected in (201, 201, 429):
+            response = await self.async_client.post(
+                reverse("async-skill-list-create"), body,
+                content_type="application/json", **auth)
+            self.assertEqual(response.status_code, expected)
+        self.assertIn("Retry-After", response)
+
+    def test_hits_are_counted_and_memory_is_bounded(self):
+        for _ in range(3):
+            self.create_skill()
+        self.api.force_authenticate(User.objects.create_user("admin", is_staff=True))
+        stats = self.api.get(reverse("throttle-stats")).json()
+        self.assertEqual(stats["write"], {"allowed": 2, "throttled": 1})
+
+        store = throttling.BucketStore(max_size=2)
+        for client in ("a", "b", "c"):
+            store.take(("write", client), 1, 1 / 60)
+        self.assertEqual(list(store.buckets), [("write", "b"), ("write", "c")])
+
+
+class SparseFieldsetTests(SkillTrackTestCase):
+
+    def get(self, url, **params):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.api.get(url, params)
+        self.assertEqual(response.status_code, 200)
+        return response.json(), queries[-1]["sql"]
+
+    def test_fields_limit_output_and_columns(self):
+        self.add_sessions(3)
+        rows, sql = self.get(reverse("session-list-create"), fields="id,date,skill_name")
+        self.assertEqual(set(rows[0]), {"id", "date", "skill_name"})
+        self.assertNotIn('"notes"', sql)
+        self.assertNotIn('"description"', sql)
+        self.assertIn('"core_skill"."name"', sql)
+
+        rows, sql = self.get(reverse("session-list-create"), fields="id,duration")
+        self.assertEqual(set(rows[0]), {"id", "duration"})
+        self.assertNotIn("JOIN", sql)
+
+    def test_expand_skill(self):
+        self.add_sessions(2)
+        rows, sql = self.get(
+            reverse("session-list-create"), fields="id,skill", expand="skill")
+        self.assertEqual(rows[0]["skill"]["name"], "Python")
+        self.assertIn("JOIN", sql)
+        self.assertNotIn('"notes"', sql)
+
+    def test_with_pagination_and_detail(self):
+        self.add_sessions(5)
+        page, _ = self.get(reverse("session-list-create"), fields="id", page_size=2)
+        self.assertEqual(page["results"], [{"id": page["results"][0]["id"]}, page["results"][1]])
+        rest, _ = self.get(page["next"])
+        self.assertEqual(len(rest["results"]), 2)
+        self.assertEqual(set(rest["results"][0]), {"id"})
+
+        detail, _ = self.get(reverse("skill-detail", args=[self.skill.pk]), fields="name")
+        self.assertEqual(detail, {"name": "Python"})
+
+    def test_unknown_field_or_expansion(self):
+        response = self.api.get(reverse("skill-list-create"), {"fields": "id,secret"})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("secret", response.json()["fields"][0])
+        response = self.api.get(reverse("skill-list-create"), {"expand": "user"})
+        self.assertEqual(response.status_code, 400)
+
+
+class MessagePackTests(SkillTrackTestCase):
+
+    def test_list_negotiated_by_accept(self):
+        self.add_sessions(2)
+        response = self.api.get(reverse("session-list-create"), HTTP_ACCEPT="application/msgpack")
+        self.assertEqual(response["Content-Type"], "application/msgpack")
+        rows = messagepack.unpackb(response.content)
+        self.assertEqual(rows[0]["date"], date(2024, 1, 1))
+        self.assertEqual(rows[0]["duration"], timedelta(minutes=30))
+        self.assertEqual(rows[0]["skill_name"], "Python")
+        self.assertIsNotNone(rows[0]["created_at"].tzinfo)
+
+        json_size = len(self.api.get(reverse("session-list-create")).content)
+        self.assertLess(len(response.content), json_size)
+
+    def test_create_from_msgpack_body(self):
+        body = messagepack.packb({
+            "user": self.user.pk, "skill": self.skill.pk,
+            "date": date(2024, 6, 1), "duration": timedelta(minutes=45)})
+        response = self.api.post(
+            reverse("session-list-create"), body, content_type="application/msgpack",
+            HTTP_ACCEPT="application/msgpack")
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(messagepack.unpackb(response.content)["duration"], timedelta(minutes=45))
+        self.assertEqual(StudySession.objects.get().duration, timedelta(minutes=45))
+
+    def test_values_round_trip(self):
+        values = [date(1969, 12, 31), date(2024, 2, 29), timedelta(0),
+                  timedelta(days=-1, microseconds=5), timedelta(days=3650)]
+        self.assertEqual(messagepack.unpackb(messagepack.packb(values)), values)
+
+    def test_invalid_body(self):
+        response = self.api.post(
+            reverse("skill-list-create"), b"\xc1", content_type="application/msgpack")
+        self.assertEqual(response.status_code, 400)
+        for code in (messagepack.DATE_EXT, messagepack.DURATION_EXT):
+            body = msgpack.packb(msgpack.ExtType(code, (2 ** 62).to_bytes(8, "big")))
+            with self.subTest(code=code):
+                response = self.api.post(
+                    reverse("skill-list-create"), body, content_type="application/msgpack")
+                self.assertEqual(response.status_code, 400)
+
+
+class BatchAPITests(QueryBudgetMixin, SkillTrackTestCase):
+
+    def post(self, name, body):
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.api.post(reverse(name), body, format="json")
+
+    def derived_state(self):
+        state = StudyActivity.objects.get(user=self.user)
+        return (
+            list(DailyStudyRollup.objects.order_by("date", "skill_id").values_list(
+                "skill_id", "date", "session_count", "total_duration")),
+            bytes(state.day_minutes), state.first_day, state.longest_streak,
+        )
+
+    def assertDerivedStateIsCurrent(self):
+        incremental = self.derived_state()
+        rebuild_rollups(self.user)
+        activity.rebuild_activity(self.user)
+        self.assertEqual(self.derived_state(), incremental)
+
+    def test_delete_sessions_by_id(self):
+        sessions = self.add_sessions(10)
+        other = User.objects.create_user("bob")
+        foreign = StudySession.objects.create(
+            user=other, skill=Skill.objects.create(user=other, name="Go", description=""),
+            date=date(2024, 1, 1), duration=timedelta(minutes=5))
+        ids = [session.pk for session in sessions[:6]]
+
+        with self.assertMaxQueries(13):
+            response = self.post("session-batch", {
+                "action": "delete", "ids": [*ids, foreign.pk, 999999]})
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual(data["count"], 6)
+        self.assertEqual(data["results"][:2], [
+            {"id": ids[0], "status": "deleted"}, {"id": ids[1], "status": "deleted"}])
+        self.assertEqual(data["results"][-2:], [
+            {"id": foreign.pk, "status": "not_found"}, {"id": 999999, "status": "not_found"}])
+        self.assertEqual(self.user.sessions.count(), 4)
+        self.assertTrue(StudySession.objects.filter(pk=foreign.pk).exists())
+        self.assertEqual(search.search(self.user, "notes")[0], 4)
+        self.assertDerivedStateIsCurrent()
+
+    def test_update_sessions_by_filter(self):
+        self.add_sessions(10)
+        other = Skill.objects.create(user=self.user, name="Go", description="", category="backend")
+        old_updated = self.user.sessions.get(date=date(2024, 1, 3)).updated_at
+        dashboard = self.client.get(reverse("home"))
+
+        response = self.post("session-batch", {
+            "action": "update",
+            "filter": {"skill": self.skill.pk, "from": "2024-01-03", "to": "2024-01-05"},
+            "changes": {"skill": other.pk, "date": "2024-02-01", "notes": "moved"},
+        })
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([r["status"] for r in response.json()["results"]], ["updated"] * 3)
+        moved = self.user.sessions.filter(skill=other)
+        self.assertEqual(set(moved.values_list("date", "notes")), {(date(2024, 2, 1), "moved")})
+        self.assertGreater(moved.first().updated_at, old_updated)
+        self.assertEqual(search.search(self.user, "moved")[0], 3)
+        self.assertNotEqual(self.client.get(reverse("home")).content, dashboard.content)
+        self.assertDerivedStateIsCurrent()
+
+    def test_skill_batch(self):
+        self.add_sessions(5)
+        go = Skill.objects.create(user=self.user, name="Go", description="", category="backend")
+        self.add_sessions(3, skill=go, start=date(2024, 1, 3))
+
+        response = self.post("skill-batch", {
+            "action": "update", "ids": [self.skill.pk, go.pk], "changes": {"category": "languages"}})
+        self.assertEqual(response.json()["count"], 2)
+        self.assertEqual(set(self.user.skills.values_list("category", flat=True)), {"languages"})
+
+        with self.assertMaxQueries(20):
+            response = self.post("skill-batch", {"action": "delete", "ids": [go.pk]})
+        self.assertEqual(response.json()["results"], [{"id": go.pk, "status": "deleted"}])
+        self.assertFalse(Skill.objects.filter(pk=go.pk).exists())
+        self.assertEqual(self.user.sessions.count(), 5)
+        self.assertDerivedStateIsCurrent()
+
+    def test_validation(self):
+        session = self.add_sessions(1)[0]
+        foreign_skill = Skill.objects.create(
+            user=User.objects.create_user("bob"), name="Go", description="")
+        for body in (
+            {"action": "delete"},
+            {"action": "delete", "ids": [session.pk], "filter": {"skill": self.skill.pk}},
+            {"action": "update", "ids": [session.pk]},
+            {"action": "delete", "ids": [session.pk], "changes": {"notes": "x"}},
+            {"action": "update", "ids": [session.pk], "changes": {"skill": foreign_skill.pk}},
+            {"action": "delete", "filter": {}},
+            {"action": "archive", "ids": [session.pk]},
+        ):
+            with self.subTest(body=body):
+                self.assertEqual(self.post("session-batch", body).status_code, 400)
+        self.assertEqual(self.user.sessions.get().skill, self.skill)
+
+
+class SkillDeletionTests(QueryBudgetMixin, SkillTrackTestCase):
+
+    def delete(self, skill):
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.api.delete(reverse("skill-detail", args=[skill.pk]))
+
+    def test_delete_hides_skill_and_sessions(self):
+        self.add_sessions(5)
+        go = Skill.objects.create(user=self.user, name="Go", description="", category="backend")
+        self.add_sessions(3, skill=go, start=date(2024, 1, 3))
+        self.client.get(reverse("home"))
+
+        self.assertEqual(self.delete(self.skill).status_code, 204)
+        self.assertEqual(self.api.get(
+            reverse("skill-detail", args=[self.skill.pk])).status_code, 404)
+        self.assertEqual([row["id"] for row in self.api.get(
+            reverse("skill-list-create")).json()], [go.pk])
+        self.assertEqual(len(self.api.get(reverse("session-list-create")).json()), 3)
+        self.assertEqual(search.search(self.user, "notes")[0], 3)
+        self.assertEqual(search.search(self.user, "python")[0], 0)
+        totals = self.api.get(reverse("stats"), {"granularity": "month"}).json()["totals"]
+        self.assertEqual(totals["sessions"], 3)
+        self.assertContains(self.client.get(reverse("home")), "You have <span class=\"text-info\">3</span>")
+        self.assertEqual(set(DailyStudyRollup.objects.values_list("skill_id", flat=True)), {go.pk})
+        self.assertEqual(StudySession.all_objects.count(), 8)
+
+        incremental = bytes(StudyActivity.objects.get(user=self.user).day_minutes)
+        activity.rebuild_activity(self.user)
+        self.assertEqual(bytes(StudyActivity.objects.get(user=self.user).day_minutes), incremental)
+
+    def test_delete_does_not_scale_with_sessions(self):
+        counts = []
+        for size in (1, 40):
+            skill = Skill.objects.create(user=self.user, name="Go", description="")
+            self.add_sessions(size, skill=skill)
+            counts.append(self.count_queries(lambda: self.delete(skill)))
+        self.assertEqual(counts[0], counts[1])
+
+    def test_deleted_at_is_not_writable(self):
+        self.add_sessions(2)
+        body = {"name": "Python", "description": "Basics", "deleted_at": "2024-01-01T00:00:00Z"}
+        response = self.api.put(reverse("skill-detail", args=[self.skill.pk]), body, format="json")
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn("deleted_at", response.json())
+        created = self.api.post(reverse("skill-list-create"), body, format="json")
+        self.assertEqual(created.status_code, 201)
+        self.assertEqual(Skill.all_objects.filter(deleted_at__isnull=False).count(), 0)
+        self.assertEqual(self.user.sessions.count(), 2)
+
+    def test_other_users_skills_are_left_alone(self):
+        self.add_sessions(2)
+        other = User.objects.create_user("bob")
+        with self.captureOnCommitCallbacks(execute=True):
+            batch.delete_skills(other, [self.skill.pk])
+        self.assertTrue(Skill.objects.filter(pk=self.skill.pk).exists())
+        self.assertEqual(DailyStudyRollup.objects.filter(user=self.user).count(), 2)
+        self.assertEqual(search.search(self.user, "notes")[0], 2)
+        self.assertFalse(Task.objects.exists())
+
+    def test_purge_runs_in_batches(self):
+        self.add_sessions(5)
+        self.delete(self.skill)
+        with mock.patch.object(tasks, "PURGE_BATCH_SIZE", 2), \
+                CaptureQueriesContext(connection) as queries:
+            with self.captureOnCommitCallbacks(execute=True):
+                run_pending()
+        deletes = [q["sql"] for q in queries if q["sql"].startswith('DELETE FROM "core_studysession"')]
+        self.assertEqual(len(deletes), 3)
+        self.assertEqual(Task.objects.get().status, Task.SUCCEEDED)
+        self.assertFalse(Skill.all_objects.exists())
+        self.assertFalse(StudySession.all_objects.exists())
+
+
+class StatsAPITests(QueryBudgetMixin, SkillTrackTestCase):
+
+    def setUp(self):
+        super().setUp()
+        # 30 minutes a day from Monday 2024-01-01 to 2024-01-30.
+        self.add_sessions(30)
+        self.go = Skill.objects.create(
+            user=self.user, name="Go", description="Go", category="backend")
+        self.add_sessions(2, skill=self.go, start=date(2024, 2, 5))
+
+    def stats(self, **params):
+        response = self.api.get(reverse("stats"), params)
+        self.assertEqual(response.status_code, 200, response.content)
+        return response.json()
+
+    def test_weekly_buckets(self):
+        data = self.stats(granularity="week", **{"from": "2024-01-01", "to": "2024-01-14"})
+        self.assertEqual(data["buckets"], [
+            {"start": "2024-01-01", "sessions": 7, "duration": "03:30:00"},
+            {"start": "2024-01-08", "sessions": 7, "duration": "03:30:00"},
+        ])
+        self.assertEqual(data["totals"], {"sessions": 14, "duration": "07:00:00"})
+
+    def test_monthly_buckets_and_filters(self):
+        data = self.stats(granularity="month")
+        self.assertEqual([(b["start"], b["sessions"]) for b in data["buckets"]],
+                         [("2024-01-01", 30), ("2024-02-01", 2)])
+        by_skill = self.stats(granularity="month", skill=self.go.pk)
+        self.assertEqual(by_skill["totals"]["sessions"], 2)
+        by_category = self.stats(category="programming", to="2024-01-02")
+        self.assertEqual([b["start"] for b in by_category["buckets"]], ["2024-01-01", "2024-01-02"])
+
+    def test_size_follows_buckets_not_sessions(self):
+        # The data version for the ETag, then the buckets.
+        with self.assertMaxQueries(2):
+            self.api.get(reverse("stats"), {"granularity": "month"})
+        self.add_sessions(60)
+        self.assertEqual(len(self.stats(granularity="month")["buckets"]), 2)
+
+    def test_etag_is_shared_by_worker_processes(self):
+        url = reverse("stats")
+        first = self.api.get(url)
+        # Each process has its own local-memory cache; the version is not in it.
+        cache.clear()
+        self.assertEqual(self.api.get(url, HTTP_IF_NONE_MATCH=first["ETag"]).status_code, 304)
+        self.add_sessions(1, start=date(2024, 3, 1))
+        self.assertEqual(self.api.get(url, HTTP_IF_NONE_MATCH=first["ETag"]).status_code, 200)
+
+    def test_invalid_parameters(self):
+        for params in ({"granularity": "year"}, {"from": "01/02/2024"},
+                       {"from": "2024-02-01", "to": "2024-01-01"}):
+            self.assertEqual(self.api.get(reverse("stats"), params).status_code, 400)
+
+    def test_not_modified_until_data_changes(self):
+        first = self.api.get(reverse("stats"))
+        again = self.api.get(reverse("stats"), HTTP_IF_NONE_MATCH=first["ETag"])
+        self.assertEqual(again.status_code, 304)
+        self.add_sessions(1)
+        changed = self.api.get(reverse("stats"), HTTP_IF_NONE_MATCH=first["ETag"])
+        self.assertEqual(changed.status_code, 200)
+
+
+class StudyActivityTests(SkillTrackTestCase):
+
+    def activity(self):
+        return StudyActivity.objects.get(user=self.user)
+
+    def test_streaks_follow_writes(self):
+        # 2024-01-01 .. 2024-01-10, then 2024-01-15 and 2024-01-16.
+        sessions = self.add_sessions(10)
+        self.add_sessions(2, start=date(2024, 1, 15))
+        state = self.activity()
+        self.assertEqual((state.longest_streak, state.active_days), (10, 12))
+        self.assertEqual(activity.current_streak(state, today=date(2024, 1, 17)), 2)
+        self.assertEqual(activity.current_streak(state, today=date(2024, 1, 18)), 0)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            sessions[4].delete()
+        self.assertEqual(self.activity().longest_streak, 5)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            sessions[0].date = date(2024, 1, 5)
+            sessions[0].save()
+        # Moving 01-01 into the gap joins 01-02 .. 01-10.
+        state = self.activity()
+        self.assertEqual(state.first_day, date(2024, 1, 2))
+        self.assertEqual(state.longest_streak, 9)
+
+    def test_deleting_the_user(self):
+        self.add_sessions(3)
+        user_id = self.user.pk
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.delete()
+        connection.check_constraints()
+        self.assertFalse(StudyActivity.objects.filter(user_id=user_id).exists())
+        self.assertFalse(StudySession.all_objects.exists())
+
+    def test_minutes_per_day_and_rebuild(self):
+        self.add_sessions(2, start=date(2024, 3, 1))
+        self.add_sessions(1, start=date(2024, 3, 1), skill=Skill.objects.create(
+            user=self.user, name="Go", description="Go", category="backend"))
+        state = self.activity()
+        self.assertEqual(activity.day_minutes(state, date(2024, 2, 29), date(2024, 3, 3)),
+                         [0, 60, 30, 0])
+
+        incremental = (bytes(state.day_minutes), state.first_day, state.longest_streak)
+        activity.rebuild_activity(self.user)
+        state = self.activity()
+        self.assertEqual((bytes(state.day_minutes), state.first_day, state.longest_streak),
+                         incremental)
+
+    def test_import_updates_activity(self):
+        rows = [{"skill": self.skill.pk, "date": f"2024-05-0{day}", "duration": "00:20:00"}
+                for day in (1, 2, 3)]
+        self.api.post(reverse("session-import"), rows, format="json")
+        self.assertEqual(self.activity().longest_streak, 3)
+
+    def test_api_heatmap(self):
+        self.add_sessions(3, start=date(2024, 12, 30))
+        response = self.api.get(reverse("activity"), {"year": 2024})
+        data = response.json()
+        self.assertEqual(len(data["minutes"]), 366)
+        self.assertEqual(data["minutes"][-3:], [0, 30, 30])
+        self.assertEqual((data["start"], data["longest_streak"]), ("2024-01-01", 3))
+        self.assertEqual(self.api.get(reverse("activity"), {"year": "x"}).status_code, 400)
+
+    def test_dashboard_shows_streaks(self):
+        self.add_sessions(1, start=timezone.localdate())
+        response = self.client.get(reverse("dashboard"))
+        self.assertEqual(response.context["current_streak"], 1)
+        self.assertEqual(len(response.context["heatmap_weeks"][0]), 7)
+        self.assertContains(response, "heatmap-day level-2")
+
+
+class SearchTests(QueryBudgetMixin, SkillTrackTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.django = Skill.objects.create(
+            user=self.user, name="Django", description="Query optimisation and indexes",
+            category="backend")
+        self.session = StudySession.objects.create(
+            user=self.user, skill=self.django, date=date(2024, 1, 1),
+            duration=timedelta(minutes=30), notes="Read about GIN indexes in Postgres")
+        other = User.objects.create_user("bob")
+        Skill.objects.create(user=other, name="Indexes", description="indexes", category="db")
+
+    def search(self, **params):
+        response = self.api.get(reverse("search-api"), params)
+        self.assertEqual(response.status_code, 200, response.content)
+        return response.json()
+
+    def test_ranked_results_of_own_rows(self):
+        data = self.search(q="indexes")
+        self.assertEqual(data["count"], 2)
+        self.assertEqual([(r["type"], r["object"]["id"]) for r in data["results"]],
+                         [("skill", self.django.pk), ("session", self.session.pk)])
+        self.assertGreater(data["results"][0]["rank"], data["results"][1]["rank"])
+        # Stemmed, every word must match, and query syntax is not interpreted.
+        self.assertEqual(self.search(q="index postgres")["count"], 1)
+        self.assertEqual(self.search(q='"gin OR -nothing*')["count"], 0)
+        self.assertEqual(self.search(q="indexes", type="skill")["count"], 1)
+
+    def test_index_follows_writes(self):
+        self.session.notes = "Window functions"
+        self.session.save()
+        self.assertEqual(self.search(q="window")["count"], 1)
+        self.assertEqual(self.search(q="gin")["count"], 0)
+        StudySession.objects.filter(pk=self.session.pk).update(notes="Partial indexes")
+        self.assertEqual(self.search(q="partial")["count"], 1)
+        self.django.delete()
+        self.assertEqual(self.search(q="indexes")["count"], 0)
+
+    def test_pagination(self):
+        StudySession.objects.bulk_create([
+            StudySession(user=self.user, skill=self.skill, date=date(2024, 2, 1),
+                         duration=timedelta(minutes=10), notes=f"indexes part {i}")
+            for i in range(5)
+        ])
+        first = self.search(q="indexes", page_size=3)
+        self.assertEqual((first["count"], len(first["results"])), (7, 3))
+        self.assertIsNone(first["previous"])
+        last = self.api.get(self.api.get(first["next"]).json()["next"]).json()
+        self.assertEqual((len(last["results"]), last["next"]), (1, None))
+        beyond = self.search(q="indexes", page_size=3, page=9)
+        self.assertEqual((beyond["count"], beyond["results"]), (7, []))
+        with self.assertMaxQueries(3):
+            self.search(q="indexes")
+        self.assertEqual(self.api.get(reverse("search-api")).status_code, 400)
+
+    def test_search_page(self):
+        response = self.client.get(reverse("search"), {"q": "gin", "type": ""})
+        self.assertEqual(response.context["count"], 1)
+        self.assertContains(response, "Read about GIN indexes")
+
+
+class ListFragmentCacheTests(QueryBudgetMixin, SkillTrackTestCase):
+
+    def card_key(self, session):
+        session.refresh_from_db()
+        return make_template_fragment_key(
+            "session-card", [session.pk, session.updated_at, session.skill.updated_at])
+
+    def test_cached_list_skips_session_query(self):
+        self.add_sessions(3)
+        first = self.client.get(reverse("home"))
+        self.assertContains(first, "You have <span class=\"text-info\">3</span>")
+        with CaptureQueriesContext(connection) as queries:
+            again = self.client.get(reverse("home"))
+        self.assertFalse([q for q in queries if "core_studysession" in q["sql"]])
+        # The CSRF token is masked differently per response; the list is not.
+        list_html = lambda response: response.content.split(b'<div class="row g-4">')[1]
+        self.assertEqual(list_html(again), list_html(first))
+
+    def test_edit_rerenders_only_the_changed_card(self):
+        edited, untouched = self.add_sessions(2)
+        self.client.get(reverse("home"))
+        caches["fragments"].set(self.card_key(untouched), "<p>cached card</p>")
+
+        with self.captureOnCommitCallbacks(execute=True):
+            edited.notes = "Rewritten notes"
+            edited.save()
+        response = self.client.get(reverse("home"))
+        self.assertContains(response, "Rewritten notes")
+        self.assertContains(response, "<p>cached card</p>")
+
+    def test_skill_rename_reaches_session_cards(self):
+        self.add_sessions(1)
+        self.client.get(reverse("home"))
+        with self.captureOnCommitCallbacks(execute=True):
+            self.skill.name = "Rust"
+            self.skill.save()
+        self.assertContains(self.client.get(reverse("home")), "<strong>Skill:</strong> Rust")
+        self.assertContains(self.client.get(reverse("skills")), "Rust")
+
+    def test_delete_buttons_share_one_csrf_form(self):
+        session = self.add_sessions(1)[0]
+        response = self.client.get(reverse("home"))
+        self.assertNotIn(b"csrfmiddlewaretoken", response.content.split(b'<div class="row g-4">')[1])
+        self.assertContains(response, f'formaction="{reverse("delete-session", args=[session.pk])}"')
+        self.assertContains(self.client.get(reverse("skills")), 'form="delete-skill-form"')
+
+
+class StaticPipelineTests(SkillTrackTestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.root = tempfile.mkdtemp()
+        cls.addClassCleanup(shutil.rmtree, cls.root)
+        cls.enterClassContext(override_settings(STATIC_ROOT=cls.root))
+        # The admin and DRF files only make Brotli take longer.
+        call_command("collectstatic", interactive=False, verbosity=0,
+                     ignore_patterns=["admin", "rest_framework"])
+
+    def setUp(self):
+        super().setUp()
+        self.url = staticfiles_storage.url("core/css/styles.css")
+        with open(f"{self.root}/core/css/styles.css", "rb") as source:
+            self.css = source.read()
+
+    def test_hashed_names_and_compressed_siblings(self):
+        self.assertRegex(self.url, r"^/static/core/css/styles\.[0-9a-f]{12}\.css$")
+        hashed = self.root + self.url.removeprefix("/static")
+        with open(hashed + ".gz", "rb") as compressed:
+            self.assertEqual(gzip.decompress(compressed.read()), self.css)
+        self.assertTrue(shutil.os.path.exists(hashed + ".br"))
+        # Images are already compressed.
+        png = staticfiles_storage.path(staticfiles_storage.stored_name("favicons/favicon-32x32.png"))
+        self.assertFalse(shutil.os.path.exists(png + ".gz"))
+        self.assertContains(self.client.get(reverse("home")), f'href="{self.url}"')
+
+    def test_negotiated_encoding_and_immutable_caching(self):
+        for accept, encoding in (("gzip, deflate, br", "br"), ("gzip", "gzip"),
+                                 ("br;q=0, gzip;q=0.5", "gzip"), ("", None)):
+            response = self.client.get(self.url, HTTP_ACCEPT_ENCODING=accept)
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.get("Content-Encoding"), encoding)
+            self.assertEqual(response["Content-Type"], "text/css")
+            self.assertEqual(response["Cache-Control"], "public, max-age=31536000, immutable")
+            self.assertEqual(response["Vary"], "Accept-Encoding")
+        body = b"".join(self.client.get(self.url, HTTP_ACCEPT_ENCODING="gzip").streaming_content)
+        self.assertEqual(gzip.decompress(body), self.css)
+        # No session or user lookups for static files.
+        with self.assertNumQueries(0):
+            self.client.get(self.url)
+
+    def test_revalidation_of_unhashed_names(self):
+        response = self.client.get("/static/core/css/styles.css")
+        self.assertEqual(response["Cache-Control"], "public, max-age=0, must-revalidate")
+        again = self.client.get("/static/core/css/styles.css", HTTP_IF_NONE_MATCH=response["ETag"])
+        self.assertEqual(again.status_code, 304)
+        self.assertEqual(self.client.get("/static/../manage.py").status_code, 404)
+        self.assertEqual(self.client.get("/static/missing.css").status_code, 404)
+
+    async def test_async_mode(self):
+        response = await self.async_client.get(self.url, headers={"Accept-Encoding": "gzip"})
+        self.assertEqual(response["Content-Encoding"], "gzip")
+        body = b"".join(response.streaming_content)
+        self.assertEqual(gzip.decompress(body), self.css)
+
+    def test_asgi_handler_stays_async(self):
+        # Any sync-only middleware makes Django adapt the chain, and every
+        # ASGI request would then run through a thread.
+        with override_settings(DEBUG=True), \
+                mock.patch("django.core.handlers.base.logger") as logger:
+            ASGIHandler()
+        messages = [call.args for call in logger.debug.call_args_list]
+        # Disabled middleware (MiddlewareNotUsed) is dropped after it was adapted.
+        unused = {f"middleware {args[1]}" for args in messages if "MiddlewareNotUsed" in args[0]}
+        adapted = [args for args in messages if "adapted" in args[0] and args[1] not in unused]
+        self.assertEqual(adapted, [])
+
+
+class RequestTimingTests(SkillTrackTestCase):
+
+    def setUp(self):
+        super().setUp()
+        instrumentation.registry.clear()
+
+    def server_timing(self, response):
+        return {
+            name: dict(param.split("=", 1) for param in params)
+            for name, *params in (
+                [part.strip() for part in metric.split(";")]
+                for metric in response["Server-Timing"].split(","))
+        }
+
+    def test_server_timing_header(self):
+        self.add_sessions(3)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse("dashboard"))
+        timing = self.server_timing(response)
+        self.assertEqual(timing["db"]["desc"], f'"{len(queries)} queries"')
+        self.assertGreater(float(timing["template"]["dur"]), 0)
+        self.assertEqual(float(timing["serializer"]["dur"]), 0)
+        self.assertGreaterEqual(float(timing["total"]["dur"]), float(timing["template"]["dur"]))
+
+        timing = self.server_timing(self.api.get(reverse("session-list-create")))
+        self.assertGreater(float(timing["serializer"]["dur"]), 0)
+        self.assertEqual(float(timing["template"]["dur"]), 0)
+
+    def test_metrics_histograms(self):
+        self.add_sessions(2)
+        for _ in range(3):
+            self.api.get(reverse("session-detail", kwargs={"pk": StudySession.objects.first().pk}))
+        self.assertEqual(self.api.get(reverse("metrics")).status_code, 403)
+
+        self.api.force_authenticate(User.objects.create_user("admin", is_staff=True))
+        response = self.api.get(reverse("metrics"))
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response["Content-Type"].startswith("text/plain; version=0.0.4"))
+        lines = response.content.decode().splitlines()
+        labels = 'route="api/sessions/<int:pk>",method="GET"'
+        self.assertIn("# TYPE skilltrack_request_duration_seconds histogram", lines)
+        self.assertIn(f'skilltrack_request_duration_seconds_bucket{{{labels},le="+Inf"}} 3', lines)
+        self.assertIn(f"skilltrack_db_duration_seconds_count{{{labels}}} 3", lines)
+        queries = [line for line in lines if line.startswith(f"skilltrack_db_queries_total{{{labels}}}")]
+        self.assertEqual(len(queries), 1)
+
+    async def test_async_mode(self):
+        async def get_response(request):
+            return HttpResponse()
+        middleware = instrumentation.RequestTimingMiddleware(get_response)
+        self.assertTrue(iscoroutinefunction(middleware))
+
+        token = RefreshToken.for_user(self.user).access_token
+        response = await self.async_client.get(
+            reverse("async-session-list-create"), headers={"Authorization": f"Bearer {token}"})
+        timing = self.server_timing(response)
+        # The async ORM runs its queries in a thread with a copy of the context.
+        self.assertNotEqual(timing["db"]["desc"], '"0 queries"')
+
+    @override_settings(METRICS_TOKEN="scrape-me")
+    def test_metrics_token(self):
+        api = APIClient()
+        self.assertEqual(api.get(reverse("metrics")).status_code, 401)
+        api.credentials(HTTP_AUTHORIZATION="Bearer scrape-me")
+        self.assertEqual(api.get(reverse("metrics")).status_code, 200)
+        api.credentials(HTTP_AUTHORIZATION="Bearer wrong")
+        self.assertEqual(api.get(reverse("metrics")).status_code, 401)
+
+
+class RequestProfilerTests(SkillTrackTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.profile_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.profile_root)
+        self.enterContext(override_settings(
+            REQUEST_PROFILING=True, PROFILE_ROOT=self.profile_root))
+        self.staff = User.objects.create_user("admin", is_staff=True, is_superuser=True)
+
+    def test_staff_request_is_profiled(self):
+        self.add_sessions(3)
+        self.client.force_login(self.staff)
+        response = self.client.get(reverse("dashboard"), headers={"X-Profile": "1"})
+        profile = RequestProfile.objects.get()
+        self.assertEqual(response["X-Profile-Id"], str(profile.pk))
+        self.assertEqual((profile.user, profile.method, profile.path, profile.status_code),
+                         (self.staff, "GET", "/dashboard/", 200))
+        self.assertTrue(profiling.profile_path(profile.file_name).is_file())
+
+        page = self.client.get(response["X-Profile-Url"])
+        self.assertContains(page, "Call tree")
+        self.assertContains(page, "core/views.py")
+        self.assertIn("core/views.py", "".join(
+            row["function"] for row in profiling.hot_functions(profiling.load_stats(profile), 1000)))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            profile.delete()
+        self.assertFalse(profiling.profile_path(profile.file_name).exists())
+
+    def test_only_flagged_staff_requests_are_profiled(self):
+        self.client.get(reverse("dashboard"), headers={"X-Profile": "1"})
+        self.client.force_login(self.staff)
+        self.client.get(reverse("dashboard"))
+        self.client.get(reverse("dashboard"), {"profile": "0"})
+        self.assertFalse(RequestProfile.objects.exists())
+        with override_settings(REQUEST_PROFILING=False):
+            self.client_class().get(reverse("dashboard"), headers={"X-Profile": "1"})
+        self.assertFalse(RequestProfile.objects.exists())
+
+    def test_api_request_with_staff_token(self):
+        token = RefreshToken.for_user(self.staff).access_token
+        response = self.client_class().get(
+            reverse("session-list-create"), {"profile": "1"},
+            headers={"Authorization": f"Bearer {token}"})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(RequestProfile.objects.get().path, "/api/sessions?profile=1")
+
+
+class LoadGenerationTests(SkillTrackTestCase):
+
+    def test_dataset_and_endpoint_report(self):
+        call_command("generate_dataset", users=2, sessions=40, years=2, stdout=StringIO())
+        user = User.objects.get(username="loadgen-0")
+        categories = {choice for choice, _ in SkillForm.CATEGORY_CHOICES}
+        self.assertEqual(set(user.skills.values_list("category", flat=True)), categories)
+        self.assertEqual(user.sessions.count(), 40)
+        self.assertEqual(DailyStudyRollup.objects.filter(user=user).aggregate(
+            total=Sum("session_count"))["total"], 40)
+
+        output = tempfile.NamedTemporaryFile(suffix=".json")
+        self.addCleanup(output.close)
+        call_command("benchmark_endpoints", repeat=2, warmup=0, output=output.name,
+                     only="home,stats,session-list-create,logout,dashboard", stderr=StringIO())
+        with open(output.name) as file:
+            report = json.load(file)
+        self.assertEqual(report["meta"]["sessions"], 40)
+        self.assertEqual(len(report["results"]), 7)
+        for result in report["results"]:
+            self.assertLess(result["status"], 400, result)
+            self.assertLessEqual(result["p50_ms"], result["p99_ms"])
+        # Writes were rolled back, and the logout did not end the run's session.
+        self.assertEqual(user.sessions.count(), 40)
+        self.assertEqual(report["results"][-1]["status"], 200)
+
+    def test_regenerate_with_clear(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            call_command("generate_dataset", users=2, sessions=20, stdout=StringIO())
+            with self.assertRaises(CommandError):
+                call_command("generate_dataset", users=1, sessions=10, stdout=StringIO())
+            call_command("generate_dataset", users=1, sessions=10, clear=True, stdout=StringIO())
+        connection.check_constraints()
+        self.assertEqual(list(User.objects.filter(username__startswith="loadgen-").values_list(
+            "username", flat=True)), ["loadgen-0"])
+        user = User.objects.get(username="loadgen-0")
+        self.assertEqual(user.sessions.count(), 10)
+        self.assertEqual(StudyActivity.objects.get(user=user).active_days,
+                         len(set(user.sessions.values_list("date", flat=True))))
+
+    def test_every_route_has_a_probe(self):
+        from .management.commands import benchmark_endpoints
+        session = self.add_sessions(1)[0]
+        task = Task.objects.create(name="benchmark", user=self.user)
+        probes = benchmark_endpoints.probes(self.skill, session, task, self.user, "refresh")
+        benchmark_endpoints.Command().check_coverage(probes, only=None)
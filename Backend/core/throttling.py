@@ -0,0 +1,112 @@
+import threading
+import time
+from collections import Counter, OrderedDict
+from django.conf import settings
+from rest_framework.settings import api_settings
+from rest_framework.throttling import BaseThrottle
+
+# Token-bucket throttles with state kept in process memory. Rates come from
+# REST_FRAMEWORK["DEFAULT_THROTTLE_RATES"] ("<requests>/<period>"); a bucket
+# holds that many requests and refills evenly over the period.
+
+PERIODS = {"s": 1, "m": 60, "h": 60 * 60, "d": 60 * 60 * 24}
+
+
+def parse_rate(rate):
+    """``"120/min"`` -> ``(120, 60)``."""
+    requests, period = rate.split("/")
+    return int(requests), PERIODS[period[0]]
+
+
+class BucketStore:
+    """
+    Buckets as ``key -> (tokens, last update)`` in insertion order, so the
+    least recently used one is evicted once ``max_size`` keys are held. An
+    evicted client simply starts again with a full bucket.
+    """
+
+    def __init__(self, max_size):
+        self.max_size = max_size
+        self.buckets = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = Counter()
+
+    def take(self, key, capacity, refill_per_second):
+        """Takes a token; returns 0 or the seconds until one is available."""
+        now = time.monotonic()
+        with self.lock:
+            tokens, updated = self.buckets.pop(key, (capacity, now))
+            tokens = min(capacity, tokens + (now - updated) * refill_per_second)
+            if tokens >= 1:
+                tokens, wait = tokens - 1, 0.0
+            else:
+                wait = (1 - tokens) / refill_per_second
+            self.buckets[key] = (tokens, now)
+            if len(self.buckets) > self.max_size:
+                self.buckets.popitem(last=False)
+            self.hits[key[0], "throttled" if wait else "allowed"] += 1
+        return wait
+
+    def stats(self):
+        with self.lock:
+            hits = dict(self.hits)
+        scopes = sorted({scope for scope, _ in hits})
+        return {
+            scope: {
+                "allowed": hits.get((scope, "allowed"), 0),
+                "throttled": hits.get((scope, "throttled"), 0),
+            }
+            for scope in scopes
+        }
+
+    def clear(self):
+        with self.lock:
+            self.buckets.clear()
+            self.hits.clear()
+
+
+buckets = BucketStore(settings.THROTTLE_MAX_KEYS)
+
+
+class TokenBucketThrottle(BaseThrottle):
+    """
+    Throttles per user, or per client IP for anonymous requests. A view
+    can pick another rate with ``throttle_scope``.
+    """
+    scope = None
+    # None throttles every method.
+    methods = None
+
+    def allow_request(self, request, view):
+        self.wait_time = 0.0
+        if self.methods is not None and request.method not in self.methods:
+            return True
+        scope = getattr(view, "throttle_scope", None) or self.scope
+        rate = api_settings.DEFAULT_THROTTLE_RATES.get(scope)
+        if rate is None:
+            return True
+        capacity, period = parse_rate(rate)
+        self.wait_time = buckets.take(
+            (scope, self.get_client_key(request)), capacity, capacity / period)
+        return not self.wait_time
+
+    def get_client_key(self, request):
+        if request.user and request.user.is_authenticated:
+            return f"user:{request.user.pk}"
+        return f"ip:{self.get_ident(request)}"
+
+    def wait(self):
+        return self.wait_time
+
+
+class WriteThrottle(TokenBucketThrottle):
+    scope = "write"
+    methods = {"POST", "PUT", "PATCH", "DELETE"}
+
+
+class AuthThrottle(TokenBucketThrottle):
+    """For endpoints that hash passwords; always keyed by client IP."""
+    scope = "auth"
+
+    def get_client_key(self, request):
+        return f"ip:{self.get_ident(request)}"
@@ -1,5 +1,6 @@
 from django.urls import path
-from . import views
+from . import views, async_views
+from .throttling import AuthThrottle
 from rest_framework_simplejwt.views import TokenObtainPairView, TokenRefreshView
 from django.contrib.auth.views import LogoutView
 from django.conf import settings
@@ -9,16 +10,46 @@ urlpatterns = [
     #   APIS
     path("api/skills", views.SkillListCreateAPIView.as_view(),
          name="skill-list-create"),
+    path("api/skills/export",
+         views.SkillExportAPIView.as_view(), name="skill-export"),
+    path("api/skills/batch", views.SkillBatchAPIView.as_view(), name="skill-batch"),
     path("api/skills/<int:pk>",
          views.SkillDetailAPIView.as_view(), name="skill-detail"),
     path("api/sessions",
          views.SessionListCreateAPIView.as_view(), name="session-list-create"),
+    path("api/sessions/export",
+         views.SessionExportAPIView.as_view(), name="session-export"),
+    path("api/sessions/import",
+         views.SessionImportAPIView.as_view(), name="session-import"),
+    path("api/sessions/batch", views.SessionBatchAPIView.as_view(), name="session-batch"),
     path("api/sessions/<int:pk>",
          views.SessionDetailAPIView.as_view(), name="session-detail"),
+    path("api/stats", views.StatsAPIView.as_view(), name="stats"),
+    path("api/activity", views.ActivityAPIView.as_view(), name="activity"),
+    path("api/search", views.SearchAPIView.as_view(), name="search-api"),
+    path("api/tasks/<int:pk>", views.TaskStatusAPIView.as_view(), name="task-status"),
+    path("api/cache-stats", views.DashboardCacheStatsAPIView.as_view(),
+         name="cache-stats"),
+    path("api/throttle-stats", views.ThrottleStatsAPIView.as_view(),
+         name="throttle-stats"),
+    path("api/metrics", views.MetricsAPIView.as_view(), name="metrics"),
     path("api/register/", views.RegisterAPIView.as_view(), name="api-register"),
-    path("api/token/", TokenObtainPairView.as_view(), name="token-obtain"),
+    path("api/token/", TokenObtainPairView.as_view(throttle_classes=[AuthThrottle]),
+         name="token-obtain"),
     path("api/token/refresh", TokenRefreshView.as_view(), name="token-refresh"),
 
+    #   ASYNC APIS (same endpoints, for serving under ASGI)
+    path("api/async/skills", async_views.AsyncSkillListCreateView.as_view(),
+         name="async-skill-list-create"),
+    path("api/async/skills/<int:pk>",
+         async_views.AsyncSkillDetailView.as_view(), name="async-skill-detail"),
+    path("api/async/sessions",
+         async_views.AsyncSessionListCreateView.as_view(), name="async-session-list-create"),
+    path("api/async/sessions/<int:pk>",
+         async_views.AsyncSessionDetailView.as_view(), name="async-session-detail"),
+    path("api/async/register/", async_views.AsyncRegisterView.as_view(),
+         name="async-api-register"),
+
     #   WEB LINKS
     path("", views.HomeView.as_view(), name="home"),
     path("accounts/register/", views.RegisterView.as_view(), name="register"),
@@ -32,6 +63,7 @@ urlpatterns = [
     path("sessions/<int:pk>/edit/",
          views.EditStudySessionView.as_view(), name="edit-session"),
     path("skills/", views.AllSkillsView.as_view(), name="skills"),
+    path("search/", views.SearchView.as_view(), name="search"),
     path("skills/<int:pk>/edit/", views.EditSkillView.as_view(), name="edit-skill"),
     path("sessions/<int:pk>/delete/",
          views.DeleteStudySessionView.as_view(), name="delete-session"),
@@ -1,18 +1,35 @@
 from django.shortcuts import render, redirect
 from rest_framework import views, status
 from rest_framework.response import Response
-from .models import Skill, StudySession, UserProfile
-from .serializers import SkillSerializer, StudySessionSerializer, RegisterSerializer
+from rest_framework.exceptions import ValidationError
+from rest_framework.utils.urls import replace_query_param
+from .models import Skill, StudySession, UserProfile, DailyStudyRollup, Task
+from .pagination import SessionPagination, SkillPagination
+from .importers import SessionImporter, iter_rows
+from .exporters import CSVRenderer, NDJSONRenderer, SessionExport, SkillExport
+from . import (
+    activity, batch, caching, conditional, images, instrumentation, search, tasks, throttling)
+from .authentication import CachedJWTAuthentication, HasMetricsToken, MetricsTokenAuthentication
+from .throttling import AuthThrottle
+from .serializers import (
+    SkillSerializer, StudySessionSerializer, RegisterSerializer, TaskSerializer,
+    StatsQuerySerializer, StatsTotalsSerializer, StatsBucketSerializer, SearchQuerySerializer,
+    SessionBatchSerializer, SkillBatchSerializer)
+from .stats import study_stats
 from django.shortcuts import get_object_or_404
-from rest_framework.permissions import IsAuthenticated
+from rest_framework.permissions import IsAuthenticated, IsAdminUser
 from django.views import View
 from django.contrib.auth.views import LoginView
 from django.urls import reverse_lazy
 from django.views.generic import CreateView
 from .forms import StudySessionForm, SkillForm, CustomAuthenticationForm, CustomUserCreationForm, UserProfileForm
-from django.db.models import Avg, Sum, Count
+from django.db.models import Sum
 from django.contrib.auth.mixins import LoginRequiredMixin
 from django.utils.dateformat import DateFormat
+from io import BytesIO
+from django.http import HttpResponse, StreamingHttpResponse
+from django.utils.dateparse import parse_date
+from django.utils import timezone
 # Create your views here.
 
 
@@ -22,11 +39,26 @@ class SkillListCreateAPIView(views.APIView):
 
     def get(self, request):
         queryset = Skill.objects.filter(user=request.user)
-        serializer = SkillSerializer(queryset, many=True)
+        etag, last_modified = conditional.validators(
+            request, *conditional.collection_state(queryset))
+        return conditional.conditional_get(
+            request, etag, last_modified, lambda: self.list_response(request, queryset))
+
+    def list_response(self, request, queryset):
+        paginator = SkillPagination()
+        options = SkillSerializer.request_options(request)
+        if options:
+            queryset = SkillSerializer(**options).select_columns(queryset, *paginator.ordering)
+        if paginator.is_requested(request):
+            page = paginator.paginate_queryset(queryset, request, view=self)
+            serializer = SkillSerializer(page, many=True, **options)
+            return paginator.get_paginated_response(serializer.data)
+        serializer = SkillSerializer(queryset, many=True, **options)
         return Response(serializer.data)
 
     def post(self, request):
-        serializer = SkillSerializer(data=request.data)
+        options = SkillSerializer.request_options(request, sparse=False)
+        serializer = SkillSerializer(data=request.data, **options)
         if serializer.is_valid():
             serializer.save(user=request.user)
             return Response(serializer.data, status=status.HTTP_201_CREATED)
@@ -41,12 +73,14 @@ class SkillDetailAPIView(views.APIView):
 
     def get(self, request, pk):
         skill = self.get_skill(pk)
-        serializer = SkillSerializer(skill)
-        return Response(serializer.data)
+        etag, last_modified = conditional.validators(request, skill.updated_at)
+        return conditional.conditional_get(request, etag, last_modified, lambda: Response(
+            SkillSerializer(skill, **SkillSerializer.request_options(request)).data))
 
     def put(self, request, pk):
         skill = self.get_skill(pk)
-        serializer = SkillSerializer(skill, data=request.data)
+        options = SkillSerializer.request_options(request, sparse=False)
+        serializer = SkillSerializer(skill, data=request.data, **options)
         if serializer.is_valid():
             serializer.save()
             return Response(serializer.data)
@@ -54,40 +88,106 @@ class SkillDetailAPIView(views.APIView):
 
     def delete(self, request, pk):
         skill = self.get_skill(pk)
-        skill.delete()
+        batch.delete_skills(request.user, [skill.pk])
         return Response(status=status.HTTP_204_NO_CONTENT)
 
 
+class BatchAPIView(views.APIView):
+    """Deletes or updates many of the user's rows in one transaction."""
+    permission_classes = [IsAuthenticated]
+    serializer_class = None
+    run = None
+
+    def post(self, request):
+        serializer = self.serializer_class(data=request.data, context={"user": request.user})
+        serializer.is_valid(raise_exception=True)
+        data = serializer.validated_data
+        results = self.run(request.user, data)
+        return Response({
+            "action": data["action"],
+            "count": sum(result["status"] != "not_found" for result in results),
+            "results": results,
+        })
+
+
+class SkillBatchAPIView(BatchAPIView):
+    serializer_class = SkillBatchSerializer
+    run = staticmethod(batch.batch_skills)
+
+
 class SessionListCreateAPIView(views.APIView):
     permission_classes = [IsAuthenticated]
 
     def get(self, request):
-        queryset = StudySession.objects.filter(user=request.user)
-        serializer = StudySessionSerializer(queryset, many=True)
+        queryset = StudySession.objects.filter(
+            user=request.user).select_related("skill")
+        # Rows embed skill_name, so renaming a skill must change the tag too.
+        etag, last_modified = conditional.validators(
+            request, *conditional.collection_state(
+                queryset, Skill.objects.filter(user=request.user)))
+        return conditional.conditional_get(
+            request, etag, last_modified, lambda: self.list_response(request, queryset))
+
+    def list_response(self, request, queryset):
+        paginator = SessionPagination()
+        options = StudySessionSerializer.request_options(request)
+        if options:
+            queryset = StudySessionSerializer(**options).select_columns(queryset, *paginator.ordering)
+        if paginator.is_requested(request):
+            page = paginator.paginate_queryset(queryset, request, view=self)
+            serializer = StudySessionSerializer(page, many=True, **options)
+            return paginator.get_paginated_response(serializer.data)
+        serializer = StudySessionSerializer(queryset, many=True, **options)
         return Response(serializer.data)
 
     def post(self, request):
-        serializer = StudySessionSerializer(data=request.data)
+        options = StudySessionSerializer.request_options(request, sparse=False)
+        serializer = StudySessionSerializer(data=request.data, **options)
         if serializer.is_valid():
             serializer.save(user=request.user)
             return Response(serializer.data, status=status.HTTP_201_CREATED)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
 
+class SessionImportAPIView(views.APIView):
+    permission_classes = [IsAuthenticated]
+    throttle_scope = "import"
+
+    def post(self, request):
+        rows = iter_rows(request.stream or BytesIO(), request.content_type)
+        importer = SessionImporter(
+            request.user, allow_partial=request.query_params.get("partial") == "true")
+        result = importer.run(rows)
+        if result["error_count"] and not importer.allow_partial:
+            return Response(result, status=status.HTTP_400_BAD_REQUEST)
+        return Response(result, status=status.HTTP_201_CREATED)
+
+
+class SessionBatchAPIView(BatchAPIView):
+    serializer_class = SessionBatchSerializer
+    run = staticmethod(batch.batch_sessions)
+
+
 class SessionDetailAPIView(views.APIView):
     permission_classes = [IsAuthenticated]
 
     def get_session(self, pk):
-        return get_object_or_404(StudySession, pk=pk, user=self.request.user)
+        return get_object_or_404(
+            StudySession.objects.select_related("skill"), pk=pk, user=self.request.user)
 
     def get(self, request, pk):
         session = self.get_session(pk)
-        serializer = StudySessionSerializer(session)
-        return Response(serializer.data)
+        etag, last_modified = conditional.validators(
+            request, session.updated_at, session.skill.updated_at)
+        return conditional.conditional_get(
+            request, etag, last_modified,
+            lambda: Response(StudySessionSerializer(
+                session, **StudySessionSerializer.request_options(request)).data))
 
     def put(self, request, pk):
         session = self.get_session(pk)
-        serializer = StudySessionSerializer(session, data=request.data)
+        options = StudySessionSerializer.request_options(request, sparse=False)
+        serializer = StudySessionSerializer(session, data=request.data, **options)
         if serializer.is_valid():
             serializer.save()
             return Response(serializer.data)
@@ -99,7 +199,120 @@ class SessionDetailAPIView(views.APIView):
         return Response(status=status.HTTP_204_NO_CONTENT)
 
 
+class StatsAPIView(views.APIView):
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        query = StatsQuerySerializer(data=request.query_params)
+        query.is_valid(raise_exception=True)
+        # The rollups only change together with the user's data version.
+        etag, last_modified = conditional.validators(
+            request, caching.get_data_version(request.user.id))
+        return conditional.conditional_get(
+            request, etag, last_modified,
+            lambda: self.stats_response(request, query.validated_data))
+
+    def stats_response(self, request, params):
+        result = study_stats(
+            request.user, params["granularity"], params.get("from"), params.get("to"),
+            skill=params.get("skill"), category=params.get("category"))
+        options = StatsBucketSerializer.request_options(request, sparse=False)
+        return Response({
+            "granularity": params["granularity"],
+            "from": params.get("from"),
+            "to": params.get("to"),
+            "totals": StatsTotalsSerializer(result["totals"], **options).data,
+            "buckets": StatsBucketSerializer(result["buckets"], many=True, **options).data,
+        })
+
+
+class ActivityAPIView(views.APIView):
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        year = request.query_params.get("year")
+        if year is not None and not (year.isdigit() and 1 <= int(year) <= 9999):
+            raise ValidationError({"year": ["Must be a year, e.g. 2024."]})
+        today = timezone.localdate()
+        start, end = activity.year_range(int(year) if year else None, today)
+        etag, last_modified = conditional.validators(
+            request, caching.get_data_version(request.user.id), today)
+        return conditional.conditional_get(
+            request, etag, last_modified,
+            lambda: Response(activity.activity_summary(request.user, start, end, today)))
+
+
+class SearchAPIView(views.APIView):
+    permission_classes = [IsAuthenticated]
+    result_serializers = {"session": StudySessionSerializer, "skill": SkillSerializer}
+
+    def get(self, request):
+        query = SearchQuerySerializer(data=request.query_params)
+        query.is_valid(raise_exception=True)
+        params = query.validated_data
+        page, page_size = params["page"], params["page_size"]
+        count, hits = search.search(
+            request.user, params["q"], params.get("type"),
+            limit=page_size, offset=(page - 1) * page_size)
+        options = StudySessionSerializer.request_options(request, sparse=False)
+        url = request.build_absolute_uri()
+        return Response({
+            "count": count,
+            "next": replace_query_param(url, "page", page + 1) if page * page_size < count else None,
+            "previous": replace_query_param(url, "page", page - 1) if page > 1 else None,
+            "results": [
+                {"type": kind, "rank": rank,
+                 "object": self.result_serializers[kind](instance, **options).data}
+                for kind, instance, rank in hits
+            ],
+        })
+
+
+class ExportAPIView(views.APIView):
+    permission_classes = [IsAuthenticated]
+    renderer_classes = [CSVRenderer, NDJSONRenderer]
+    export_class = None
+    filename = None
+
+    def get(self, request):
+        date_from = self.get_date(request, "from")
+        date_to = self.get_date(request, "to")
+        export = self.export_class(request.user, date_from, date_to)
+        if request.accepted_renderer.format == "ndjson":
+            body = export.stream_ndjson()
+        else:
+            body = export.stream_csv()
+        response = StreamingHttpResponse(
+            body, content_type=request.accepted_renderer.media_type)
+        extension = request.accepted_renderer.format
+        response["Content-Disposition"] = f'attachment; filename="{self.filename}.{extension}"'
+        return response
+
+    def get_date(self, request, param):
+        value = request.query_params.get(param)
+        if not value:
+            return None
+        try:
+            parsed = parse_date(value)
+        except ValueError:
+            parsed = None
+        if parsed is None:
+            raise ValidationError({param: ["Date has wrong format. Use YYYY-MM-DD."]})
+        return parsed
+
+
+class SessionExportAPIView(ExportAPIView):
+    export_class = SessionExport
+    filename = "sessions"
+
+
+class SkillExportAPIView(ExportAPIView):
+    export_class = SkillExport
+    filename = "skills"
+
+
 class RegisterAPIView(views.APIView):
+    throttle_classes = [AuthThrottle]
 
     def post(self, request):
         serializer = RegisterSerializer(data=request.data)
@@ -109,6 +322,37 @@ class RegisterAPIView(views.APIView):
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
 
+class TaskStatusAPIView(views.APIView):
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request, pk):
+        task = get_object_or_404(Task, pk=pk, user=request.user)
+        return Response(TaskSerializer(task).data)
+
+
+class DashboardCacheStatsAPIView(views.APIView):
+    permission_classes = [IsAdminUser]
+
+    def get(self, request):
+        return Response(caching.dashboard_cache_stats())
+
+
+class ThrottleStatsAPIView(views.APIView):
+    permission_classes = [IsAdminUser]
+
+    def get(self, request):
+        return Response(throttling.buckets.stats())
+
+
+class MetricsAPIView(views.APIView):
+    authentication_classes = [MetricsTokenAuthentication, CachedJWTAuthentication]
+    permission_classes = [HasMetricsToken | IsAdminUser]
+
+    def get(self, request):
+        return HttpResponse(instrumentation.registry.render(),
+                            content_type="text/plain; version=0.0.4; charset=utf-8")
+
+
 # WEB SITES
 class HomeView(View):
     def get(self, request):
@@ -117,13 +361,14 @@ class HomeView(View):
                 "logged": False,
             })
         else:
-            sessions = StudySession.objects.filter(user=request.user)
-            count = sessions.count()
+            # Only evaluated when the cached list fragment is missing.
+            sessions = StudySession.objects.filter(
+                user=request.user).select_related("skill")
             return render(request, "core/session_list.html", context={
                 "logged": True,
                 "sessions": sessions,
-                "count": count,
-                "user": request.user
+                "user": request.user,
+                **caching.list_fragment_context(request.user.id),
             })
 
 
@@ -205,27 +450,29 @@ class DashboardView(LoginRequiredMixin, View):
     redirect_field_name = 'next'
 
     def get(self, request):
-        sessions = StudySession.objects.filter(user=request.user)
-        if sessions.exists():
-            total_sessions = sessions.count()
-            total_duration = sessions.aggregate(
-                Sum("duration"))["duration__sum"]
-            
-            avg_duration = sessions.aggregate(Avg("duration"))["duration__avg"]
-            if avg_duration:
-                average_duration = avg_duration.total_seconds() / 60
-            else:
-                average_duration = 0
-
-            last_session = (StudySession.objects.filter(
-                user=request.user).order_by('-date')).first()
+        context = caching.get_dashboard_context(
+            request.user.id, lambda: self.get_context(request.user))
+        return render(request, "core/dashboard.html", context=context)
+
+    def get_context(self, user):
+        rollups = DailyStudyRollup.objects.filter(user=user)
+        totals = rollups.aggregate(
+            total_sessions=Sum("session_count"),
+            total_duration=Sum("total_duration"))
+        total_sessions = totals["total_sessions"]
+        if total_sessions:
+            total_duration = totals["total_duration"]
+            average_duration = total_duration.total_seconds() / total_sessions / 60
+
+            last_session = (StudySession.objects.filter(user=user)
+                            .select_related("user", "skill").order_by('-date')).first()
 
             # Charts
-            top_categories_qs = sessions.values('skill__category').annotate(total=Count('id')).order_by('-total')[:3]
+            top_categories_qs = rollups.values('skill__category').annotate(total=Sum('session_count')).order_by('-total')[:3]
             top_categories_labels = [c['skill__category'] or 'Uncategorized' for c in top_categories_qs]
             top_categories_data = [c['total'] for c in top_categories_qs]
 
-            daily_sessions_qs = sessions.values('date').annotate(total=Sum('duration')).order_by('date')
+            daily_sessions_qs = rollups.values('date').annotate(total=Sum('total_duration')).order_by('date')
             daily_labels = [DateFormat(item['date']).format(
                 'Y-m-d') for item in daily_sessions_qs]
             daily_data = [
@@ -234,8 +481,14 @@ class DashboardView(LoginRequiredMixin, View):
                 for item in daily_sessions_qs
             ]
 
-            return render(request, "core/dashboard.html", context={
+            start, today = activity.year_range()
+            summary = activity.activity_summary(user, start, today, today=today)
+
+            return {
                 "is_session": True,
+                "current_streak": summary["current_streak"],
+                "longest_streak": summary["longest_streak"],
+                "heatmap_weeks": activity.heatmap_weeks(start, summary["minutes"]),
                 "total_sessions": total_sessions,
                 "total_hours": total_duration,
                 "average_session_duration": average_duration,
@@ -248,10 +501,10 @@ class DashboardView(LoginRequiredMixin, View):
                     "data": daily_data,
                 },
                 "last_session": last_session,
-            })
+            }
 
         else:
-            return render(request, "core/dashboard.html", {"is_session": False})
+            return {"is_session": False}
 
 
 class EditStudySessionView(LoginRequiredMixin, View):
@@ -287,13 +540,37 @@ class AllSkillsView(LoginRequiredMixin, View):
         else:
 
             skills = Skill.objects.filter(user=request.user)
-            count = skills.count()
             return render(request, "core/skill_list.html", context={
                 "logged": True,
                 "skills": skills,
+                "user": request.user,
+                **caching.list_fragment_context(request.user.id),
+            })
+
+
+class SearchView(LoginRequiredMixin, View):
+
+    login_url = '/accounts/login/'
+    redirect_field_name = 'next'
+
+    def get(self, request):
+        query = SearchQuerySerializer(data=request.GET)
+        context = {"q": request.GET.get("q", ""), "type": request.GET.get("type", "")}
+        if context["q"] and query.is_valid():
+            params = query.validated_data
+            page, page_size = params["page"], params["page_size"]
+            count, hits = search.search(
+                request.user, params["q"], params.get("type"),
+                limit=page_size, offset=(page - 1) * page_size)
+            context.update({
                 "count": count,
-                "user": request.user
+                "hits": [{"type": kind, "object": instance} for kind, instance, _ in hits],
+                "previous_page": page - 1 if page > 1 else None,
+                "next_page": page + 1 if page * page_size < count else None,
             })
+        elif context["q"]:
+            context["errors"] = query.errors
+        return render(request, "core/search.html", context)
 
 
 class EditSkillView(LoginRequiredMixin, View):
@@ -333,7 +610,9 @@ class DeleteSkillView(LoginRequiredMixin, View):
 
     def post(self, request, pk):
         skill = get_object_or_404(Skill, pk=pk, user=request.user)
-        skill.delete()
+        # The skill's sessions can be many; they are hidden now and the
+        # worker removes them.
+        batch.delete_skills(request.user, [skill.pk])
         return redirect("home")
     
 class EditProfileView(View):
@@ -344,11 +623,20 @@ class EditProfileView(View):
 
     def post(self, request):
         profile, _ = UserProfile.objects.get_or_create(user=request.user)
+        old_picture = profile.profile_picture.name
+        old_variants = list(profile.profile_picture_variants.values())
         form = UserProfileForm(request.POST, request.FILES, instance=profile)
         if form.is_valid():
             if request.POST.get("remove_picture") and profile.profile_picture:
-                profile.profile_picture.delete(save=False)
                 profile.profile_picture = None
+            picture_changed = profile.profile_picture.name != old_picture
+            if picture_changed:
+                profile.profile_picture_variants = {}
             form.save()
+            if picture_changed:
+                images.delete_files([old_picture, *old_variants])
+                if profile.profile_picture:
+                    tasks.process_profile_picture.enqueue(
+                        profile.pk, profile.profile_picture.name, owner=request.user)
             return redirect('profile', user_id=request.user.id)
         return render(request, 'core/edit_profile.html', {'form': form})
@@ -29,7 +29,7 @@ SECRET_KEY = os.getenv("SECRET_KEY")
 # SECURITY WARNING: don't run with debug turned on in production!
 DEBUG = os.getenv("DEBUG", "False") == "True"
 
-ALLOWED_HOSTS = []
+ALLOWED_HOSTS = [host for host in os.getenv("ALLOWED_HOSTS", "").split(",") if host]
 
 
 # Application definition
@@ -47,10 +47,16 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    # Before sessions and auth, which static files do not need.
+    'core.staticfiles.StaticFilesMiddleware',
+    # Server-Timing header and the per-route histograms of /api/metrics.
+    'core.instrumentation.RequestTimingMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    # Needs the user; only loaded with REQUEST_PROFILING.
+    'core.profiling.RequestProfilerMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -91,6 +97,35 @@ DATABASES = {
 }
 
 
+# Cache
+# https://docs.djangoproject.com/en/5.2/topics/cache/
+# The local-memory default is per process. Cached entries are keyed by the
+# user's data version, which is kept in the database (core.DataVersion), so
+# workers never serve each other's stale entries; a shared backend (e.g.
+# django.core.cache.backends.db.DatabaseCache) lets them share hits.
+
+CACHES = {
+    "default": {
+        "BACKEND": os.getenv("CACHE_BACKEND", "django.core.cache.backends.locmem.LocMemCache"),
+        "LOCATION": os.getenv("CACHE_LOCATION", "skilltrack"),
+    }
+}
+
+# Rendered list pages and their cards ({% cache ... using="fragments" %}).
+# A user with thousands of sessions has as many cards, more than the 300
+# entries the in-memory backend keeps by default.
+CACHES["fragments"] = {**CACHES["default"]}
+if CACHES["fragments"]["BACKEND"].endswith(".LocMemCache"):
+    CACHES["fragments"].update(LOCATION="skilltrack-fragments", OPTIONS={"MAX_ENTRIES": 100_000})
+
+DASHBOARD_CACHE_TIMEOUT = 60 * 60 * 24
+FRAGMENT_CACHE_TIMEOUT = 60 * 60 * 24 * 7
+
+# Background tasks (core/background.py) still marked running after this many
+# seconds are assumed to belong to a dead worker and are queued again.
+TASKS_STALE_AFTER = 60 * 60
+
+
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
 
@@ -129,6 +164,13 @@ STATIC_URL = 'static/'
 STATICFILES_DIRS = [BASE_DIR / "core/static"]
 STATIC_ROOT = os.path.join(BASE_DIR, 'staticfiles')
 
+# collectstatic writes content-hashed names plus .br/.gz copies, which
+# core.staticfiles.StaticFilesMiddleware serves with far-future caching.
+STORAGES = {
+    "default": {"BACKEND": "django.core.files.storage.FileSystemStorage"},
+    "staticfiles": {"BACKEND": "core.staticfiles.CompressedManifestStaticFilesStorage"},
+}
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
@@ -136,10 +178,61 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
-    )
+        'core.authentication.CachedJWTAuthentication',
+    ),
+    # MessagePack is picked with Accept / Content-Type: application/msgpack.
+    'DEFAULT_RENDERER_CLASSES': (
+        'rest_framework.renderers.JSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+        'core.messagepack.MessagePackRenderer',
+    ),
+    'DEFAULT_PARSER_CLASSES': (
+        'rest_framework.parsers.JSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+        'core.messagepack.MessagePackParser',
+    ),
+    # Token buckets per user (or client IP), see core/throttling.py.
+    'DEFAULT_THROTTLE_CLASSES': (
+        'core.throttling.WriteThrottle',
+    ),
+    'DEFAULT_THROTTLE_RATES': {
+        'write': os.getenv("THROTTLE_WRITE_RATE", "120/min"),
+        'import': os.getenv("THROTTLE_IMPORT_RATE", "20/hour"),
+        'auth': os.getenv("THROTTLE_AUTH_RATE", "10/min"),
+    },
 }
 
+# Throttle buckets kept per process before the least recently used is evicted.
+THROTTLE_MAX_KEYS = 100_000
+
+# Users resolved from access tokens are kept in a per-process cache
+# (core/authentication.py) for this many seconds. This is also how long other
+# workers can serve a deactivated user when CACHE_BACKEND is not shared.
+JWT_USER_CACHE_SIZE = 10_000
+JWT_USER_CACHE_TIMEOUT = 60
+
+# Per-request timing (core/instrumentation.py). Prometheus can scrape
+# /api/metrics with "Authorization: Bearer <METRICS_TOKEN>"; staff users can
+# read it with their own token.
+REQUEST_TIMING = os.getenv("REQUEST_TIMING", "True") == "True"
+METRICS_TOKEN = os.getenv("METRICS_TOKEN", "")
+
+# Lets staff profile one request with "X-Profile: 1" or "?profile=1"
+# (core/profiling.py). Captures are written here and listed in the admin.
+REQUEST_PROFILING = os.getenv("REQUEST_PROFILING", "False") == "True"
+PROFILE_ROOT = os.path.join(BASE_DIR, 'profiles')
+
+# Cursor pagination of /api/sessions and /api/skills (opt-in via ?page_size=)
+API_PAGE_SIZE = 50
+API_MAX_PAGE_SIZE = 500
+
+# Rows one /api/sessions/batch or /api/skills/batch request may change.
+BATCH_MAX_ROWS = 5000
+
+# Sessions of a deleted skill removed per transaction by the purge task.
+SKILL_PURGE_BATCH_SIZE = 1000
+
 SIMPLE_JWT = {
     "ACCESS_TOKEN_LIFETIME": timedelta(minutes=30),
     "REFRESH_TOKEN_LIFETIME": timedelta(days=7),